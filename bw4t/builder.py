@@ -1,8 +1,10 @@
 # The methods and classes below can be added to the WorldBuilder
+import numpy as np
 from matrx.goals import WorldGoal, LimitedTimeGoal
-from matrx.world_builder import RandomProperty
+from matrx.world_builder import RandomProperty, WorldBuilder
 
-from bw4t.goals import CollectionGoal
+from bw4t.goals import CollectionGoal, OrderingSequence, RandomOrderProperty
+from bw4t.object_registry import RegistryGridWorld
 from bw4t.objects import CollectionTarget, CollectionDropOffTile
 
 # TODO : Edited RandomProperty in the builder to handle dict values! Should be ported to MATRX
@@ -22,7 +24,8 @@ from bw4t.objects import CollectionTarget, CollectionDropOffTile
 
 # Todo: These methods should be added to the WorldBuilder
 def add_collection_goal(builder, collection_locs, collection_objects, name, in_order=False,
-                        collection_area_colour="#c87800", collection_area_opacity=1.0, overwrite_goals=False):
+                        collection_area_colour="#c87800", collection_area_opacity=1.0, overwrite_goals=False,
+                        telemetry=None):
     """ Adds a goal to the world to collect objects and drop them in a specific area.
 
     This is a helper method to quickly add a `CollectionGoal` to the world. A `CollectionGoal` will check if a set of
@@ -62,6 +65,8 @@ def add_collection_goal(builder, collection_locs, collection_objects, name, in_o
         The opacity of the area on the specified locations representing the drop zone.
     overwrite_goals : bool (default is False)
         Whether any previously added goals to the builder should be discarded/overwritten.
+    telemetry : GoalTelemetry (default is None)
+        When given, the `CollectionGoal` records its progress and the objects dropped off and picked up with it.
 
     Examples
     --------
@@ -123,9 +128,12 @@ def add_collection_goal(builder, collection_locs, collection_objects, name, in_o
     # represented by its own list/tuple of dictionarys. In other words, if `collection_objects` is of type
     # [[dict, ...], ...] or a version with tuples instead of lists.
     vals = collection_objects
-    if isinstance(vals, RandomProperty):
+    if isinstance(vals, RandomOrderProperty) and not isinstance(builder, BW4TWorldBuilder):
+        raise ValueError("A `RandomOrderProperty` as `collection_objects` is only drawn by a `BW4TWorldBuilder`.")
+    if isinstance(vals, (RandomProperty, RandomOrderProperty)):
         vals = vals.values
-        if not (isinstance(vals, (list, tuple)) and len(vals) > 0  # check if values are a list/tuple of length > 0
+        # check if values are a non-empty list/tuple (or the orderings of a RandomOrderProperty, too many for `len`)
+        if not (isinstance(vals, (list, tuple, OrderingSequence)) and bool(vals)
                 and isinstance(vals[0], (list, tuple)) and len(vals[0]) > 0   # check if its items are a list/tuple
                 and isinstance(vals[0][0], dict)):  # check if the items in the listed orderings are of dicts
             raise ValueError(
@@ -157,7 +165,7 @@ def add_collection_goal(builder, collection_locs, collection_objects, name, in_o
                        collection_zone_name=name)
 
     # Create and add the collection goal
-    collection_goal = CollectionGoal(name=name, target_name=target_name, in_order=in_order)
+    collection_goal = CollectionGoal(name=name, target_name=target_name, in_order=in_order, telemetry=telemetry)
     builder.add_goal(collection_goal, overwrite=overwrite_goals)
 
 
@@ -199,14 +207,201 @@ def add_goal(builder, world_goal, overwrite=False):
     builder.world_settings["simulation_goal"] = goals
 
 
-# TODO : This method should be a utility method
-def _flatten_dict(dict_):
-    new_dict = {}
-    for k, v in dict_.items():
-        if isinstance(v, dict):
-            sub_dict_ = {f"{k}_{k2}": v2 for k2, v2 in v.items()}
-            new_dict = {**new_dict, **sub_dict_}
-        else:
-            new_dict[k] = v
+class BW4TWorldBuilder(WorldBuilder):
+
+    def __init__(self, *args, **kwargs):
+        """ A `WorldBuilder` whose worlds keep an `ObjectRegistry` of their objects, and that can add bulk prospects.
+
+        Each world is created as a `RegistryGridWorld`, whose registry indexes the objects of the world as the builder
+        registers them, before the world is returned (and before it is pickled, when it is created in another process).
+        The goals and blocks that look up objects by name or zone need such a world.
+
+        Objects that may or may not be created at each of many locations are added with `add_object_prospects`. For
+        each world, `expand_prospects` draws which of them are created, and the world is created from the resulting
+        object settings. Objects can also have a `RandomOrderProperty`, of which an ordering is drawn for each world.
+
+        Parameters
+        ----------
+        *args
+            The arguments of `WorldBuilder`.
+        **kwargs
+            The keyword arguments of `WorldBuilder`.
+
+        Examples
+        --------
+        >>> builder = BW4TWorldBuilder(shape=(10, 10))
+        >>> world = builder.get_world()
+        >>> ObjectRegistry.of(world).find("name", "Dropzone")
+        """
+        super().__init__(*args, **kwargs)
+
+        # The prospects in the order they were added; each a tuple of the number of object settings added to the
+        # builder before it, the locations (as an int array of shape (n, 2)), the probabilities (as a float array of
+        # shape (n,)), the colours (or None), the cumulative colour distribution (or None) and the object settings of
+        # its objects
+        self.__prospects = []
+
+    def get_world(self, world_nr=None):
+        """ Creates a single world, with the objects drawn from all prospects and an ordering drawn for each
+        `RandomOrderProperty`.
+
+        Parameters
+        ----------
+        world_nr : int (default is None)
+            The number of the world, counted from 0 as if this builder created all worlds before it (e.g. when each
+            world is created by a builder of its own). The world is named after it, as `world_{world_nr + 1}`. The
+            number of worlds this builder created so far when None.
+
+        Returns
+        -------
+        RegistryGridWorld
+            The world, see `WorldBuilder.get_world`.
+        """
+        # The WorldBuilder numbers the next world after the number of worlds it created
+        if world_nr is not None:
+            self.worlds_created = world_nr
+
+        # The WorldBuilder creates the objects of its object settings, so these are those of this world while it does
+        object_settings = self.object_settings
+        self.object_settings = self.__draw_orders(self.expand_prospects())
+        try:
+            return super().get_world()
+        finally:
+            self.object_settings = object_settings
+
+    def add_object_prospects(self, locations, name, probability, colours=None, colour_distribution=None,
+                             callable_class=None, **custom_properties):
+        """ Adds an object that may or may not be created at each of many locations, optionally with a random colour.
+
+        This is the bulk version of `add_object_prospect` with a `RandomProperty` as colour. Instead of a prospect per
+        location, that each draw whether they are created and their colour one by one, all locations are drawn at once
+        for each world that is created; whether an object is created at each location and its colour come from a single
+        NumPy call on the random generator of the builder, so worlds remain the same for the same seed. Only the drawn
+        objects are created, so creating a world takes time by the number of objects created, not the number of
+        locations considered.
+
+        The drawn objects are created and registered in the place of the prospect among the other objects, as if they
+        were added with `add_object` at the time the prospect was added.
+
+        Parameters
+        ----------
+        locations : array-like of (x, y)
+            The candidate locations, an object is created at each with the given probability.
+        name : str
+            The name of the objects.
+        probability : float or array-like of float
+            The probability that an object is created at a location, a single one for all or one for each location.
+        colours : list of str (default is None)
+            The colours an object can have. When not given, the objects get no `visualize_colour` from the prospect.
+        colour_distribution : list of float (default is None)
+            The probability of each colour, all colours are equally likely when not given.
+        callable_class : type (default is EnvObject)
+            The class of the objects, as with `add_object`.
+        **custom_properties
+            Any other properties of the objects, as with `add_object`.
+
+        Raises
+        ------
+        ValueError
+            When the locations, probabilities, colours or colour distribution are not valid.
+
+        Examples
+        --------
+        Add a red or blue block to each of the cells of a 7x7 room, such that on average 4 blocks are created with three
+        times as many red as blue blocks.
+        >>> locs = builder.get_room_locations((0, 0), 7, 7)
+        >>> builder.add_object_prospects(locs, "Block", 4 / len(locs), ["#ff0000", "#0000ff"], [0.75, 0.25])
+        """
+        locs = np.asarray(locations, dtype=np.int64)
+        if locs.size == 0:
+            locs = locs.reshape(0, 2)
+        if locs.ndim != 2 or locs.shape[1] != 2:
+            raise ValueError(f"The locations should be a list of (x, y) locations, not {locations}.")
+
+        probs = np.broadcast_to(np.asarray(probability, dtype=np.float64), (len(locs),))
+        if np.any(probs < 0) or np.any(probs > 1):
+            raise ValueError(f"The probability of creating an object should be between 0 and 1, not {probability}.")
+
+        cum_distribution = None
+        if colours is not None:
+            if len(colours) == 0:
+                raise ValueError(f"At least one colour is needed for the objects named {name}, or None for no colour.")
+            if colour_distribution is None:
+                colour_distribution = np.full(len(colours), 1 / len(colours))
+            colour_distribution = np.asarray(colour_distribution, dtype=np.float64)
+            if colour_distribution.shape != (len(colours),) or np.any(colour_distribution < 0) \
+                    or not np.isclose(colour_distribution.sum(), 1.0):
+                raise ValueError(f"The colour distribution should be a probability for each of the {len(colours)} "
+                                 f"colours that sums to 1, not {colour_distribution}.")
+            cum_distribution = np.cumsum(colour_distribution)
+            cum_distribution[-1] = 1.0  # against rounding errors, so each drawn number falls within a colour
+            if "visualize_colour" in custom_properties:
+                raise ValueError(f"The objects named {name} get their colour from the given colours, so it cannot also "
+                                 f"be given as the property visualize_colour.")
+            colours = list(colours)
+
+        # The builder makes the settings of an object as it is added. Those of all objects of the prospect only differ
+        # in their location and colour, so we take those of an object at the first location (without keeping it).
+        position = len(self.object_settings)
+        self.add_object(tuple(locs[0].tolist()) if len(locs) > 0 else (0, 0), name, callable_class=callable_class,
+                        **custom_properties)
+        object_setting = self.object_settings.pop()
+
+        self.__prospects.append((position, locs, probs, colours, cum_distribution, object_setting))
+
+    def expand_prospects(self):
+        """ Draws which objects of all prospects are created in the next world, and returns its object settings.
+
+        Returns
+        -------
+        list of dict
+            The object settings of the builder, with the settings of the drawn objects in the place of each prospect.
+        """
+        if len(self.__prospects) == 0:
+            return list(self.object_settings)
+
+        nr_locs = sum(len(prospect[1]) for prospect in self.__prospects)
+
+        # A single call for all locations of all prospects; the first row decides whether an object is created at a
+        # location, the second its colour
+        samples = self.rng.random_sample((2, nr_locs))
+
+        object_settings = []
+        start = 0
+        nr_settings = 0  # the number of object settings of the builder before the current prospect
+        for position, locs, probs, colours, cum_distribution, object_setting in self.__prospects:
+            object_settings.extend(self.object_settings[nr_settings:position])
+            nr_settings = position
+
+            end = start + len(locs)
+            created = np.flatnonzero(samples[0, start:end] < probs)
+            colour_idxs = None
+            if colours is not None:
+                colour_idxs = np.searchsorted(cum_distribution, samples[1, start:end][created], side="right").tolist()
+            for nr, idx in enumerate(created.tolist()):
+                mandatory_properties = dict(object_setting["mandatory_properties"], location=tuple(locs[idx].tolist()))
+                if colours is not None:
+                    mandatory_properties["visualize_colour"] = colours[colour_idxs[nr]]
+                object_settings.append(dict(object_setting, mandatory_properties=mandatory_properties))
+            start = end
+
+        object_settings.extend(self.object_settings[nr_settings:])
+        return object_settings
+
+    def __draw_orders(self, object_settings):
+        # Draws an ordering for each custom property that is a RandomOrderProperty, which the WorldBuilder does not draw
+        # as it only draws a RandomProperty. Returns the object settings with the drawn orderings in their place.
+        for idx, object_setting in enumerate(object_settings):
+            custom_properties = object_setting["custom_properties"]
+            if any(isinstance(value, RandomOrderProperty) for value in custom_properties.values()):
+                custom_properties = {name: value._get_property(self.rng) if isinstance(value, RandomOrderProperty)
+                                     else value for name, value in custom_properties.items()}
+                object_settings[idx] = dict(object_setting, custom_properties=custom_properties)
+        return object_settings
 
-    return new_dict
\ No newline at end of file
+    def _WorldBuilder__create_grid_world(self):
+        # The WorldBuilder creates the GridWorld of each world in this method, which overrides its private
+        # `__create_grid_world` (hence its name) to create a RegistryGridWorld instead
+        args = self.world_settings
+        args['world_id'] = f"world_{self.worlds_created}"
+        return RegistryGridWorld(**args)
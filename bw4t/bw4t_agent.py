@@ -1,32 +1,51 @@
 from matrx.agents import AgentBrain
 
 from bw4t.state import State
+from bw4t.state_profile import StateProfiler
+from bw4t.state_team import TeamState
 
 
 class BlockWorldAgent(AgentBrain):
 
-    def __init__(self, memorize_for_ticks=10):
+    def __init__(self, memorize_for_ticks=10, fov_occlusion=False, team_state: TeamState = None,
+                 profiler: StateProfiler = None):
         self.__memorize_for_ticks = memorize_for_ticks
+        self.__fov_occlusion = fov_occlusion
+        self.__team_state = team_state
+        self.__profiler = profiler  # when given, records what our state queries and updates cost us
         self.__collect = None
+        self.__queries = None
         self.state = None
         super().__init__()
 
     def initialize(self):
-        self.state = State(memorize_for_ticks=self.__memorize_for_ticks)
+        # Either keep our own state, or a view on the state we share with our teammates
+        if self.__team_state is None:
+            self.state = State(memorize_for_ticks=self.__memorize_for_ticks, agent_id=self.agent_id,
+                               fov_occlusion=self.__fov_occlusion, profiler=self.__profiler)
+        else:
+            self.state = self.__team_state.view(self.agent_id, memorize_for_ticks=self.__memorize_for_ticks,
+                                                fov_occlusion=self.__fov_occlusion, profiler=self.__profiler)
+
+        # Compile the queries we ask every tick once, so the state does not need to interpret them each time
+        self.__queries = [self.state.compile(query) for query in [
+            self.agent_id,
+            "foo",
+            ["Collect block_585", "Collect block_586"],
+            {"foo": "bar"},
+            "is_open",
+            {"room_name": "room_0"},
+            {"room_name": "room_0", "class_inheritance": "Wall"},
+            {"room_name": ["room_0", "room_1"]},
+            {"room_name": ["room_0", "room_1"], "class_inheritance": "Wall"},
+            {"room_name": ["room_0", "room_1"], "class_inheritance": ["Wall", "Door"]},
+            {"room_name": ["room_0", "room_1"], "is_open": True},
+        ]]
 
     def filter_observations(self, state_dict):
         self.state.state_update(state_dict)
-        self.state[self.agent_id]
-        self.state["foo"]
-        self.state[["Collect block_585", "Collect block_586"]]
-        self.state[{"foo": "bar"}]
-        self.state["is_open"]
-        self.state[{"room_name": "room_0"}]
-        self.state[{"room_name": "room_0", "class_inheritance": "Wall"}]
-        self.state[{"room_name": ["room_0", "room_1"]}]
-        self.state[{"room_name": ["room_0", "room_1"], "class_inheritance": "Wall"}]
-        self.state[{"room_name": ["room_0", "room_1"], "class_inheritance": ["Wall", "Door"]}]
-        self.state[{"room_name": ["room_0", "room_1"], "is_open": True}]
+        # Answer all our queries as one batch, so the index lookups they have in common are only done once
+        self.state.query_many(self.__queries)
 
         if self.__collect is None:
             pass
@@ -1,5 +1,7 @@
 from matrx.objects import EnvObject
 
+from bw4t.object_registry import ObjectRegistry
+
 
 class CollectBlock(EnvObject):
 
@@ -30,10 +32,8 @@ class SignalBlock(EnvObject):
 
     def update(self, grid_world):
         if not self.__is_set:
-            all_objs = grid_world.environment_objects
-            for obj_id, obj in all_objs.items():
-                if 'collection_zone_name' in obj.properties.keys() and self.__drop_zone_name == obj.properties['collection_zone_name']:
-                    colour = obj.properties['collection_objects'][self.__rank]['visualization_colour']
-                    self.change_property("visualization_colour", colour)
-                    self.change_property("visualization_opacity", 1.0)
-                    self.__is_set = True
+            for obj in ObjectRegistry.of(grid_world).find('collection_zone_name', self.__drop_zone_name):
+                colour = obj.properties['collection_objects'][self.__rank]['visualization_colour']
+                self.change_property("visualization_colour", colour)
+                self.change_property("visualization_opacity", 1.0)
+                self.__is_set = True
@@ -13,10 +13,11 @@ from matrx.world_builder import RandomProperty
 from matrx.goals import WorldGoal
 
 # Some general settings
-from bw4t.builder import add_collection_goal
+from bw4t.builder import BW4TWorldBuilder, add_collection_goal
 from bw4t.bw4t_agent import BlockWorldAgent
 from bw4t.bw4t_objects import SignalBlock, CollectBlock
 from bw4t.goals import CollectionGoal
+from bw4t.state_team import TeamState
 
 tick_duration = 1/60  # 60fps if achievable
 random_seed = 1
@@ -52,27 +53,18 @@ def get_room_loc(room_nr):
 
 def add_blocks(builder, room_locations, block_colours):
     for room_name, locations in room_locations.items():
-        for loc in locations:
-            # Get the block's name
-            name = f"Block in {room_name}"
+        # Get the probability for adding a block so we get the on average the requested number of blocks per room
+        prob = min(1.0, 4 / len(locations))
 
-            # Get the probability for adding a block so we get the on average the requested number of blocks per room
-            prob = min(1.0, 4 / len(locations))
+        # Add the blocks of this room as a bulk prospect; each time a new world is created from this builder, it draws
+        # for the locations of all rooms at once whether a block is placed there and which of the colours it has (all
+        # equally likely). The blocks are a regular CollectibleObject as denoted by the given 'callable_class' which
+        # the builder will use to create the object.
+        builder.add_object_prospects(locations, f"Block in {room_name}", probability=prob, colours=block_colours,
+                                     callable_class=CollectBlock)
 
-            # Create a MATRX random property of color so each block varies per created world.
-            # This random property is used to obtain a certain value (a color) for a certain object property
-            # (visualize_colour) each time a new world is created from this builder.
-            colour_property = RandomProperty(values=block_colours)
 
-            # Add the block; a regular CollectibleObject as denoted by the given 'callable_class' which the
-            # builder will use to create the object. In addition to setting MATRX properties, we also
-            # provide a `is_block` boolean as custom property so we can identify this as a collectible
-            # block.
-            builder.add_object_prospect(loc, name, callable_class=CollectBlock, probability=prob,
-                                        visualize_colour=colour_property)
-
-
-def add_drop_off_zone(builder, world_size, block_colours, nr_blocks_to_collect):
+def add_drop_off_zone(builder, world_size, block_colours, nr_blocks_to_collect, telemetry=None):
     # First we calculate the top left coordinates of the room that contains our drop off zone
     x = 7
     y = 34
@@ -102,7 +94,7 @@ def add_drop_off_zone(builder, world_size, block_colours, nr_blocks_to_collect):
     # made this property, so we just pass it through. We also set the colour and the opacity of the 'drop zone'.
     drop_zone_name = "Drop zone"
     add_collection_goal(builder, locs, rp_order, name=drop_zone_name, in_order=True, collection_area_colour="#c87800",
-                        collection_area_opacity=0.5, overwrite_goals=True)
+                        collection_area_opacity=0.5, overwrite_goals=True, telemetry=telemetry)
 
     # Add our signal block that adapt itself to the then generated blocks to be collected.
     loc = (1, world_size[1] - 1 - nr_blocks_to_collect)
@@ -112,7 +104,7 @@ def add_drop_off_zone(builder, world_size, block_colours, nr_blocks_to_collect):
         loc = (loc[0], loc[1] + 1)
 
 
-def add_agents(builder, block_sense_range, other_sense_range, agent_memory_decay):
+def add_agents(builder, block_sense_range, other_sense_range, agent_memory_decay, fov_occlusion=True):
     # Create the agents sense capability. This is a circular range around the agent that denotes what it can perceive.
     # Here, we define that the agent cannot see other agent's their bodies, they can see square blocks with their own
     # range and see all other objects (doors, walls, etc.) with another range.
@@ -133,12 +125,14 @@ def add_agents(builder, block_sense_range, other_sense_range, agent_memory_decay
 
     # We add 2 additional Autonomous Agents; an agent that does its thing without needing your input. Again, we create
     # its brain and add it to our builder. Since we provide the same team name, these agents will be in the same team as
-    # the Human Agent.
+    # the Human Agent. Both agents share their knowledge through a single team state, each with its own view on it. Like
+    # the Human Agent, they do not perceive what is hidden behind walls and closed doors (unless told otherwise).
+    team_state = TeamState()
     loc = (2, 1)
-    brain = BlockWorldAgent()
+    brain = BlockWorldAgent(fov_occlusion=fov_occlusion, team_state=team_state)
     builder.add_agent(loc, brain, team=team_name, name=f"Agent Smith #1", sense_capability=sense_capability)
     loc = (3, 1)
-    brain = BlockWorldAgent()
+    brain = BlockWorldAgent(fov_occlusion=fov_occlusion, team_state=team_state)
     builder.add_agent(loc, brain, team=team_name, name=f"Agent Smith #2", sense_capability=sense_capability)
 
 
@@ -159,7 +153,7 @@ def add_rooms(builder):
     return room_locations
 
 
-def create_builder():
+def create_builder(telemetry=None, seed=random_seed, headless=False, fov_occlusion=True):
     # Some BW4T settings
     block_colours = ['#ff0000', '#ffffff', '#ffff00', '#0000ff', '#00ff00', '#ff00ff']
     block_sense_range = 10  # the range with which agents detect blocks
@@ -167,15 +161,17 @@ def create_builder():
     agent_memory_decay = (10 / tick_duration)  # we want to memorize states for (seconds / tick_duration ticks) ticks
 
     # Set numpy's random generator
-    np.random.seed(random_seed)
+    np.random.seed(seed)
 
     # The world size, with plenty of space for agents to move between rooms
     world_size = (30, 44)
 
-    # Create our world builder
-    builder = WorldBuilder(shape=world_size, tick_duration=tick_duration, random_seed=random_seed, run_matrx_api=True,
-                           run_matrx_visualizer=True, verbose=verbose, visualization_bg_clr="#f0f0f0",
-                           visualization_bg_img="")
+    # Create our world builder, a headless one runs its worlds as fast as possible (agents still memorize states for the
+    # number of ticks that last 10 seconds in real time). Its worlds index their objects by name and zone, for the goals
+    # and blocks that look them up.
+    builder = BW4TWorldBuilder(shape=world_size, tick_duration=0 if headless else tick_duration, random_seed=seed,
+                               run_matrx_api=not headless, run_matrx_visualizer=not headless, verbose=verbose,
+                               visualization_bg_clr="#f0f0f0", visualization_bg_img="")
 
     # Add the world bounds (not needed, as agents cannot 'walk off' the grid, but for visual effect)
     builder.add_room(top_left_location=(0, 0), width=world_size[0], height=world_size[1], name="world_bounds")
@@ -187,10 +183,11 @@ def create_builder():
     add_blocks(builder, room_locations, block_colours)
 
     # Create the drop-off zones, this includes generating the random colour/shape combinations to collect.
-    add_drop_off_zone(builder, world_size, block_colours, nr_blocks_to_collect=2)
+    add_drop_off_zone(builder, world_size, block_colours, nr_blocks_to_collect=2, telemetry=telemetry)
 
-    # Add the agents and human agents to the top row of the world
-    add_agents(builder, block_sense_range, other_sense_range, agent_memory_decay)
+    # Add the agents and human agents to the top row of the world, they only perceive what they can see unless
+    # `fov_occlusion` is False
+    add_agents(builder, block_sense_range, other_sense_range, agent_memory_decay, fov_occlusion=fov_occlusion)
 
     # Return the builder
     return builder
@@ -0,0 +1,123 @@
+import csv
+from collections import namedtuple
+
+import numpy as np
+
+
+# A single recorded goal event; the name of the goal, the tick, the kind of event, the id of the dropped or picked up
+# object (None for progress), the attained rank (of an in order goal, otherwise the number of collected objects) and the
+# progress of the goal at the end of that tick.
+GoalEvent = namedtuple("GoalEvent", ["goal", "tick", "event", "obj_id", "rank", "progress"])
+
+
+class GoalTelemetry:
+
+    # The kinds of events, stored by their index
+    EVENTS = ("progress", "drop", "pickup")
+
+    # The columns of the buffer; goals and objects are stored as indices into a table of their names (-1 for none)
+    DTYPE = np.dtype([("tick", np.int64), ("goal", np.int32), ("event", np.int8), ("obj", np.int32),
+                      ("rank", np.int32), ("progress", np.float64)])
+
+    def __init__(self, capacity=65536):
+        """ Records the progress of goals over time, and the objects dropped off and picked up in their zones.
+
+        Goals push an event whenever something changes, into a buffer that is allocated once. Nothing is recorded in a
+        tick in which nothing changed, so recording costs nothing on most ticks. When the buffer is full, the oldest
+        events are overwritten; `nr_overwritten` tells how many were lost.
+
+        Export the events in bulk after a world is done, as a NumPy structured array (`to_numpy`), a list of
+        `GoalEvent` (`events`) or CSV (`write_csv`), and `reset` the telemetry for the next world.
+
+        Parameters
+        ----------
+        capacity : int (default is 65536)
+            The maximum number of events kept.
+
+        Examples
+        --------
+        Give all collection goals the same telemetry, and write their events after each world.
+        >>> telemetry = GoalTelemetry()
+        >>> builder = create_builder(telemetry=telemetry)
+        >>> for i, world in enumerate(builder.worlds(nr_of_worlds=10)):
+        >>>     world.run(builder.api_info)
+        >>>     telemetry.write_csv(open(f"goals_{i}.csv", "w", newline=""))
+        >>>     telemetry.reset()
+        """
+        if capacity <= 0:
+            raise ValueError(f"The capacity of the GoalTelemetry should be positive, not {capacity}.")
+        self.__buffer = np.zeros(capacity, dtype=GoalTelemetry.DTYPE)
+        self.__nr_recorded = 0  # the number of events recorded since the last reset, including those overwritten
+        self.__goal_idxs = {}  # goal name -> index
+        self.__obj_idxs = {}  # object id -> index
+
+    def record(self, goal, tick, event, obj_id=None, rank=-1, progress=np.nan):
+        """ Records a single event.
+
+        Parameters
+        ----------
+        goal : str
+            The name of the goal.
+        tick : int
+            The tick of the event.
+        event : str
+            The kind of event, one of `GoalTelemetry.EVENTS`.
+        obj_id : str (default is None)
+            The id of the dropped or picked up object.
+        rank : int (default is -1)
+            The attained rank of the goal.
+        progress : float (default is NaN)
+            The progress of the goal.
+        """
+        goal_idx = self.__goal_idxs.setdefault(goal, len(self.__goal_idxs))
+        obj_idx = -1 if obj_id is None else self.__obj_idxs.setdefault(obj_id, len(self.__obj_idxs))
+        self.__buffer[self.__nr_recorded % len(self.__buffer)] = (tick, goal_idx, GoalTelemetry.EVENTS.index(event),
+                                                                 obj_idx, rank, progress)
+        self.__nr_recorded += 1
+
+    def to_numpy(self):
+        """ Returns all kept events as a NumPy structured array (see `GoalTelemetry.DTYPE`), oldest first.
+
+        Goals and objects are given as indices into `goal_names` and `obj_ids`, events as indices into `EVENTS`.
+        """
+        capacity = len(self.__buffer)
+        if self.__nr_recorded <= capacity:
+            return self.__buffer[:self.__nr_recorded].copy()
+        start = self.__nr_recorded % capacity
+        return np.concatenate([self.__buffer[start:], self.__buffer[:start]])
+
+    def goal_names(self):
+        """ Returns the names of all recorded goals, by their index in `to_numpy`. """
+        return list(self.__goal_idxs)
+
+    def obj_ids(self):
+        """ Returns the ids of all recorded objects, by their index in `to_numpy`. """
+        return list(self.__obj_idxs)
+
+    def events(self):
+        """ Returns all kept events as a list of `GoalEvent`, oldest first. """
+        goal_names = self.goal_names()
+        obj_ids = self.obj_ids()
+        return [GoalEvent(goal_names[goal], tick, GoalTelemetry.EVENTS[event], None if obj < 0 else obj_ids[obj], rank,
+                          progress)
+                for tick, goal, event, obj, rank, progress in self.to_numpy().tolist()]
+
+    def write_csv(self, fileobj):
+        """ Writes all kept events as CSV to an open text file, one row per event. """
+        writer = csv.writer(fileobj)
+        writer.writerow(GoalEvent._fields)
+        writer.writerows(self.events())
+
+    @property
+    def nr_overwritten(self):
+        """ The number of events that were overwritten since the last reset, as the buffer was full. """
+        return max(0, self.__nr_recorded - len(self.__buffer))
+
+    def reset(self):
+        """ Forgets all events, the buffer is kept. """
+        self.__nr_recorded = 0
+        self.__goal_idxs = {}
+        self.__obj_idxs = {}
+
+    def __len__(self):
+        return min(self.__nr_recorded, len(self.__buffer))
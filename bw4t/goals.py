@@ -1,28 +1,44 @@
+import copy
 import itertools
+import math
 import warnings
+import weakref
+from collections.abc import Sequence
 
 from matrx import WorldBuilder
 from matrx.goals import WorldGoal
 from matrx.grid_world import GridWorld
-from matrx.world_builder import RandomProperty
+from bw4t.object_registry import ObjectRegistry
 from bw4t.objects import CollectionTarget, CollectionDropOffTile
+from bw4t.utils import flatten_dict
 
 
 class CollectionGoal(WorldGoal):
 
-    def __init__(self, name, target_name, in_order=False):
+    def __init__(self, name, target_name, in_order=False, telemetry=None):
         super().__init__()
         # Store the attributes
         self.__area_name = name
         self.__target_name = target_name
         self.__in_order = in_order
+        self.__telemetry = telemetry  # when given, the GoalTelemetry that records our progress, drops and pickups
 
         # Set attributes we will use to speed up things and keep track of collected objects
         self.__drop_off_locs = None  # all locations where objects can be dropped off
         self.__target = None  # all (ordered) objects that need to be collected described in their properties
+        self.__requirements = None  # the target compiled into a _RequirementIndex, to match objects in one lookup
         self.__dropped_objects = {}  # a dictionary of the required dropped objects (id as key, tick as value)
         self.__attained_rank = 0  # The maximum attained rank of the correctly collected objects (only used if in_order)
 
+        # Set attributes to only check the drop off locations of which the content changed since we last checked them
+        self.__observer = None  # the CollectionZoneObserver of the world, that reads our drop off zone every tick
+        self.__zone = None  # our drop off zone, as known by the observer
+        self.__zone_version = None  # the version of our drop off zone we last checked
+        self.__detected_at = {}  # the id of each required object at a drop off location -> that location
+        self.__matches = {}  # the id of each object at a drop off location -> the indices of the target it matches
+        self.__ranked = {}  # the id of each object in the attained order -> its rank (only used if in_order)
+        self.__recorded_progress = 0.0  # the progress we last recorded with our telemetry
+
     def goal_reached(self, grid_world: GridWorld):
         if self.__drop_off_locs is None:  # find all drop off locations, its tile ID's and goal blocks
             self.__drop_off_locs = []
@@ -32,10 +48,13 @@ class CollectionGoal(WorldGoal):
                 raise ValueError(f"The CollectionGoal {self.__area_name} could not find a "
                                  f"{CollectionDropOffTile.__name__} with its 'collection_area_name' set to "
                                  f"{self.__area_name}.")
+            self.__observer = CollectionZoneObserver.of(grid_world)
+            self.__zone = self.__observer.watch(self.__drop_off_locs, grid_world)
 
         if self.__target is None:  # find all objects that need to be collected (potentially in order)
             self.__target = []
             self.__find_collection_objects(grid_world)
+            self.__requirements = _RequirementIndex(self.__target)
 
         # Go all drop locations and check if the requested objects are there (potentially dropped in the right order)
         is_satisfied = self.__check_completion(grid_world)
@@ -44,19 +63,13 @@ class CollectionGoal(WorldGoal):
         return is_satisfied
 
     def __find_drop_off_locations(self, grid_world):
-        all_objs = grid_world.environment_objects
-        for obj_id, obj in all_objs.items():
-            if 'name' in obj.properties.keys() \
-                    and self.__area_name == obj.properties['name']:
-                loc = obj.location
-                self.__drop_off_locs.append(loc)
+        for obj in ObjectRegistry.of(grid_world).find('name', self.__area_name):
+            loc = tuple(obj.location)
+            self.__drop_off_locs.append(loc)
 
     def __find_collection_objects(self, grid_world):
-        all_objs = grid_world.environment_objects
-        for obj_id, obj in all_objs.items():
-            if 'collection_zone_name' in obj.properties.keys() \
-                    and self.__area_name == obj.properties['collection_zone_name']\
-                    and 'collection_objects' in obj.properties and 'is_drop_off_target' in obj.properties\
+        for obj in ObjectRegistry.of(grid_world).find('collection_zone_name', self.__area_name):
+            if 'collection_objects' in obj.properties and 'is_drop_off_target' in obj.properties\
                     and obj.properties['is_drop_off_target']:
                 self.__target = obj.properties['collection_objects'].copy()
 
@@ -73,64 +86,73 @@ class CollectionGoal(WorldGoal):
         # Get the current tick number
         curr_tick = grid_world.current_nr_ticks
 
-        # Retrieve all objects and the drop locations (this is the most performance heavy; it loops over all drop locs
-        # and queries the world to locate all objects at that point through distance calculation. Note: this calculation
-        # is not required, as the range is zero!).
-        obj_ids = [obj_id for loc in self.__drop_off_locs
-                   for obj_id in grid_world.get_objects_in_range(loc, sense_range=0, object_type=None).keys()]
-
-        # Get all world objects and agents
-        all_objs = grid_world.environment_objects
-        all_agents = grid_world.registered_agents
-        all_ = {**all_objs, **all_agents}
-
-        # Go through all objects at the drop off locations. If an object was not already detected before as a
-        # required object, check if it is one of the desired objects. Also, ignore all drop off tiles and targets.
-        detected_objs = {}
-        for obj_id in obj_ids:
-            obj_props = all_[obj_id].properties
-            # Check if the object is either a collection area tile or a collection target object, if so skip it
-            if ("is_drop_off" in obj_props.keys() and "collection_area_name" in obj_props.keys()) \
-                    or ("is_drop_off_target" in obj_props.keys() and "collection_zone_name" in obj_props.keys()
-                        and "is_invisible" in obj_props.keys()):
-                continue
-            for req_props in self.__target:
-                obj_props = CollectionGoal.__flatten_dict(obj_props)
-                if req_props.items() <= obj_props.items():
-                    detected_objs[obj_id] = curr_tick
+        # Find the drop off locations of which the content changed since we last checked. The observer of this world
+        # notes the objects that enter and leave each drop off zone, and shares them with all goals watching the same
+        # zone. When nothing was dropped, picked up or changed, there is nothing to check and we return the past values.
+        self.__zone_version, changed_locs, left_ids = self.__observer.observe(grid_world, self.__zone,
+                                                                             since=self.__zone_version)
+        if len(changed_locs) == 0:
+            return self.is_done
+        if left_ids is None:  # we missed a change, so all drop off locations were given and all our objects may be gone
+            left_ids = list(self.__matches.keys())
+
+        # Forget the matches of the objects that left, or whose properties changed so they need to be matched again
+        for obj_id in left_ids:
+            self.__matches.pop(obj_id, None)
+
+        # Go through all objects at the changed drop off locations and check which are one of the desired objects. Each
+        # object is only matched once, when it arrives at a drop off location (or changes), and forgotten again when it
+        # leaves.
+        detected_objs = {}  # object id -> drop off location
+        for loc, obj_ids in changed_locs.items():
+            for obj_id in obj_ids:
+                matches = self.__matches.get(obj_id, None)
+                if matches is None:
+                    matches = self.__match(self.__observer.flat_properties(grid_world, obj_id))
+                    self.__matches[obj_id] = matches
+                if len(matches) > 0:
+                    detected_objs[obj_id] = loc
 
         # Now compare the detected objects with the previous detected objects to see if any new objects were detected
         # and thus should be added to the dropped objects
         is_updated = False
-        for obj_id in detected_objs.keys():
+        added = []
+        for obj_id, loc in detected_objs.items():
+            self.__detected_at[obj_id] = loc
             if obj_id not in self.__dropped_objects.keys():
                 is_updated = True
-                self.__dropped_objects[obj_id] = detected_objs[obj_id]
+                added.append(obj_id)
+                self.__dropped_objects[obj_id] = curr_tick
 
-        # Check if any objects detected previously are now not detected anymore, as such they need to be removed.
-        removed = []
-        for obj_id in self.__dropped_objects.keys():
-            if obj_id not in detected_objs.keys():
-                removed.append(obj_id)
+        # Check if any objects detected previously at a changed location are now not detected anymore, as such they
+        # need to be removed. Objects at the other locations did not move.
+        removed = [obj_id for obj_id, loc in self.__detected_at.items()
+                   if loc in changed_locs and obj_id not in detected_objs]
         for obj_id in removed:
             is_updated = True
+            self.__detected_at.pop(obj_id)
             self.__dropped_objects.pop(obj_id, None)
 
         # If required (and needed), check if the dropped objects are dropped in order by tracking the rank up which the
         # dropped objects satisfy the requested order.
         if self.__in_order and is_updated:
-            # Sort the dropped objects based on the tick they were detected (in ascending order)
-            sorted_dropped_obj = sorted(self.__dropped_objects.items(), key=lambda x: x[1], reverse=False)
-            rank = 0
-            for obj_id, tick in sorted_dropped_obj:
-                props = all_[obj_id].properties
-                props = CollectionGoal.__flatten_dict(props)
-                req_props = self.__target[rank]
-                if req_props.items() <= props.items():
-                    rank += 1
-                else:
+            # The dropped objects are kept in the order they were detected. The order is attained up to the first
+            # object that does not match the object requested at its rank. So an object that was removed from within
+            # the attained order breaks it at its rank, while the order before it still holds.
+            rank = self.__attained_rank
+            for obj_id in removed:
+                obj_rank = self.__ranked.get(obj_id, rank)
+                rank = min(rank, obj_rank)
+            if rank < self.__attained_rank:
+                self.__ranked = {obj_id: obj_rank for obj_id, obj_rank in self.__ranked.items() if obj_rank < rank}
+
+            # Continue from there with the objects dropped since, as far as they match the requested order
+            for obj_id in itertools.islice(self.__dropped_objects, rank, None):
+                if rank == len(self.__target) or rank not in self.__matches[obj_id]:
                     # as soon as the next object is not the one we expect, we stop the search at this attained rank.
                     break
+                self.__ranked[obj_id] = rank
+                rank += 1
 
             # The goal is done as soon as the attained rank is equal to the number of requested objects
             is_satisfied = rank == len(self.__target)
@@ -146,8 +168,30 @@ class CollectionGoal(WorldGoal):
         else:
             is_satisfied = self.is_done
 
+        if self.__telemetry is not None and is_updated:
+            self.__record(curr_tick, added, removed, is_satisfied)
+
         return is_satisfied
 
+    def __record(self, curr_tick, added, removed, is_satisfied):
+        # Records the dropped and picked up objects, and our progress after that, with our telemetry
+        rank = self.__attained_rank if self.__in_order else len(self.__dropped_objects)
+        progress = 1.0 if is_satisfied else rank / len(self.__target)
+        for obj_id in removed:
+            self.__telemetry.record(self.__area_name, curr_tick, "pickup", obj_id, rank, progress)
+        for obj_id in added:
+            self.__telemetry.record(self.__area_name, curr_tick, "drop", obj_id, rank, progress)
+        if progress != self.__recorded_progress:
+            self.__telemetry.record(self.__area_name, curr_tick, "progress", None, rank, progress)
+            self.__recorded_progress = progress
+
+    def __match(self, obj_props):
+        # Returns the indices of all requested objects the (flattened) object matches, none if it is a drop off tile or
+        # target
+        if _is_zone_object(obj_props):
+            return frozenset()
+        return self.__requirements.match(obj_props)
+
     def get_progress(self, grid_world):
         # If we are done, just return 1.0
         if self.is_done:
@@ -167,19 +211,461 @@ class CollectionGoal(WorldGoal):
 
         return progress
 
+    @property
+    def telemetry(self):
+        """ The GoalTelemetry that records our progress, drops and pickups, or None. """
+        return self.__telemetry
+
     @classmethod
     def get_random_order_property(cls, possibilities, length=None, with_duplicates=False):
+        """ Returns a random property that samples an ordering of the given possibilities for each created world.
+
+        The orderings are never all listed, which for `with_duplicates=True` would be `len(possibilities)**length`
+        of them. Instead, the returned `RandomOrderProperty` draws the possibility at each position directly from the
+        random generator of the builder, so worlds stay reproducible with the builder's random seed.
+
+        Parameters
+        ----------
+        possibilities : list
+            The possible values at each position, e.g. a dict of properties per possible object to collect.
+        length : int (default is None)
+            The length of each ordering, the number of possibilities when None.
+        with_duplicates : bool (default is False)
+            Whether a possibility can occur more than once in an ordering.
+
+        Returns
+        -------
+        RandomOrderProperty
+            The random property, whose values are all orderings in the order of `itertools.permutations` (without
+            duplicates) or `itertools.product` (with duplicates). Use it with a `BW4TWorldBuilder`.
+        """
         if length is None:
             length = len(possibilities)
 
-        if not with_duplicates:
-            orders = itertools.permutations(possibilities, r=length)
-        else:  # with_duplicates
-            orders = itertools.product(possibilities, repeat=length)
-        orders = list(orders)
+        return RandomOrderProperty(possibilities, length=length, with_duplicates=with_duplicates)
 
-        rp_orders = RandomProperty(values=orders)
 
-        return rp_orders
+class TimeLimitGoal(WorldGoal):
 
+    def __init__(self, goals, max_nr_ticks):
+        """ A goal that is reached when all of the given goals are, or when the world ran for a number of ticks.
 
+        A world is done when all its goals are reached, so adding a goal that is reached after some time to the other
+        goals of a world does not stop it then. A `TimeLimitGoal` does, by wrapping those goals; use it as the only goal
+        of the world.
+
+        Parameters
+        ----------
+        goals : WorldGoal or list/tuple of WorldGoal
+            The goals that need to be reached.
+        max_nr_ticks : int
+            The number of ticks after which the goal is reached anyway.
+        """
+        super().__init__()
+        self.__goals = list(goals) if isinstance(goals, (list, tuple)) else [goals]
+        self.__max_nr_ticks = max_nr_ticks
+
+    def goal_reached(self, grid_world: GridWorld):
+        # Check all goals each tick, also when one is not reached, so they all keep track of the world
+        goals_reached = [goal.goal_reached(grid_world) for goal in self.__goals]
+        self.is_done = all(goals_reached) or grid_world.current_nr_ticks >= self.__max_nr_ticks
+        return self.is_done
+
+    def get_progress(self, grid_world):
+        # The progress of the slowest goal
+        return min(goal.get_progress(grid_world) for goal in self.__goals)
+
+    def reset(self):
+        goal = super().reset()
+        goal.__goals = [wrapped.reset() for wrapped in self.__goals]
+        return goal
+
+    @property
+    def goals(self):
+        """ The wrapped goals. """
+        return list(self.__goals)
+
+
+class RandomOrderProperty:
+
+    def __init__(self, possibilities, length, with_duplicates=False, allow_duplicates=True):
+        """ A random property that samples a uniformly random ordering of some possibilities, without listing them.
+
+        It is used as a `RandomProperty` whose values are all orderings would be, but it is not one as that lists a
+        probability for each of its values. Its `values` are an `OrderingSequence` instead, which computes each ordering
+        from its index. Sampling does not use these values but draws the possibility at each position, each with equal
+        probability. Without duplicates these are drawn without replacement.
+
+        A `BW4TWorldBuilder` draws an ordering for each world it creates, for each object property that is a
+        `RandomOrderProperty`.
+
+        Parameters
+        ----------
+        possibilities : list
+            The possible values at each position.
+        length : int
+            The length of each ordering.
+        with_duplicates : bool (default is False)
+            Whether a possibility can occur more than once in an ordering.
+        allow_duplicates : bool (default is True)
+            Whether the same ordering can be sampled for more than one world, as with `RandomProperty`.
+        """
+        if not with_duplicates and length > len(possibilities):
+            raise ValueError(f"Cannot order {len(possibilities)} possibilities in a sequence of length {length} "
+                             f"without duplicates.")
+
+        self.__orderings = OrderingSequence(possibilities, length, with_duplicates)
+        self.__allow_duplicates = allow_duplicates
+        self.__selected_values = set()  # the sampled orderings, each as the tuple of the indices of its possibilities
+
+    @property
+    def values(self):
+        """ All orderings, as an `OrderingSequence`. """
+        return self.__orderings
+
+    @property
+    def selected_values(self):
+        """ The orderings sampled so far, each as the tuple of the indices of its possibilities. """
+        return self.__selected_values
+
+    @property
+    def allow_duplicates(self):
+        """ Whether an ordering may be sampled more than once. """
+        return self.__allow_duplicates
+
+    def reset(self):
+        """ Forgets the sampled orderings, so all can be sampled again. """
+        self.__selected_values = set()
+
+    def _get_property(self, rng, size=None):
+        # Draws one ordering (or a list of `size` orderings) with the random generator of the builder. Each ordering is
+        # a new list with a copy of each possibility, so worlds never share (and change) the same possibility.
+        if size is not None:
+            return [self._get_property(rng) for _ in range(size)]
+
+        orderings = self.__orderings
+        if not self.__allow_duplicates and len(self.__selected_values) >= orderings.nr_orderings:
+            raise ValueError(f"Cannot sample another ordering, all {orderings.nr_orderings} orderings were sampled "
+                             f"already and duplicates are not allowed.")
+        while True:
+            if orderings.with_duplicates:
+                idxs = rng.randint(len(orderings.possibilities), size=orderings.length)
+            else:
+                idxs = rng.choice(len(orderings.possibilities), size=orderings.length, replace=False)
+            idxs = tuple(idxs.tolist())
+            if self.__allow_duplicates or idxs not in self.__selected_values:
+                break
+        self.__selected_values.add(idxs)
+        return [copy.deepcopy(orderings.possibilities[idx]) for idx in idxs]
+
+
+class OrderingSequence(Sequence):
+
+    def __init__(self, possibilities, length, with_duplicates=False):
+        """ All orderings of some possibilities as a read-only sequence, that computes each ordering from its index.
+
+        The orderings are in the same order as those of `itertools.permutations` (without duplicates) or
+        `itertools.product` (with duplicates), but are never listed. As their number can be too large for `len`, it is
+        also available as `nr_orderings`.
+
+        Parameters
+        ----------
+        possibilities : list
+            The possible values at each position.
+        length : int
+            The length of each ordering.
+        with_duplicates : bool (default is False)
+            Whether a possibility can occur more than once in an ordering.
+        """
+        self.possibilities = list(possibilities)
+        self.length = length
+        self.with_duplicates = with_duplicates
+        if with_duplicates:
+            self.nr_orderings = len(self.possibilities) ** length
+        else:
+            self.nr_orderings = math.perm(len(self.possibilities), length)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[idx] for idx in range(*index.indices(self.nr_orderings))]
+        if index < 0:
+            index += self.nr_orderings
+        if not 0 <= index < self.nr_orderings:
+            raise IndexError("ordering index out of range")
+
+        # Unrank the index; each position splits the remaining orderings into equally sized blocks, one per possibility
+        # still available at that position
+        remaining = list(self.possibilities)
+        ordering = []
+        for pos in range(self.length):
+            if self.with_duplicates:
+                block_size = len(remaining) ** (self.length - pos - 1)
+            else:
+                block_size = math.perm(len(remaining) - 1, self.length - pos - 1)
+            idx, index = divmod(index, block_size)
+            ordering.append(remaining[idx] if self.with_duplicates else remaining.pop(idx))
+        return tuple(ordering)
+
+    def __len__(self):
+        return self.nr_orderings
+
+    def __bool__(self):
+        return self.nr_orderings > 0
+
+    def copy(self):
+        # The sequence cannot be changed, so it is its own copy
+        return self
+
+
+class CollectionZoneObserver:
+
+    # The observer of each world, created when a goal first asks for it
+    __observers = weakref.WeakKeyDictionary()  # GridWorld -> CollectionZoneObserver
+
+    def __init__(self):
+        """ Observes the objects that enter and leave the drop off zones of all `CollectionGoal`s in a single world.
+
+        Several goals can share the same drop off locations (see `add_collection_goal`). Instead of each goal reading
+        the content of these locations every tick, the observer listens to the `ObjectRegistry` of the world. It is told
+        about each object that is added to the grid (e.g. dropped by an agent) or removed from it (e.g. grabbed), and
+        notes the ones at the locations of a zone. Each tick, it hands the locations of which the content changed to
+        every goal that watches that zone. The flattened properties of the objects at those locations are also shared,
+        so each object is flattened once per tick however many goals match it.
+
+        The objects in the zones are also checked once per tick for changed properties (e.g. a changed colour, or a
+        location changed without being removed from the grid), an object that changed leaves and enters the zone again.
+        The cost of observing the zones thus grows with the number of objects in them, not with the number of their
+        locations nor with the number of goals. The drop off tiles and targets of the zones, and all agents, are not
+        observed as these are never collected.
+
+        Each zone has a version that increases with every tick in which its content changed. Goals pass the version
+        they last saw, so a goal that did not check the zone every tick still gets all changes.
+
+        Use `CollectionZoneObserver.of` to get the observer of a world, and `watch` to add a zone to it.
+        """
+        self.__zones = {}  # each zone (the frozenset of its locations) -> its _ObservedZone
+        self.__zones_at = {}  # each observed location -> the _ObservedZone's with that location
+        self.__observed = {}  # the id of each object in a zone -> its location and its flattened properties
+        self.__flat_props = {}  # object id -> its flattened properties, for the objects asked for this tick
+        self.__tick = None  # the tick of the flattened properties
+
+    @classmethod
+    def of(cls, grid_world):
+        """ Returns the observer of a world, creates one if the world did not have one yet.
+
+        The world has to keep an `ObjectRegistry`, so it has to be created by a `BW4TWorldBuilder`.
+        """
+        observer = cls.__observers.get(grid_world, None)
+        if observer is None:
+            observer = cls()
+            ObjectRegistry.of(grid_world).listen(observer)
+            cls.__observers[grid_world] = observer
+        return observer
+
+    def watch(self, locs, grid_world):
+        """ Starts to observe a zone, if it was not observed yet, and returns it to pass to `observe`.
+
+        The objects already in a new zone are read from the grid once, all others are noticed when they enter it.
+
+        Parameters
+        ----------
+        locs : list of (x, y)
+            The locations of the zone. Objects dropped in the same tick are detected in the order of these locations,
+            as given by the first goal that watches the zone.
+        grid_world : GridWorld
+            The world.
+
+        Returns
+        -------
+        frozenset
+            The zone, which is the set of its locations.
+        """
+        zone = frozenset(locs)
+        if zone in self.__zones:
+            return zone
+
+        observed_zone = _ObservedZone(locs)
+        self.__zones[zone] = observed_zone
+        for loc in observed_zone.locs:
+            self.__zones_at.setdefault(loc, []).append(observed_zone)
+            obj_ids = grid_world.grid[loc[1], loc[0]]
+            for obj_id in () if obj_ids is None else obj_ids:
+                obj = grid_world.environment_objects.get(obj_id, None)  # None for an agent
+                if obj is not None:
+                    self.__enter(obj, loc)
+        return zone
+
+    def observe(self, grid_world, zone, since=None):
+        """ Returns the locations of a zone of which the content changed since a version of that zone.
+
+        Parameters
+        ----------
+        grid_world : GridWorld
+            The world.
+        zone : frozenset
+            The zone, as returned by `watch`.
+        since : int (default is None)
+            The version of the zone the caller saw last, None if it never saw the zone.
+
+        Returns
+        -------
+        (int, dict, list)
+            The current version of the zone, the ids of all objects at each changed location and the ids of all objects
+            that left those locations or whose properties changed. The latter is None when the caller missed a version;
+            all locations are then given as changed.
+        """
+        if self.__tick != grid_world.current_nr_ticks:
+            self.__next_tick(grid_world)
+        zone = self.__zones[zone]
+
+        if since == zone.version:  # nothing changed since the caller last looked
+            return zone.version, {}, []
+        if since == zone.version - 1:  # the caller only needs the last changes
+            return zone.version, zone.changed_locs, zone.left_ids
+        return zone.version, {loc: tuple(obj_ids) for loc, obj_ids in zone.contents.items()}, None
+
+    def flat_properties(self, grid_world, obj_id):
+        """ Returns the flattened properties of an object or agent, flattened at most once per tick. """
+        if self.__tick != grid_world.current_nr_ticks:
+            self.__next_tick(grid_world)
+        obj_props = self.__flat_props.get(obj_id, None)
+        if obj_props is None:
+            obj_props = flatten_dict(_get_object(grid_world, obj_id).properties)
+            self.__flat_props[obj_id] = obj_props
+        return obj_props
+
+    def object_added(self, obj):
+        """ Notes an object that is added to the grid, if it entered a zone. Called by the `ObjectRegistry`. """
+        if obj.obj_id in self.__observed:  # added again without being removed, so it may have moved
+            self.__leave(obj.obj_id)
+        loc = tuple(obj.location)
+        if loc in self.__zones_at:
+            self.__enter(obj, loc)
+
+    def object_removed(self, obj):
+        """ Notes an object that is removed from the grid, if it left a zone. Called by the `ObjectRegistry`. """
+        if obj.obj_id in self.__observed:
+            self.__leave(obj.obj_id)
+
+    def __next_tick(self, grid_world):
+        # Forgets the flattened properties of the last tick, lets each object of which the properties changed leave and
+        # enter its zone again, and gives each zone of which the content changed a new version
+        self.__tick = grid_world.current_nr_ticks
+        self.__flat_props = {}
+        for obj_id, (loc, prev_obj_props) in list(self.__observed.items()):
+            obj = grid_world.environment_objects[obj_id]
+            obj_props = flatten_dict(obj.properties)
+            self.__flat_props[obj_id] = obj_props
+            if obj_props != prev_obj_props:
+                self.__leave(obj_id)
+                self.object_added(obj)
+        for zone in self.__zones.values():
+            zone.next_version()
+
+    def __enter(self, obj, loc):
+        # Notes an object at a location of one or more zones, unless it is a drop off tile or target
+        obj_props = flatten_dict(obj.properties)
+        if _is_zone_object(obj_props):
+            return
+        self.__observed[obj.obj_id] = (loc, obj_props)
+        for zone in self.__zones_at[loc]:
+            zone.enter(obj.obj_id, loc)
+
+    def __leave(self, obj_id):
+        # Notes an object that left the location of its zones
+        loc, _ = self.__observed.pop(obj_id)
+        for zone in self.__zones_at[loc]:
+            zone.leave(obj_id, loc)
+
+
+class _ObservedZone:
+
+    def __init__(self, locs):
+        """ The content of a drop off zone, as observed by a `CollectionZoneObserver`.
+
+        Parameters
+        ----------
+        locs : list of (x, y)
+            The locations of the zone, in the order their changes are given.
+        """
+        self.locs = tuple(dict.fromkeys(tuple(loc) for loc in locs))
+        self.version = 0
+        self.contents = {loc: {} for loc in self.locs}  # each location -> the ids of its objects, as an ordered set
+        self.changed_locs = {}  # the ids of the objects at each location that changed in the last version
+        self.left_ids = []  # the ids of the objects that left (or changed) in the last version
+        self.__pending_locs = set()  # the locations that changed since the last version
+        self.__pending_left_ids = []  # the ids of the objects that left (or changed) since the last version
+
+    def enter(self, obj_id, loc):
+        self.contents[loc][obj_id] = None
+        self.__pending_locs.add(loc)
+
+    def leave(self, obj_id, loc):
+        self.contents[loc].pop(obj_id, None)
+        self.__pending_locs.add(loc)
+        self.__pending_left_ids.append(obj_id)
+
+    def next_version(self):
+        # Makes the changes since the last version the next version, if there were any
+        if len(self.__pending_locs) == 0:
+            return
+        self.version += 1
+        self.changed_locs = {loc: tuple(self.contents[loc]) for loc in self.locs if loc in self.__pending_locs}
+        self.left_ids = self.__pending_left_ids
+        self.__pending_locs = set()
+        self.__pending_left_ids = []
+
+
+class _RequirementIndex:
+
+    def __init__(self, requirements):
+        """ The requested objects of a `CollectionGoal` compiled into a lookup table.
+
+        Requirements are grouped by the property names they require, and within a group by the values they require. An
+        object is then matched against all requirements with a single dict lookup per group of property names, instead
+        of comparing it to each requirement. Requirements with unhashable values are compared one by one.
+
+        Parameters
+        ----------
+        requirements : list of dict
+            The (flattened) properties of each requested object.
+        """
+        self.__groups = {}  # tuple of property names -> tuple of their required values -> indices of the requirements
+        self.__others = []  # (index, requirement) of the requirements with unhashable values
+        for idx, req_props in enumerate(requirements):
+            names = tuple(sorted(req_props.keys()))
+            values = tuple(req_props[name] for name in names)
+            try:
+                self.__groups.setdefault(names, {}).setdefault(values, []).append(idx)
+            except TypeError:
+                self.__others.append((idx, req_props))
+
+    def match(self, obj_props):
+        """ Returns the indices of all requirements the (flattened) properties of an object comply with. """
+        matches = []
+        for names, by_values in self.__groups.items():
+            try:
+                values = tuple(obj_props[name] for name in names)
+                matches.extend(by_values.get(values, ()))
+            except (KeyError, TypeError):  # the object misses a property or has an unhashable value
+                continue
+        for idx, req_props in self.__others:
+            if req_props.items() <= obj_props.items():
+                matches.append(idx)
+        return frozenset(matches)
+
+
+def _is_zone_object(obj_props):
+    # Whether the (flattened) properties are those of a drop off tile or target, which are part of a zone and never
+    # collected
+    return ("is_drop_off" in obj_props.keys() and "collection_area_name" in obj_props.keys()) \
+        or ("is_drop_off_target" in obj_props.keys() and "collection_zone_name" in obj_props.keys()
+            and "is_invisible" in obj_props.keys())
+
+
+def _get_object(grid_world, obj_id):
+    # Returns an environment object or agent of the world by its id
+    obj = grid_world.environment_objects.get(obj_id, None)
+    if obj is None:
+        obj = grid_world.registered_agents[obj_id]
+    return obj
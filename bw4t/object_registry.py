@@ -0,0 +1,179 @@
+from matrx.grid_world import GridWorld
+
+
+class ObjectRegistry:
+
+    # The properties indexed by default
+    PROPERTIES = ("name", "collection_zone_name", "collection_area_name", "room_name")
+
+    def __init__(self, prop_names=PROPERTIES):
+        """ An index of the environment objects of a world by the values of some of their properties.
+
+        Finding objects by a property (e.g. the drop off tiles of a goal by their name) otherwise requires a scan over
+        all objects of the world. A `RegistryGridWorld` adds each object it registers to its registry and removes each
+        object it removes from the grid (e.g. when an object is grabbed and dropped again), so the registry holds all
+        objects of the world. Finding all objects with a property value is then a single lookup.
+
+        The indexed properties should not change after an object is added, as the registry does not notice that.
+        Objects whose value does change can be removed and added again.
+
+        Others can `listen` to the registry, to be told about each object that is added or removed (e.g. to notice the
+        objects that enter or leave some locations without reading these from the grid every tick).
+
+        Use `ObjectRegistry.of` to get the registry of a world. A `BW4TWorldBuilder` creates each world with one.
+
+        Parameters
+        ----------
+        prop_names : tuple of str (default is ObjectRegistry.PROPERTIES)
+            The names of the indexed properties.
+        """
+        self.__index = {prop_name: {} for prop_name in prop_names}  # property name -> value -> {object id: object}
+        self.__listeners = []  # all that are told about each added and removed object
+
+    @staticmethod
+    def of(grid_world):
+        """ Returns the registry of a world.
+
+        Parameters
+        ----------
+        grid_world : GridWorld
+            The world, a `RegistryGridWorld`.
+
+        Returns
+        -------
+        ObjectRegistry
+            The registry of the world.
+
+        Raises
+        ------
+        ValueError
+            When the world does not keep a registry, as it was not created by a `BW4TWorldBuilder`.
+        """
+        if not isinstance(grid_world, RegistryGridWorld):
+            raise ValueError(f"The world {grid_world.world_id} does not keep an ObjectRegistry of its objects, "
+                             f"create it with a BW4TWorldBuilder.")
+        return grid_world.registry
+
+    def find(self, prop_name, value):
+        """ Returns all objects with the given value of an indexed property.
+
+        Parameters
+        ----------
+        prop_name : str
+            The name of the property, one of the indexed properties.
+        value
+            The value of the property.
+
+        Returns
+        -------
+        list
+            The objects, in the order they were added.
+
+        Raises
+        ------
+        ValueError
+            When the property is not indexed.
+        """
+        by_value = self.__index.get(prop_name, None)
+        if by_value is None:
+            raise ValueError(f"The property {prop_name} is not indexed by the ObjectRegistry, only "
+                             f"{list(self.__index.keys())} are.")
+        try:
+            return list(by_value.get(value, {}).values())
+        except TypeError:  # an unhashable value, which is never indexed
+            return []
+
+    def listen(self, listener):
+        """ Tells a listener about each object that is added to or removed from the registry from now on.
+
+        Parameters
+        ----------
+        listener
+            The listener, with an `object_added(obj)` and an `object_removed(obj)` method. These are called after the
+            object was added or removed.
+        """
+        self.__listeners.append(listener)
+
+    def add(self, obj):
+        """ Adds an object to the index of each indexed property it has, and tells all listeners. """
+        props = obj.properties
+        for prop_name, by_value in self.__index.items():
+            if prop_name not in props:
+                continue
+            try:
+                by_value.setdefault(props[prop_name], {})[obj.obj_id] = obj
+            except TypeError:  # an unhashable value, which we cannot index
+                continue
+        for listener in self.__listeners:
+            listener.object_added(obj)
+
+    def remove(self, obj):
+        """ Removes an object from the index of each indexed property it has, and tells all listeners. """
+        props = obj.properties
+        for prop_name, by_value in self.__index.items():
+            if prop_name not in props:
+                continue
+            try:
+                objs = by_value.get(props[prop_name], None)
+            except TypeError:
+                continue
+            if objs is not None:
+                objs.pop(obj.obj_id, None)
+                if len(objs) == 0:
+                    del by_value[props[prop_name]]
+        for listener in self.__listeners:
+            listener.object_removed(obj)
+
+
+class RegistryGridWorld(GridWorld):
+
+    def __init__(self, *args, registry=None, **kwargs):
+        """ A `GridWorld` that keeps an `ObjectRegistry` of all its environment objects.
+
+        The world adds each object to its registry when it registers it (e.g. when the builder creates the world, or an
+        agent drops an object), and removes it again when it removes the object from the grid (e.g. when an agent grabs
+        it). A `BW4TWorldBuilder` creates its worlds as a `RegistryGridWorld`.
+
+        Unlike a `GridWorld`, the world can be pickled once its agents are registered (e.g. to send it to another
+        process), as it does not hand its agents a private method to check their actions with.
+
+        Parameters
+        ----------
+        *args
+            The arguments of `GridWorld`.
+        registry : ObjectRegistry (default is None)
+            The registry of the world, one with the default properties when None.
+        **kwargs
+            The keyword arguments of `GridWorld`.
+        """
+        super().__init__(*args, **kwargs)
+        self.__registry = ObjectRegistry() if registry is None else registry
+
+    @property
+    def registry(self):
+        """ The `ObjectRegistry` of all environment objects of this world. """
+        return self.__registry
+
+    def _register_env_object(self, env_object, ensure_unique_id=True):
+        obj_id = super()._register_env_object(env_object, ensure_unique_id=ensure_unique_id)
+        self.__registry.add(env_object)
+        return obj_id
+
+    def remove_from_grid(self, object_id, remove_from_carrier=True):
+        obj = self.environment_objects.get(object_id, None)
+        success = super().remove_from_grid(object_id, remove_from_carrier=remove_from_carrier)
+        if success and obj is not None:
+            self.__registry.remove(obj)
+        return success
+
+    def _register_agent(self, agent, agent_body):
+        agent_id = super()._register_agent(agent, agent_body)
+        # The GridWorld hands each brain its private `__check_action_is_possible`, a bound method that is pickled by its
+        # unmangled name and thus not found back. The brain gets our own method for it instead.
+        agent._AgentBrain__callback_is_action_possible = self._check_action_is_possible
+        return agent_id
+
+    def _check_action_is_possible(self, agent_id, action_name, action_kwargs, world_state):
+        """ Returns the result of whether an agent can perform an action, see `GridWorld.__check_action_is_possible`.
+        """
+        return self._GridWorld__check_action_is_possible(agent_id, action_name, action_kwargs, world_state)
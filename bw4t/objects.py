@@ -1,4 +1,4 @@
-from collections import Iterable
+from collections.abc import Iterable
 
 from matrx.objects import AreaTile, EnvObject
 import numpy as np
@@ -4,21 +4,42 @@ from matrx import WorldBuilder
 from matrx.cases import vis_test
 from matrx.objects import SquareBlock
 
-from bw4t.bw4t_world import create_builder
+from bw4t.bw4t_world import create_builder, random_seed
+from bw4t.goal_telemetry import GoalTelemetry
+from bw4t.goals import CollectionGoal
+from bw4t.world_prefetch import PrefetchedWorlds
 
 
 if __name__ == "__main__":
 
-    # Create our world builder
+    # Create our world builder, which we use to start the api and visualizer
     builder = create_builder()
 
+    # Create the worlds in the background, the next ones while the current one runs. Each world is created by its own
+    # builder whose goals record their progress with their own copy of our telemetry. These builders are headless, as
+    # only ours starts the api and visualizer. The background processes are started before the api and visualizer are.
+    worlds = PrefetchedWorlds(create_builder, nr_of_worlds=10, random_seed=random_seed, headless=True,
+                              telemetry=GoalTelemetry())
+
     # Start overarching MATRX scripts and threads, such as the api and/or visualizer if requested. Here we also link our
     # own media resource folder with MATRX.
     media_folder = os.path.join(os.path.dirname(__file__), "media")
     builder.startup(media_folder=media_folder)
 
-    for world in builder.worlds(nr_of_worlds=10):
+    # The folder where we write the progress of the goals in each world
+    telemetry_folder = os.path.join(os.path.dirname(__file__), "telemetry")
+    os.makedirs(telemetry_folder, exist_ok=True)
+
+    for world_nr, world in enumerate(worlds):
         print("Started world...")
         world.run(builder.api_info)
 
+        # Write all goal events of this world at once, if it has a collection goal that recorded them
+        goals = world.simulation_goal if isinstance(world.simulation_goal, (list, tuple)) else [world.simulation_goal]
+        telemetry = next((goal.telemetry for goal in goals if isinstance(goal, CollectionGoal)), None)
+        if telemetry is None:
+            continue
+        with open(os.path.join(telemetry_folder, f"goals_world_{world_nr}.csv"), "w", newline="") as fileobj:
+            telemetry.write_csv(fileobj)
+
     builder.stop()
@@ -0,0 +1,121 @@
+import argparse
+import csv
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bw4t.builder import add_goal
+from bw4t.bw4t_world import create_builder, random_seed
+from bw4t.goals import TimeLimitGoal
+from bw4t.world_prefetch import PrefetchedWorlds
+
+
+# The result of a single world; its number, the seed of its builder, its id, whether all its goals were reached, the
+# number of ticks it ran, the progress of its slowest goal and the (wall clock) seconds it took to run.
+WorldResult = namedtuple("WorldResult", ["world_nr", "seed", "world_id", "is_done", "nr_ticks", "progress",
+                                         "wall_time"])
+
+
+def run_world(world_nr, seed=random_seed, max_nr_ticks=10000):
+    """ Creates and runs a single headless BW4T world, and returns its result.
+
+    The world is the same as the one `PrefetchedWorlds` creates with `create_builder` for the same seed and number.
+
+    Parameters
+    ----------
+    world_nr : int
+        The number of the world.
+    seed : int (default is `bw4t_world.random_seed`)
+        The seed from which the seed of the world is derived.
+    max_nr_ticks : int (default is 10000)
+        The number of ticks after which the world is stopped when its goals are not reached yet, never when None.
+
+    Returns
+    -------
+    WorldResult
+        The result of the world.
+    """
+    world_seed = PrefetchedWorlds.world_seed(seed, world_nr)
+    builder = create_builder(seed=world_seed, headless=True)
+    if max_nr_ticks is not None:
+        add_goal(builder, TimeLimitGoal(builder.world_settings["simulation_goal"], max_nr_ticks), overwrite=True)
+    world = builder.get_world(world_nr=world_nr)
+
+    start = time.perf_counter()
+    world.run(builder.api_info)
+    wall_time = time.perf_counter() - start
+
+    # The goals of the world, without the time limit
+    goals = world.simulation_goal
+    goals = list(goals) if isinstance(goals, (list, tuple)) else [goals]
+    if max_nr_ticks is not None:
+        goals = [wrapped for goal in goals for wrapped in goal.goals]
+
+    return WorldResult(world_nr, world_seed, world.world_id, all(goal.is_done for goal in goals),
+                       world.current_nr_ticks, min(goal.get_progress(world) for goal in goals), wall_time)
+
+
+def run_experiments(nr_of_worlds, seed=random_seed, max_nr_ticks=10000, max_workers=None, verbose=True):
+    """ Runs a number of headless BW4T worlds in a pool of processes, and returns their results.
+
+    Each world is created and run by a process of its own, without the api and visualizer and as fast as possible. The
+    worlds only depend on the seed and their number, so the results are the same for any number of processes (apart
+    from the wall time).
+
+    Parameters
+    ----------
+    nr_of_worlds : int
+        The number of worlds.
+    seed : int (default is `bw4t_world.random_seed`)
+        The seed from which the seed of each world is derived.
+    max_nr_ticks : int (default is 10000)
+        The number of ticks after which a world is stopped when its goals are not reached yet, never when None.
+    max_workers : int (default is None)
+        The number of processes, the number of processors when None.
+    verbose : bool (default is True)
+        Whether to print the result of each world as it is done.
+
+    Returns
+    -------
+    list of WorldResult
+        The result of each world, by its number.
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(run_world, world_nr, seed, max_nr_ticks) for world_nr in range(nr_of_worlds)]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if verbose:
+                status = "done" if result.is_done else "stopped"
+                print(f"[{len(results)}/{nr_of_worlds}] World {result.world_nr} {status} after {result.nr_ticks} ticks "
+                      f"with progress {result.progress:.2f} in {result.wall_time:.1f}s.")
+
+    return sorted(results, key=lambda result: result.world_nr)
+
+
+def write_csv(results, fileobj):
+    """ Writes the results of worlds as CSV to an open text file, one row per world. """
+    writer = csv.writer(fileobj)
+    writer.writerow(WorldResult._fields)
+    writer.writerows(results)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Runs BW4T worlds headless in parallel, and writes a summary of their "
+                                                 "results as CSV.")
+    parser.add_argument("--worlds", type=int, default=100, help="the number of worlds")
+    parser.add_argument("--seed", type=int, default=random_seed, help="the seed of all worlds")
+    parser.add_argument("--max-ticks", type=int, default=10000,
+                        help="the number of ticks after which a world is stopped when its goals are not reached yet")
+    parser.add_argument("--workers", type=int, default=None, help="the number of processes")
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(__file__), "experiments.csv"),
+                        help="the CSV file of the summary")
+    args = parser.parse_args()
+
+    results = run_experiments(args.worlds, seed=args.seed, max_nr_ticks=args.max_ticks,
+                              max_workers=args.workers)
+    with open(args.output, "w", newline="") as fileobj:
+        write_csv(results, fileobj)
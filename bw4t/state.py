@@ -1,89 +1,154 @@
-import copy
-from collections import Iterable
-from collections.abc import MutableMapping
+import itertools
+import weakref
+from collections import namedtuple
+from collections.abc import Mapping, MutableMapping
 
-from matrx import WorldBuilder
-from matrx.objects import Door, AreaTile, Wall
+import numpy as np
 
-from bw4t.builder import _flatten_dict
+from bw4t import state_io
+from bw4t.state_columns import ColumnStore
+from bw4t.state_index import PropertyIndex, RoomIndex, SpatialIndex
+from bw4t.state_maps import OcclusionMap, TraverseMap, is_opaque, visible_locations
+from bw4t.state_memory import DecayArray
+from bw4t.state_profile import query_shape
 
 
-class State(MutableMapping):
+# The changes a single `State.state_update` made to the state. All fields are dicts with object ids as keys; `added`
+# and `changed` contain the objects as they are now, `removed` the objects as they were last known and `previous` the
+# objects in `changed` as they were before.
+StateDelta = namedtuple("StateDelta", ["added", "changed", "removed", "previous"])
 
-    def __init__(self, memorize_for_ticks=None):
-        if memorize_for_ticks is None:
-            self.__decay_val = 0
-        else:
-            self.__decay_val = 1.0 / memorize_for_ticks
 
-        self.__state_dict = {}
-        self.__prev_state_dict = {}
-        self.__decays = {}
+class StateQuery:
 
-    def state_update(self, state_dict):
-        prev_state = self.__state_dict.copy()
-        state = state_dict.copy()
+    def __init__(self, query, combined, obj_ids, props, run_query):
+        """ A query on a `State` that is interpreted once and can be run many times, as created by `State.compile`.
 
-        # Get the ids of all newly perceived objects
-        new_ids = set(state.keys()) - set(prev_state.keys())
+        Parameters
+        ----------
+        query : str, list, dict
+            The original query.
+        combined : bool
+            Whether objects should have all properties (True) or any of them (False).
+        obj_ids : tuple or None
+            The object ids the query asks for, when it may consist of object ids.
+        props : tuple of (str, tuple)
+            The property names and their allowable values the query asks for, when it does not consist of object ids.
+        run_query : callable
+            The function of the state that runs this query.
+        """
+        self.query = query
+        self.combined = combined
+        self.obj_ids = obj_ids
+        self.props = props
+        self.__run_query = run_query
 
-        # Get the ids of all objects that were perceived before as well
-        persistent_ids = set(state.keys()) - new_ids
+    def run(self):
+        """ Runs the query against the current state.
 
-        # Get the ids of all objects that are not perceived any more
-        gone_ids = set(prev_state.keys()) - set(state.keys())
+        Returns
+        -------
+        list
+            All found objects, or None when nothing was found.
+        """
+        return self.__run_query(self)
 
-        # Handle knowledge decay if decay actually matters (e.g. that stuff need to be memorized)
-        if self.__decay_val > 0:
-            # Decay the decays of all objects that are not perceived any longer
-            for obj_id in gone_ids:
-                self.__decays[obj_id] = max((self.__decays[obj_id] - self.__decay_val), 0)
-
-            # Reset the decays of all objects that are still perceived
-            for obj_id in persistent_ids:
-                self.__decays[obj_id] = 1.0
-
-            # Add all new decays of the newly perceived objects
-            for obj_id in new_ids:
-                self.__decays[obj_id] = 1.0
-
-            # Check for non-zero decays and flag them for keeping (this now also includes all new_ids as we just added
-            # them).
-            to_keep_ids = []
-            for obj_id, decay in self.__decays.items():
-                if decay > 0:
-                    to_keep_ids.append(obj_id)
-                else:  # remove all zero decay objects, this reduces the self.__decays of growing with zero decays
-                    self.__decays.pop(obj_id)
-            to_keep_ids = set(to_keep_ids)
-
-        # If decay does not matter, flag all objects for keeping that are newly or still perceived
-        else:
-            to_keep_ids = new_ids.union(persistent_ids)
-
-        # Create new state
-        new_state = {}
-        for obj_id in to_keep_ids:
-            # If the object id is in the received state, pick that one. This makes sure that any objects that were also
-            # in the previous state get updated with newly perceived properties
-            if obj_id in state.keys():
-                new_state[obj_id] = state[obj_id]
-            # If the object id is not in the received state, it may still be in the previous state (e.g. because its
-            # decay was non-zero). Though this only happens when decay is set.
-            elif obj_id in prev_state.keys():
-                new_state[obj_id] = prev_state[obj_id]
-
-        # Set the new state
-        self.__prev_state_dict = self.__state_dict
-        self.__state_dict = new_state
-        # self.update(dict(*args, **kwargs))  # use the free update to set keys
+    def __repr__(self):
+        return f"StateQuery({self.query!r}, combined={self.combined})"
 
-        # Return self
-        return self
 
-    ###############################################
-    # Methods that allow State to be used as dict #
-    ###############################################
+class StateSnapshot(Mapping):
+
+    # Marks that an object was not in the state when the snapshot was taken
+    ABSENT = object()
+
+    def __init__(self, state_dict, memorize_for_ticks, agent_id):
+        """ A read-only view on the objects of a `State` as they were when it was taken, created by `State.snapshot`.
+
+        The snapshot reads from the same dict as its state. Before the state changes, adds or removes an object, it
+        passes the previous version of that object (or `StateSnapshot.ABSENT`) to the snapshot, which keeps it. Reading
+        an object thus first checks these preserved objects and otherwise the state's dict.
+
+        Parameters
+        ----------
+        state_dict : dict
+            The dict of the state.
+        memorize_for_ticks : int
+            The `memorize_for_ticks` of the state, used when the snapshot is turned into a state.
+        agent_id : str
+            The agent id of the state, used when the snapshot is turned into a state.
+        """
+        self.__state_dict = state_dict
+        self.__preserved = {}  # object id -> the object when the snapshot was taken (or ABSENT)
+        self.__len = len(state_dict)
+        self.__memorize_for_ticks = memorize_for_ticks
+        self.__agent_id = agent_id
+
+    def _preserve(self, obj_id, obj):
+        # Called by the state before it changes an object; we only keep the first, as that is what it was at our time
+        if obj_id not in self.__preserved:
+            self.__preserved[obj_id] = obj
+
+    def __getitem__(self, obj_id):
+        obj = self.__preserved.get(obj_id, None)
+        if obj is None:
+            return self.__state_dict[obj_id]
+        elif obj is StateSnapshot.ABSENT:
+            raise KeyError(obj_id)
+        return obj
+
+    def __iter__(self):
+        # All objects the state still has (unless they were added later), and then those it removed since
+        for obj_id in list(self.__state_dict):
+            if self.__preserved.get(obj_id, None) is not StateSnapshot.ABSENT:
+                yield obj_id
+        for obj_id, obj in list(self.__preserved.items()):
+            if obj is not StateSnapshot.ABSENT and obj_id not in self.__state_dict:
+                yield obj_id
+
+    def __len__(self):
+        return self.__len
+
+    def __contains__(self, obj_id):
+        obj = self.__preserved.get(obj_id, None)
+        if obj is None:
+            return obj_id in self.__state_dict
+        return obj is not StateSnapshot.ABSENT
+
+    def as_dict(self):
+        """ Returns the objects of this snapshot as a new dict. """
+        return {obj_id: self[obj_id] for obj_id in self}
+
+    def to_state(self):
+        """ Returns a new `State` containing the objects of this snapshot, so it can be queried like any state. """
+        state = State(memorize_for_ticks=self.__memorize_for_ticks, agent_id=self.__agent_id)
+        return state.state_update_delta(self.as_dict(), [])
+
+
+class BaseState(Mapping):
+
+    def __init__(self, agent_id=None, profiler=None):
+        """ The queries that `State` and `TeamStateView` have in common, and their profiling.
+
+        A state finds the ids of the objects that a compiled query asks for with `_query_ids`, and returns the object
+        with an id with `_get`. The queries below are all answered through these two, and are timed when the state has
+        a profiler.
+
+        Parameters
+        ----------
+        agent_id : str (default is None)
+            The id of the agent the state belongs to, if any.
+        profiler : StateProfiler (default is None)
+            The (opt-in) profiler that records how long the queries and updates of the state take.
+        """
+        self.__agent_id = agent_id
+        self.__profiler = profiler
+
+    @property
+    def agent_id(self):
+        """ The id of the agent this state belongs to, None if it belongs to none. """
+        return self.__agent_id
+
     def __getitem__(self, key):
         """ Returns all state objects that comply with the given key.
 
@@ -164,35 +229,327 @@ class State(MutableMapping):
 
         E.g. state[{'some_list': ['a', 1]}] will also return an object with obj['some_list'] = ['a', 'b', 1, 2]}
 
+        Properties whose values are a dict can be searched by their flattened name; the property name and the key in
+        its dict joined by an underscore. For instance, find all black objects with:
+        >>> state[{'visualization_colour': '#000000'}]
+
         Warnings
         --------
-        You cannot find any objects with a property name whose values are a dict. This means you cannot (as of now) use
-        this method to find all objects with a certain colour using something as:
+        You cannot find any objects by passing a dict as property value. This means you cannot use something as
+        `state[{'visualization': {'colour': '#000000'}}]` to find all objects with a certain colour. Instead of
+        returning all objects that are black, it returns all objects with a 'visualization' property that contains the
+        key 'colour' (which is basically every object). Use the flattened property name instead, as shown above, or one
+        of the helper methods for the visualization properties; state.get_with_colour(...), state.get_with_size(...),
+        state.get_with_shape(...), state.get_with_depth(...), and state.get_with_opacity(...).
+        """
+        found_objects = self._find_object(props=key, combined=True, method="__getitem__")
+        if found_objects is not None and len(found_objects) == 1:  # just a single object
+            return found_objects[0]
+        return found_objects
+
+    def get_with_property(self, props, combined=True):
+        found = self._find_object(props, combined, method="get_with_property")
+        return found
+
+    def query_many(self, queries, combined=True):
+        """ Answers several queries at once, sharing the work they have in common.
 
-        `state[{'visualization': {'colour': '#000000'}}]`
+        Every property (value) that is asked for is looked up only once in the index, no matter how many queries ask
+        for it. For instance, a batch of queries that all ask for objects of 'room_0' looks up the objects of that room
+        only once. Each query is then answered from these shared lookups as `get_with_property` would.
 
-        Instead of returning all objects that are black, it returns all objects with a 'visualization' property that
-        contains the key 'colour' (which is basically every object). All objects that do not have the 'visualization'
-        property or do have it but not with the key 'colour' in it, are ignored.
+        Parameters
+        ----------
+        queries : list
+            The queries, each is anything accepted by `state[...]` or a compiled query (see `compile`).
+        combined : bool (default is True)
+            Whether objects should have all properties (True) or any of them (False), for all queries that are not
+            compiled yet.
 
-        The 'visualization' property is one such example. But MATRX allows to add custom properties whose values are
-        dicts. Currently, there is no method to quickly find these using State. Instead you should rely on finding it
-        yourself.
+        Returns
+        -------
+        list
+            The result of each query in the same order; a list of found objects, or None when nothing was found.
 
-        If you want to locate objects with certain visualization properties, we offer several helper methods to do so.
-        These are; state.get_with_colour(...), state.get_with_size(...), state.get_with_shape(...),
-        state.get_with_depth(...), and state.get_with_opacity(...).
+        Examples
+        --------
+        Find all walls, doors and blocks of room_0 in one go.
+        >>> walls, doors, blocks = state.query_many([{'room_name': 'room_0', 'class_inheritance': 'Wall'},
+        >>>                                          {'room_name': 'room_0', 'class_inheritance': 'Door'},
+        >>>                                          {'room_name': 'room_0', 'class_inheritance': 'CollectBlock'}])
         """
-        found_objects = self.__find_object(props=key, combined=True)
-        if found_objects is not None and len(found_objects) == 1:  # just a single object
-            return found_objects[0]
-        return found_objects
+        start = self._timer()
+
+        found_cache = {}  # (property name, value) -> found object ids, shared by all queries
+        results = []
+        for query in queries:
+            if not isinstance(query, StateQuery):
+                query = self.compile(query, combined)
+            ids = self._query_ids(query, found_cache)
+            results.append(None if len(ids) == 0 else [self._get(obj_id) for obj_id in ids])
+
+        if start is not None:
+            self._record("query_many", "batch", self._timer() - start,
+                         sum(0 if found is None else len(found) for found in results))
+        return results
+
+    def remove_with_property(self, props, combined=True):
+        found = self._find_object(props, combined)
+        if found is not None:
+            for obj in found:
+                self.remove(obj['obj_id'])
+
+    def get_of_type(self, obj_type):
+        return self.get_with_property("class_inheritance", obj_type)
+
+    def get_room_objects(self, room_name):
+        return self.get_with_property("room_name", room_name)
+
+    def get_agents(self):
+        """ Returns all agents in this state, or None if there are none. """
+        return self.get_with_property({'isAgent': True})
+
+    def get_with_colour(self, colour):
+        """ Returns all objects with the given colour (e.g. '#000000'), or one of the colours in a list of them. """
+        return self.get_with_property({'visualization_colour': colour})
+
+    def get_with_size(self, size):
+        """ Returns all objects with the given size, or one of the sizes in a list of them. """
+        return self.get_with_property({'visualization_size': size})
+
+    def get_with_shape(self, shape):
+        """ Returns all objects with the given shape (e.g. 0 for a square), or one of the shapes in a list of them. """
+        return self.get_with_property({'visualization_shape': shape})
+
+    def get_with_depth(self, depth):
+        """ Returns all objects with the given depth, or one of the depths in a list of them. """
+        return self.get_with_property({'visualization_depth': depth})
+
+    def get_with_opacity(self, opacity):
+        """ Returns all objects with the given opacity, or one of the opacities in a list of them. """
+        return self.get_with_property({'visualization_opacity': opacity})
+
+    ##################################################
+    #  What a state implements, and what it can use  #
+    ##################################################
+    def _query_ids(self, query, found_cache=None):
+        # Returns the ids of all objects found by a compiled query. Each property (value) that is looked up can be kept
+        # in the found cache, as `query_many` does.
+        raise NotImplementedError
+
+    def _get(self, obj_id):
+        # Returns the object with the given id, or None when it is not in the state
+        raise NotImplementedError
+
+    def _timer(self):
+        # The current time to time a call with, or None when we are not profiled
+        return None if self.__profiler is None else self.__profiler.timer()
+
+    def _find_object(self, props, combined, method=None):
+        # Compile the query and run it right away, and time both if we are profiled and the method is given
+        if self.__profiler is None or method is None:
+            return self._run_query(self.compile(props, combined))
+        start = self.__profiler.timer()
+        query = self.compile(props, combined)
+        found = self._run_query(query)
+        self._record_query(method, query, start, found)
+        return found
+
+    def _run_compiled(self, query):
+        # Runs a compiled query (through `StateQuery.run`), timed if we are profiled
+        if self.__profiler is None:
+            return self._run_query(query)
+        start = self.__profiler.timer()
+        found = self._run_query(query)
+        self._record_query("run", query, start, found)
+        return found
 
+    def _record_query(self, method, query, start, found):
+        # Records a query with our profiler, its shape is only determined after we stopped timing
+        duration = self.__profiler.timer() - start
+        is_id_lookup = query.obj_ids is not None and all(self._get(obj_id) is not None for obj_id in query.obj_ids)
+        self._record(method, query_shape(query, is_id_lookup), duration, 0 if found is None else len(found))
+
+    def _record(self, method, shape, duration, result_size):
+        # Records a call with our profiler, at the current tick
+        world = self._get('World')
+        tick = world.get('nr_ticks', None) if isinstance(world, dict) else None
+        self.__profiler.record(self.__agent_id, tick, method, shape, duration, result_size)
+
+    def _run_query(self, query):
+        # Find the ids of all objects that match the query and retrieve those objects. If nothing was found, we return
+        # None for easy identification and break any iterable over it.
+        ids = self._query_ids(query)
+        if len(ids) == 0:
+            return None
+        return [self._get(obj_id) for obj_id in ids]
+
+
+class State(BaseState, MutableMapping):
+
+    def __init__(self, memorize_for_ticks=None, agent_id=None, fov_occlusion=False, profiler=None):
+        # The id of the agent this state belongs to (if any), used for everything that is relative to that agent, and
+        # the (opt-in) StateProfiler that records how long our queries and updates take
+        super().__init__(agent_id, profiler)
+
+        # Whether objects the agent cannot see (e.g. behind walls) are removed from every perceived state, and the
+        # perceived objects that block its sight or are hidden behind them
+        self.__fov_occlusion = fov_occlusion
+        self.__occlusion = OcclusionMap()
+
+        self.__memorize_for_ticks = memorize_for_ticks
+        if memorize_for_ticks is None:
+            self.__decay_val = 0
+        else:
+            self.__decay_val = 1.0 / memorize_for_ticks
+
+        self.__state_dict = {}
+        self.__perceived = {}  # the ids of all objects perceived in the last update (as dict keys, to keep their order)
+        self.__decays = DecayArray()  # the decays of all objects that are memorized but no longer perceived
+
+        # All snapshots taken of this state that are still in use, they need to know what we change
+        self.__snapshots = weakref.WeakValueDictionary()  # id(snapshot) -> snapshot
+
+        # The changes made by the last update, so others can update whatever they derived from this state
+        self.last_delta = StateDelta({}, {}, {}, {})
+
+        # An inverted index of all object properties and a spatial index of all object locations, so we can find
+        # objects without looping over all of them
+        self.__index = PropertyIndex()
+        self.__spatial_index = SpatialIndex()
+
+        # A registry of all rooms, with their walls, doors, area tiles and other objects
+        self.__room_index = RoomIndex()
+
+        # The locations blocked by objects, from which we derive traversability and distance maps
+        self.__traverse_map = TraverseMap()
+
+        # A columnar store of object properties, each column is only built once it is asked for
+        self.__columns = ColumnStore()
+
+    def state_update(self, state_dict):
+        """ Updates the state with a newly perceived state.
+
+        Only the difference with the current state is applied; the objects that are newly perceived or changed since
+        the last update are set, those that are no longer perceived start to decay (or are removed if nothing is
+        memorized). The applied changes are available in `state.last_delta` afterwards. If this state was created with
+        `fov_occlusion=True`, objects the agent cannot see are not considered perceived (see `apply_occlusion`). The
+        walls and closed doors that block its sight are then kept from update to update, only the objects that changed
+        are checked.
+
+        Parameters
+        ----------
+        state_dict : dict
+            All perceived objects, with their object ids as keys.
+
+        Returns
+        -------
+        State
+            This state, now updated.
+        """
+        start = self._timer()
+
+        # Get all objects that are newly perceived (which may still be memorized) or that have changed. Objects that
+        # were perceived before and are equal to what we have, need no update. An object that was perceived but hidden
+        # from sight in the last update is compared to how it was perceived then.
+        hidden = self.__occlusion.hidden
+        perceived = {}
+        for obj_id, obj in state_dict.items():
+            prev_obj = self.__state_dict[obj_id] if obj_id in self.__perceived else hidden.get(obj_id, None)
+            if prev_obj is None or (prev_obj is not obj and prev_obj != obj):
+                perceived[obj_id] = obj
+
+        # Remove all objects the agent cannot see if requested. The opaque objects are kept up to date with what
+        # changed, and the objects the agent saw in the last update but are now hidden are not perceived any more.
+        if self.__fov_occlusion:
+            perceived = self.__occlusion.update(state_dict, perceived, *self.__sight(state_dict))
+            hidden = self.__occlusion.hidden
+            gone_ids = [obj_id for obj_id in self.__perceived if obj_id not in state_dict or obj_id in hidden]
+        else:
+            # Get the ids of all objects that are not perceived any more
+            gone_ids = [obj_id for obj_id in self.__perceived if obj_id not in state_dict]
+
+        self.state_update_delta(perceived, gone_ids)
+
+        if start is not None:
+            duration = self._timer() - start
+            delta = self.last_delta
+            self._record("state_update", "update", duration,
+                         len(delta.added) + len(delta.changed) + len(delta.removed))
+        return self
+
+    def state_update_delta(self, perceived, gone_ids):
+        """ Updates the state with the difference between the newly and previously perceived state.
+
+        This is the update `state_update` performs after it computed the difference between the perceived state and
+        the current state. It can be called directly when this difference is already known, which makes the update
+        cost grow with the number of changes instead of the number of perceived objects.
+
+        Parameters
+        ----------
+        perceived : dict
+            All objects that are perceived now but were not in the last update, and all perceived objects that changed
+            since then, with their object ids as keys.
+        gone_ids : iterable
+            The ids of all objects that were perceived in the last update, but are not perceived any more.
+
+        Returns
+        -------
+        State
+            This state, now updated.
+        """
+        added, changed, removed, previous = {}, {}, {}, {}
+
+        # Set all newly perceived and changed objects. An object that was memorized but is perceived again is only
+        # changed if it differs from what we remembered.
+        for obj_id, obj in perceived.items():
+            self.__perceived[obj_id] = None
+            self.__decays.forget(obj_id)
+            prev_obj = self.__state_dict.get(obj_id, None)
+            if prev_obj is None:
+                added[obj_id] = obj
+                self.__preserve(obj_id)
+                self.__index_object(obj_id, obj)
+            elif prev_obj is not obj and prev_obj != obj:
+                changed[obj_id] = obj
+                self.__preserve(obj_id)
+                previous[obj_id] = prev_obj
+                self.__unindex_object(obj_id, prev_obj)
+                self.__index_object(obj_id, obj)
+            self.__state_dict[obj_id] = obj
+
+        # Objects that are not perceived any more are forgotten, unless we need to memorize them for a while (e.g. have
+        # a knowledge decay).
+        for obj_id in gone_ids:
+            self.__perceived.pop(obj_id, None)
+            if obj_id not in self.__state_dict:
+                continue
+            if self.__decay_val > 0:
+                self.__decays.memorize(obj_id)
+            else:
+                removed[obj_id] = self.__remove(obj_id)
+
+        # Handle knowledge decay if decay actually matters (e.g. that stuff need to be memorized). We decay all objects
+        # that are not perceived any longer at once and forget those that fully decayed.
+        if self.__decay_val > 0:
+            for obj_id in self.__decays.decay(self.__decay_val):
+                removed[obj_id] = self.__remove(obj_id)
+
+        self.last_delta = StateDelta(added, changed, removed, previous)
+
+        # Return self
+        return self
+
+    ###############################################
+    # Methods that allow State to be used as dict #
+    ###############################################
     def __setitem__(self, key, value):
         raise ValueError("You cannot set items to the state, use state.state_update(...) instead.")
 
     def __delitem__(self, key):
-        del self.__state_dict[key]
+        if key not in self.__state_dict:
+            raise KeyError(key)
+        self.__remove(key)
 
     def __iter__(self):
         return iter(self.__state_dict)
@@ -204,13 +561,119 @@ class State(MutableMapping):
         raise ValueError("You cannot update the state, use state.state_update(...) instead.")
 
     def copy(self):
-        return copy.deepcopy(self)
+        """ Returns a copy of this state, with the same memorized objects and their decays.
+
+        The copy shares the object dicts with this state instead of copying them, which is safe as a state never
+        changes an object dict but replaces it. Only the indices of the copy are built anew. Use `snapshot` instead if
+        you only need to read what the state is now, as that takes constant time.
+
+        Returns
+        -------
+        State
+            The copy.
+        """
+        state = State(memorize_for_ticks=self.__memorize_for_ticks, agent_id=self.agent_id,
+                      fov_occlusion=self.__fov_occlusion)
+        state.state_update_delta(self.__state_dict, [])
+        state.last_delta = self.last_delta
+        for obj_id, decay in self.__decays.items():
+            state._memorize(obj_id, decay)
+        return state
+
+    def snapshot(self):
+        """ Returns a read-only snapshot of the objects in this state as they are now, in constant time.
+
+        The snapshot shares all objects with this state. Only when this state changes, adds or removes an object
+        afterwards, does the snapshot keep its own reference to the previous version of that object. So its memory grows
+        with what changed since it was taken, not with the size of the state. Use `StateSnapshot.to_state` to query it
+        like a state.
+
+        Returns
+        -------
+        StateSnapshot
+            The snapshot.
+
+        Examples
+        --------
+        Keep a snapshot of the state every tick, e.g. to log or plan with it later.
+        >>> history.append(state.snapshot())
+        """
+        snapshot = StateSnapshot(self.__state_dict, self.__memorize_for_ticks, self.agent_id)
+        self.__snapshots[id(snapshot)] = snapshot
+        return snapshot
+
+    def __getstate__(self):
+        # The registry of our snapshots cannot be pickled, and is of no use to an unpickled state as the snapshots taken
+        # of us are not linked to it. So we leave it out and start with an empty one.
+        state = self.__dict__.copy()
+        del state['_State__snapshots']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__snapshots = weakref.WeakValueDictionary()
+
+    def dump(self, fileobj):
+        """ Writes this state to a file in a compact binary format, with its memorized objects and their decays.
+
+        Objects are stored column-wise; a single table of all (interned) strings, and per property one contiguous
+        array of all its values (e.g. all locations as one integer array). This makes both writing and reading take
+        milliseconds, even for thousands of objects. See `bw4t.state_io` for the format. Use `State.load` to read it.
+
+        Parameters
+        ----------
+        fileobj : file-like
+            A file opened for writing bytes.
+
+        Examples
+        --------
+        Save the state of an agent at the end of a world, and start with it in the next one.
+        >>> with open("state.bin", "wb") as f:
+        >>>     state.dump(f)
+        >>> with open("state.bin", "rb") as f:
+        >>>     state = State.load(f)
+        """
+        settings = {'memorize_for_ticks': self.__memorize_for_ticks, 'agent_id': self.agent_id,
+                    'fov_occlusion': self.__fov_occlusion}
+        state_io.dump(self.__state_dict, dict(self.__decays.items()), settings, fileobj)
+
+    @classmethod
+    def load(cls, fileobj, profiler=None):
+        """ Reads a state written by `State.dump`.
+
+        Parameters
+        ----------
+        fileobj : file-like, bytes, mmap.mmap
+            A file opened for reading bytes, or a buffer with its content. A memory mapped file is read without copying
+            its arrays.
+        profiler : StateProfiler (default is None)
+            The profiler of the loaded state, as profilers are not stored.
+
+        Returns
+        -------
+        State
+            A new state with the same settings, objects and decays as the dumped state.
+
+        Raises
+        ------
+        ValueError
+            When the file was not written by `State.dump`.
+        """
+        objects, decays, settings = state_io.load(fileobj)
+        state = cls(memorize_for_ticks=settings['memorize_for_ticks'], agent_id=settings['agent_id'],
+                    fov_occlusion=settings['fov_occlusion'], profiler=profiler)
+        state.state_update_delta(objects, [])
+        for obj_id, decay in decays.items():
+            state._memorize(obj_id, decay)
+        return state
 
     def pop(self, obj_id):
-        return self.__state_dict.pop(obj_id)
+        if obj_id not in self.__state_dict:
+            raise KeyError(obj_id)
+        return self.__remove(obj_id)
 
     def remove(self, obj_id):
-        self.__state_dict.pop(obj_id)
+        self.pop(obj_id)
 
     def as_dict(self):
         return self.__state_dict
@@ -218,79 +681,194 @@ class State(MutableMapping):
     ###############################################
     #     Some helpful getters for the state      #
     ###############################################
-    def get_with_property(self, props, combined=True):
-        found = self.__find_object(props, combined)
-        return found
+    def compile(self, props, combined=True):
+        """ Compiles a query into a `StateQuery` that can be run against this state over and over again.
 
-    def get_world_info(self):
-        return self.__state_dict['World']
+        Running a compiled query skips the interpretation of the query that `state[...]` and `get_with_property` do on
+        every call. This makes it worthwhile for queries that are asked every tick.
 
-    def remove_with_property(self, props, combined=True):
-        found = self.__find_object(props, combined)
-        _ = (self.remove(obj['obj_id']) for f in found for obj in f)
+        Parameters
+        ----------
+        props : str, list, dict
+            The query, anything accepted by `state[...]`.
+        combined : bool (default is True)
+            Whether objects should have all properties (True) or any of them (False).
 
-    def get_of_type(self, obj_type):
-        return self.get_with_property("class_inheritance", obj_type)
+        Returns
+        -------
+        StateQuery
+            The compiled query, call its `run` method to get the found objects.
 
-    def get_room_objects(self, room_name):
-        return self.get_with_property("room_name", room_name)
+        Raises
+        ------
+        ValueError
+            When the query is not a str, list or dict.
+
+        Examples
+        --------
+        Compile a query for all walls of room_0 and room_1 once, and run it every tick.
+        >>> walls = state.compile({'room_name': ['room_0', 'room_1'], 'class_inheritance': 'Wall'})
+        >>> walls.run()
+        """
+        # Make sure that props is a tuple of (property name, allowable values) pairs, where the allowable values are a
+        # tuple (which can be (None,) if no value is specified). If props can also be object ids, store those too.
+        obj_ids = None
+        if isinstance(props, dict):
+            # if props is a dict, we check if its values are tuples and cast them to tuples when there are any iterable
+            # and wrap them in a tuple if it is a single value.
+            prop_tuples = tuple((p, v if isinstance(v, tuple) else tuple(v) if State.__is_iterable(v) else tuple([v]))
+                                for p, v in props.items())
+        elif isinstance(props, str):  # props is a single string
+            # It could be that props is in fact an "obj_id", otherwise it is a single property without a value
+            obj_ids = (props,)
+            prop_tuples = ((props, (None,)),)
+        elif State.__is_iterable(props):
+            # props is a list, it is a list of object ids if all of them are known and property names otherwise
+            obj_ids = tuple(props)
+            prop_tuples = tuple((p, (None,)) for p in props)
+        else:
+            raise ValueError(f"Cannot query the State with {props}, it should be an object id, property name, list of "
+                             f"these or a dict of property names and values.")
+
+        if len(prop_tuples) == 0 and obj_ids is None:
+            raise ValueError("Cannot query the State with an empty dict, it should contain at least one property.")
+
+        return StateQuery(props, combined, obj_ids, prop_tuples, self._run_compiled)
+
+    def get_decay(self, obj_id):
+        """ Returns how well an object is remembered; 1.0 if it was perceived in the last update, lower while it is
+        memorized but no longer perceived.
+
+        Raises
+        ------
+        KeyError
+            When the object is not in this state.
+        """
+        if obj_id not in self.__state_dict:
+            raise KeyError(obj_id)
+        return self.__decays.get(obj_id, 1.0)
+
+    def get_world_info(self):
+        return self.__state_dict['World']
 
     def get_all_room_names(self):
-        return list({obj['room_name'] for obj in self.get_with_property("room_name")})
+        return list(self.__room_index.room_names())
 
     def get_room_content(self, room_name):
-        # Locate method to identify room content
-        def is_content(obj):
-            if 'class_inheritance' in obj.keys():
-                chain = obj['class_inheritance']
-                if not (Wall.__name__ in chain or Door.__name__ in chain or AreaTile in chain):
-                    return obj
-            else:  # the object is a Wall, Door or AreaTile
-                return None
-
-        # Get all walls of the room
-        walls = self.get_with_property(["room_name", "class_inheritance"], [room_name, "Wall"], combined=True)
-
-        # Get the top left corner and width and height of the room based on the found walls (and assuming the room is
-        # rectangle).
-        xs = [wall['location'][0] for wall in walls]
-        ys = [wall['location'][1] for wall in walls]
-        top_left = (min(xs), min(ys))
-        width = max(xs) - top_left[0] + 1
-        height = max(ys) - top_left[1] + 1
-        content_locs = WorldBuilder.get_room_locations(top_left, width, height)
-
-        # Get all objects with those content locations
-        content = self.get_with_property('location', content_locs)
-
-        # Get all room objects
-        room_objs = self.get_room_objects(room_name)
-
-        # Filter out all area's, walls and doors
-        content = map(is_content, room_objs)
-        content = [c for c in content if c is not None]
+        # Get all objects that belong to the room other than its walls and doors, which our room registry keeps apart;
+        # area tiles have always been part of the content
+        room = self.__room_index.get(room_name)
+        if room is None:
+            return []
+        content = [self.__state_dict[obj_id] for obj_id in itertools.chain(room['area_tiles'], room['objects'])]
+
+        # Filter out all objects without a class, as we cannot tell that they are not a wall or door
+        content = [obj for obj in content if 'class_inheritance' in obj.keys()]
 
         return content
 
     def get_room_doors(self, room_name):
-        # Locate method to identify doors
-        def is_content(obj):
-            if 'class_inheritance' in obj.keys():
-                chain = obj['class_inheritance']
-                if Door.__name__ in chain:
-                    return obj
-            else:  # the object is not a Door
-                return None
-
-        room_objs = self.get_room_objects(room_name)
-        # Filter out all doors
-        doors = map(is_content, room_objs)
-        doors = [c for c in doors if c is not None]
-
-        return doors
+        room = self.__room_index.get(room_name)
+        if room is None:
+            return []
+        return [self.__state_dict[obj_id] for obj_id in room['doors']]
 
-    def get_agents(self):
-        pass
+    def get_objects_at(self, location):
+        """ Returns a list of all objects at a location.
+
+        Parameters
+        ----------
+        location : (x, y)
+            The location.
+
+        Returns
+        -------
+        list
+            All objects at that location, an empty list if there are none.
+        """
+        return [self.__state_dict[obj_id] for obj_id in self.__spatial_index.at(location)]
+
+    def get_objects_in_area(self, top_left, width, height):
+        """ Returns a list of all objects within a rectangular area.
+
+        Parameters
+        ----------
+        top_left : (x, y)
+            The top left location of the area.
+        width : int
+            The width of the area.
+        height : int
+            The height of the area.
+
+        Returns
+        -------
+        list
+            All objects in that area, an empty list if there are none.
+        """
+        return [self.__state_dict[obj_id] for obj_id in self.__spatial_index.in_area(top_left, width, height)]
+
+    def get_objects_in_range(self, location, sense_range):
+        """ Returns a list of all objects within a certain (Euclidean) distance of a location.
+
+        Parameters
+        ----------
+        location : (x, y)
+            The location from where to search.
+        sense_range : float
+            The maximum distance, the location itself is included. Can be `np.inf`.
+
+        Returns
+        -------
+        list
+            All objects within that range, an empty list if there are none.
+        """
+        return [self.__state_dict[obj_id] for obj_id in self.__spatial_index.in_range(location, sense_range)]
+
+    def get_columns(self, prop_names, where=None, combined=True):
+        """ Returns one or more properties of many objects at once, as NumPy arrays.
+
+        The values come from a columnar store that is kept next to the objects, so no object dict is visited. This
+        makes it cheap to compare or compute with a property of many objects at once; filter the arrays with a NumPy
+        mask, or compute distances from the location column.
+
+        Parameters
+        ----------
+        prop_names : str, list of str
+            The property names, nested properties by their flattened name (e.g. `visualization_colour`).
+        where : str, list, dict, StateQuery (default is None)
+            The objects to include; all objects when None, the objects found by a query (anything accepted by
+            `state[...]`, or a compiled query) or a list of objects (e.g. from `get_room_content`).
+        combined : bool (default is True)
+            Whether objects found by the query should have all properties (True) or any of them (False).
+
+        Returns
+        -------
+        dict
+            Maps `obj_id` to an array of the ids of all included objects that have all properties, and each property
+            name to an array of their values in the same order. Locations are an integer array of shape (n, 2).
+
+        Examples
+        --------
+        Get the locations of all blocks as a single array.
+        >>> state.get_columns('location', where={'class_inheritance': 'CollectableBlock'})['location']
+
+        Get the ids of all red objects in room_3.
+        >>> columns = state.get_columns('visualization_colour', where=state.get_room_content('room_3'))
+        >>> columns['obj_id'][columns['visualization_colour'] == '#ff0000']
+        """
+        if isinstance(prop_names, str):
+            prop_names = [prop_names]
+
+        if where is None:
+            obj_ids = None
+        elif isinstance(where, StateQuery):
+            obj_ids = self.__query_ids(where)
+        elif isinstance(where, list) and all(isinstance(obj, Mapping) for obj in where):
+            obj_ids = [obj['obj_id'] for obj in where]
+        else:
+            obj_ids = self.__query_ids(self.compile(where, combined))
+
+        return self.__columns.project(prop_names, obj_ids)
 
     def get_agent_with_property(self, prop_name, prop_value):
         pass
@@ -298,151 +876,400 @@ class State(MutableMapping):
     def get_team_members(self):
         pass
 
-    def get_closest_object(self):
-        pass
+    def get_closest_object(self, k=None, location=None, path_distance=False):
+        """ Returns the object(s) closest to the agent this state belongs to, or to some location.
 
-    def get_closest_with_property(self, prop_name, prop_value):
-        pass
+        Objects are found in order of their distance through our spatial index, which only visits the locations up to
+        the k-th closest object. The agent itself is never returned.
 
-    def get_closest_room(self):
-        pass
+        Parameters
+        ----------
+        k : int (default is None)
+            The number of objects to return. When None, a single object is returned instead of a list.
+        location : (x, y) (default is None)
+            The location to search from, the location of the agent this state belongs to when None.
+        path_distance : bool (default is False)
+            Whether distance is the number of steps to reach an object over the traverse map (see `get_distance_map`),
+            instead of the Euclidean distance. Objects that cannot be reached are then never returned.
 
-    def get_closest_agent(self):
-        pass
+        Returns
+        -------
+        dict, list
+            The closest object (None if there is none), or a list of the k closest objects when k is given.
 
-    def get_with_colour(self, colour):
-        pass
+        Raises
+        ------
+        ValueError
+            When no location is given and this state does not belong to an agent that is in it.
+        """
+        return self.__closest(None, k, location, path_distance)
 
-    def get_with_size(self, size):
-        pass
+    def get_closest_with_property(self, prop_name, prop_value=None, k=None, location=None, path_distance=False):
+        """ Returns the object(s) with a property (value) closest to the agent this state belongs to, or to a location.
 
-    def get_with_shape(self, shape):
-        pass
+        The objects with the property (value) are found with our index first, and only their distances are computed.
 
-    def get_with_depth(self, depth):
-        pass
+        Parameters
+        ----------
+        prop_name : str, list, dict
+            The property name, or any query accepted by `state[...]` when no value is given.
+        prop_value : any (default is None)
+            The property value, or list of allowed values.
+        k : int (default is None)
+            The number of objects to return. When None, a single object is returned instead of a list.
+        location : (x, y) (default is None)
+            The location to search from, the location of the agent this state belongs to when None.
+        path_distance : bool (default is False)
+            Whether distance is the number of steps to reach an object over the traverse map, instead of the Euclidean
+            distance.
 
-    def get_with_opacity(self, opacity):
-        pass
+        Returns
+        -------
+        dict, list
+            The closest object (None if there is none), or a list of the k closest objects when k is given.
+
+        Examples
+        --------
+        Find the closest red block, and the three closest blocks we can walk to.
+        >>> state.get_closest_with_property({'class_inheritance': 'CollectBlock', 'visualization_colour': '#ff0000'})
+        >>> state.get_closest_with_property('class_inheritance', 'CollectBlock', k=3, path_distance=True)
+        """
+        props = prop_name if prop_value is None else {prop_name: prop_value}
+        return self.__closest(self.__query_ids(self.compile(props)), k, location, path_distance)
+
+    def get_closest_room(self, k=None, location=None, path_distance=False):
+        """ Returns the name of the room closest to the agent this state belongs to, or to a location.
+
+        The distance to a room is the distance to the closest of its walls, doors, area tiles and other objects with its
+        'room_name'. With `path_distance`, walls cannot be reached, so it is the distance to its doors and interior.
+
+        Parameters
+        ----------
+        k : int (default is None)
+            The number of rooms to return. When None, a single room name is returned instead of a list.
+        location : (x, y) (default is None)
+            The location to search from, the location of the agent this state belongs to when None.
+        path_distance : bool (default is False)
+            Whether distance is the number of steps to reach a room over the traverse map, instead of the Euclidean
+            distance.
+
+        Returns
+        -------
+        str, list
+            The name of the closest room (None if there is none), or a list of the k closest room names when k is given.
+        """
+        return self.__closest_rooms(self.__index.find('room_name'), k, location, path_distance)
+
+    def get_closest_agent(self, k=None, location=None, path_distance=False):
+        """ Returns the agent(s) closest to the agent this state belongs to, or to a location.
+
+        Parameters
+        ----------
+        k : int (default is None)
+            The number of agents to return. When None, a single agent is returned instead of a list.
+        location : (x, y) (default is None)
+            The location to search from, the location of the agent this state belongs to when None.
+        path_distance : bool (default is False)
+            Whether distance is the number of steps to reach an agent over the traverse map, instead of the Euclidean
+            distance.
+
+        Returns
+        -------
+        dict, list
+            The closest agent (None if there is none), or a list of the k closest agents when k is given.
+        """
+        return self.__closest(self.__index.find('isAgent', True), k, location, path_distance)
 
-    ###############################################
-    # Some higher level abstractions of the state #
-    ###############################################
     def get_traverse_map(self):
-        pass
+        """ Returns a map of which locations can be traversed according to this state.
 
-    def get_distance_map(self):
-        pass
+        A location is not traversable when it contains an object that is not traversable, or a closed door. Agents
+        are ignored as they are always on the move, and unknown locations are assumed to be traversable. The map is
+        only recomputed when the blocked locations change.
 
-    def apply_occlusion(self):
-        pass
+        Returns
+        -------
+        np.ndarray
+            A read-only boolean array of the world's shape, indexed as `traverse_map[x, y]`.
+        """
+        return self.__traverse_map.get_traverse_map(self.get_world_info()['grid_shape'])
+
+    def get_distance_map(self, targets):
+        """ Returns a map of how many steps it takes to reach the closest target from each location.
+
+        Distance maps are computed over the traverse map, cached for each set of targets and only recomputed when the
+        traverse map changes (e.g. when a door is opened). So asking for the same targets every tick is cheap.
+
+        Parameters
+        ----------
+        targets : (x, y), list of (x, y), or any key accepted by `state[...]`
+            The target location(s). When a key such as an object id or a dict of properties is given, the locations of
+            all found objects are the targets.
+
+        Returns
+        -------
+        np.ndarray
+            A read-only float array of the world's shape, indexed as `distance_map[x, y]`. Unreachable locations are
+            set to `np.inf`.
+
+        Examples
+        --------
+        Get the number of steps from each location to the closest door of room_0.
+        >>> state.get_distance_map({'room_name': 'room_0', 'class_inheritance': 'Door'})
+
+        Get the number of steps from each location to the location (3, 4).
+        >>> state.get_distance_map((3, 4))
+        """
+        locs = State._target_locations(targets)
+        if locs is None:
+            found = self._find_object(targets, combined=True)
+            locs = [obj['location'] for obj in found if 'location' in obj] if found is not None else []
+
+        return self.__traverse_map.get_distance_map(self.get_world_info()['grid_shape'], locs)
+
+    def apply_occlusion(self, state_dict, origin=None):
+        """ Returns the perceived state without all objects that cannot be seen from the origin.
+
+        Walls and closed doors block the line of sight, visibility is computed with shadowcasting over their locations
+        (see `bw4t.state_maps.visible_locations`). Objects without a location (e.g. the 'World' info) are always kept.
+        This finds the walls and closed doors among all given objects, `state_update` does not call it but keeps them
+        from update to update instead.
+
+        Parameters
+        ----------
+        state_dict : dict
+            The perceived objects, with their object ids as keys.
+        origin : (x, y), str or None (default is None)
+            The location to look from, or the id of the object at that location. When None, this is the location of
+            the agent this state belongs to.
+
+        Returns
+        -------
+        dict
+            The perceived objects that can be seen from the origin.
+
+        Raises
+        ------
+        ValueError
+            When no origin is given and this state does not belong to an agent.
+        """
+        origin, shape = self.__sight(state_dict, origin)
+        opaque_locs = {tuple(obj['location']) for obj in state_dict.values() if is_opaque(obj)}
+        visible = visible_locations(origin, opaque_locs, shape)
+
+        return {obj_id: obj for obj_id, obj in state_dict.items()
+                if 'location' not in obj or tuple(obj['location']) in visible}
 
     ##################################################
     # The basic functions that make up most of state #
     ##################################################
-    def __find_object(self, props, combined):
-        # Make sure that props is a dict, with as keys the property names and as values a tuple of allowable property
-        # values (which can be (None,) if no value is specified).
-        if isinstance(props, dict):
-            # if props is a dict, we check if its values are tuples and cast them to tuples when there are any iterable
-            # and wrap them in a tuple if it is a single value.
-            props = {p: v if isinstance(v, tuple) else tuple(v) if State.__is_iterable(v) else tuple([v])
-                     for p, v in props.items()}
-        elif isinstance(props, str):  # props is a single string
-            # It could be that props is in fact an "obj_id", the only value allowed to be passed and return something so
-            # we check if it is in our dict and return it.
-            if props in self.__state_dict.keys():
-                found = [self.__state_dict[props]]
-                return found
-            # props is a single property, so make a appropriate dict out of it with no value
-            props = {props: (None, )}
-        elif State.__is_iterable(props):
-            # props is a list, and it may be a list of object ids so first check if this is the case
-            found = [self.__state_dict[obj_id] for obj_id in props if obj_id in self.__state_dict.keys()]
-            if len(found) != len(props):  # if one given prop_name was not an actual obj_id, treat all as property names
-                # props is a list, assuming a list of property names.
-                props = {p: (None,) for p in props}
-            else:  # all property names were in fact keys, so return what we found
+    def _query_ids(self, query, found_cache=None, among=None):
+        # Returns the ids of all objects found by a compiled query, only among the given ids when given (as a dict with
+        # the ids as keys). `TeamStateView` uses this to find the objects it knows.
+        return self.__query_ids(query, found_cache, among)
+
+    def _get(self, obj_id):
+        # Returns the object with the given id, or None when it is not in the state
+        return self.__state_dict.get(obj_id, None)
+
+    def _memorize(self, obj_id, decay):
+        # Treats a known object as memorized with the given decay, used to restore decays in a copy of a state
+        self.__perceived.pop(obj_id, None)
+        self.__decays.memorize(obj_id, decay)
+
+    def _layered_traverse_map(self):
+        # Returns a new traverse map layered on ours, used by `TeamStateView` for the objects it knows differently
+        return TraverseMap(base=self.__traverse_map)
+
+    @staticmethod
+    def _target_locations(targets):
+        # Returns the targets of `get_distance_map` as a list of locations, or None when they are a query
+        if State.__is_location(targets):
+            return [targets]
+        elif State.__is_iterable(targets) and not isinstance(targets, dict) \
+                and all(State.__is_location(loc) for loc in targets):
+            return list(targets)
+        return None
+
+    @staticmethod
+    def _closest(nearest, k, get_obj):
+        # Returns the k closest objects (a single object or None when k is None) from (distance, object id) pairs in
+        # order of their distance, also used by `TeamStateView`
+        objs = [get_obj(obj_id) for _, obj_id in itertools.islice(nearest, 1 if k is None else k)]
+        if k is None:
+            return objs[0] if len(objs) > 0 else None
+        return objs
+
+    @staticmethod
+    def _closest_rooms(nearest, k, get_obj):
+        # Returns the names of the k closest rooms (a single name or None when k is None) from (distance, object id)
+        # pairs of room objects in order of their distance, also used by `TeamStateView`
+        room_names = {}
+        for _, obj_id in nearest:
+            room_names[get_obj(obj_id)['room_name']] = None
+            if len(room_names) == (1 if k is None else k):
+                break
+        room_names = list(room_names)
+        if k is None:
+            return room_names[0] if len(room_names) > 0 else None
+        return room_names
+
+    def _nearest(self, obj_ids, location, path_distance, exclude_id=None, distance_map=None):
+        # Yields (distance, object id) of the given objects (all when None) in order of their distance to the location.
+        # Path distances are read from the given distance map towards the location, or from ours when None;
+        # `TeamStateView` gives its own, as it merges the objects it finds here with those it knows in another version.
+        if not path_distance:
+            nearest = self.__spatial_index.nearest(location, obj_ids)
+        else:
+            # The number of steps to each object is read from a distance map towards the location. Objects outside
+            # the world or that cannot be reached are skipped.
+            if distance_map is None:
+                distance_map = self.__traverse_map.get_distance_map(self.get_world_info()['grid_shape'], [location])
+            located_ids, locs = [], []
+            for obj_id in (self.__state_dict if obj_ids is None else obj_ids):
+                loc = self.__spatial_index.location_of(obj_id)
+                if loc is not None:
+                    located_ids.append(obj_id)
+                    locs.append(loc)
+            obj_ids = located_ids
+            locs = np.array(locs, dtype=int).reshape(-1, 2)
+            inside = (locs[:, 0] >= 0) & (locs[:, 0] < distance_map.shape[0]) \
+                & (locs[:, 1] >= 0) & (locs[:, 1] < distance_map.shape[1])
+            dists = np.full(len(obj_ids), np.inf)
+            dists[inside] = distance_map[locs[inside, 0], locs[inside, 1]]
+            order = np.argsort(dists, kind='stable')
+            nearest = ((float(dists[i]), obj_ids[i]) for i in order.tolist() if dists[i] < np.inf)
+
+        for dist, obj_id in nearest:
+            if obj_id != exclude_id:
+                yield dist, obj_id
+
+    def __closest(self, obj_ids, k, location, path_distance):
+        # The closest objects to the location, or to our agent which is then excluded itself
+        nearest = self._nearest(obj_ids, self.__origin(location), path_distance, exclude_id=self.agent_id)
+        return State._closest(nearest, k, self.__state_dict.__getitem__)
+
+    def __closest_rooms(self, obj_ids, k, location, path_distance):
+        # The closest rooms to the location, or to our agent
+        nearest = self._nearest(obj_ids, self.__origin(location), path_distance, exclude_id=self.agent_id)
+        return State._closest_rooms(nearest, k, self.__state_dict.__getitem__)
+
+    def __sight(self, state_dict, origin=None):
+        # The location to look from in a perceived state; the given location, that of the object with the given id or
+        # otherwise that of our agent. And the shape of the world.
+        if origin is None:
+            if self.agent_id is None:
+                raise ValueError("Cannot apply occlusion without an origin, as this State was not created with an "
+                                 "`agent_id`.")
+            origin = self.agent_id
+        if isinstance(origin, str):
+            origin = state_dict[origin]['location'] if origin in state_dict else self.__state_dict[origin]['location']
+        world = state_dict['World'] if 'World' in state_dict else self.get_world_info()
+        return origin, world['grid_shape']
+
+    def __origin(self, location):
+        # The location to search from; the given location or otherwise that of our agent
+        if location is not None:
+            return tuple(location)
+        location = self.__spatial_index.location_of(self.agent_id) if self.agent_id is not None else None
+        if location is None:
+            raise ValueError("Cannot find the closest objects without a location, as this State does not belong to an "
+                             "agent or that agent is not in it.")
+        return location
+
+    def __query_ids(self, query, found_cache=None, among=None):
+        # If the query consists of object ids, return those if all of them are known (or among the given ids). It could
+        # also be that these are in fact property names, which we handle below.
+        known = self.__state_dict if among is None else among
+        if query.obj_ids is not None and all(obj_id in known for obj_id in query.obj_ids):
+            return query.obj_ids
+
+        # For each prop_name, find the ids of all objects with that property and one of the allowed property values.
+        # We do not combine these yet, their sizes tell us which property is the cheapest to start with.
+        found = [self.__find_ids(name, vals, found_cache) for name, vals in query.props]
+
+        # If we just want all objects with EITHER property (potentially with the set value), we take the union of all
+        # found object ids.
+        if len(found) > 1 and not query.combined:
+            ids = {}
+            for val_found in found:
+                ids.update(val_found)
+            found = [ids]
+
+        # If we want all objects that have ALL the properties (potentially also with their respective value), we select
+        # those objects that were found for each property. We start with the property that found the fewest objects,
+        # and only check whether those are also found for the other properties. The given ids to find the objects
+        # among are treated as just another property, so we never go over more objects than there are among them.
+        if among is not None:
+            found.append(among)
+        found = sorted(found, key=len)
+        ids = found[0]
+        for val_found in found[1:]:
+            ids = [obj_id for obj_id in ids if obj_id in val_found]
+
+        return ids
+
+    def __find_ids(self, prop_name, prop_values, found_cache):
+        # Finds the ids of all objects with a property and one of the allowed values in our index, as a dict with the
+        # ids as keys. When given a cache, as `query_many` does, each property and its allowed values are only looked
+        # up once for all queries that ask for them.
+        if found_cache is not None:
+            key = (prop_name, prop_values)
+            try:
+                found = found_cache.get(key, None)
+            except TypeError:  # an unhashable value (e.g. a list) is not cached
+                found_cache, found = None, None
+            if found is not None:
                 return found
 
-        # For each prop_name, prop_value combination, find the relevant objects. If there are more than one allowable
-        # property value, search for those as well.
-        found = [[self.__find(name, val) for val in vals] for name, vals in props.items()]
-
-        # Check if we searched for more than one property
-        if len(props) > 1:
-            # If we just want all objects with EITHER property (potentially with the set value), we just flatten the
-            # list (prop names) of lists (prop values).
-            if not combined:
-                # we know we have multiple property names, so we flatten in that dimension
-                found = [value_found for sub_found in found for value_found in sub_found]
-                # know we also flatten in the property value dimension, resulting in one big list of all objects that
-                # have the specified property name and property values
-                found = [obj for value_found in found for obj in value_found]
-
-            # If we want all objects that have ALL the properties (potentially also with their respective value), we
-            # select those objects that are in all sub-lists
-            else:
-                # We transform all lists of objects that adhere to each property name (and possible value) to a set
-                sets = [set(obj['obj_id'] for obj_list in sub_found for obj in obj_list) for sub_found in found]
-
-                # Next we loop over each set, and consequtively take the intersection of each set. E.g. we start with
-                # the first set as the intersection, and set it to the intersection of the previous intersect and next
-                # set,
-                intersect = set(sets[0])
-                for s in sets[1:]:
-                    intersect = intersect.intersection(s)
-
-                # Now we have all the object ids, but we want the objects. So if the intersection is not empty, we
-                # transform all found objects to a single dict with their ids as keys. Next we loop through every id and
-                # retrieve the object dict that belongs to it.
-                if len(intersect) > 0:
-                    full_dict = {obj['obj_id']: obj for sub_found in found for obj_list in sub_found for obj in
-                                 obj_list}
-                    found = [full_dict[obj_id] for obj_id in intersect]
-                else:
-                    found = []
-        else:  # just one property name given
-            found = found[0]  # take that property name list
-            if len(list(props.values())[0]) > 1:  # we have more than one property values given
-                # flatten the list
-                found = [obj for f in found for obj in f]
-            elif len(found[0]) == 0:  # if just one property value was given (or omitted) but nothing was found
-                found = None
-
-        # If nothing was found, we set it to None for easy identification and break any iterable over it.
-        if not found:
-            found = None
+        if len(prop_values) == 1:
+            found = self.__index.find(prop_name, prop_values[0], self.__state_dict, substrings=True)
+        else:
+            found = {}
+            for prop_value in prop_values:
+                found.update(self.__index.find(prop_name, prop_value, self.__state_dict, substrings=True))
 
+        if found_cache is not None:
+            found_cache[key] = found
         return found
 
-    def __find(self, prop_name, prop_value=None):
-        # A local function that identifies whether a given obj_id-obj pair has the requested property name and, if
-        # given, the right property value. Is used in the map method to find all object that adhere to it.
-        def locate(id_obj_pair):
-            obj = id_obj_pair[1]
-
-            # The object is found when it has the property and the value is none, or when it has the property and the
-            # requested value is the value of that property OR is in that value of that property (e.g. as substring or
-            # list item).
-            if prop_name in obj:
-                # value given and equals that in the object
-                if prop_value is None or prop_value == obj[prop_name]:
-                    return obj
-                # value given and is in that object's property (e.g. as substring of item in list)
-                elif prop_value is not None and isinstance(obj[prop_name], Iterable) and prop_value in obj[prop_name]:
-                    return obj
-            return None
+    def __remove(self, obj_id):
+        # Removes an object from the state and everything we keep track of for it, returns the removed object
+        self.__preserve(obj_id)
+        obj = self.__state_dict.pop(obj_id)
+        self.__perceived.pop(obj_id, None)
+        self.__decays.forget(obj_id)
+        self.__unindex_object(obj_id, obj)
+        return obj
+
+    def __preserve(self, obj_id):
+        # Let all snapshots of this state keep the current version of an object (or its absence) before we change it
+        if len(self.__snapshots) > 0:
+            obj = self.__state_dict.get(obj_id, StateSnapshot.ABSENT)
+            for snapshot in list(self.__snapshots.values()):
+                snapshot._preserve(obj_id, obj)
+
+    def __index_object(self, obj_id, obj):
+        # Adds an object to all our indices
+        self.__index.add(obj_id, obj)
+        self.__spatial_index.add(obj_id, obj)
+        self.__traverse_map.add(obj_id, obj)
+        self.__room_index.add(obj_id, obj)
+        self.__columns.add(obj_id, obj)
+
+    def __unindex_object(self, obj_id, obj):
+        # Removes an object from all our indices
+        self.__index.remove(obj_id, obj)
+        self.__spatial_index.remove(obj_id, obj)
+        self.__traverse_map.remove(obj_id, obj)
+        self.__room_index.remove(obj_id, obj)
+        self.__columns.remove(obj_id, obj)
 
-        # try to locate it in the regular dict as an object id, this allows us to use this method also to quickly locate
-        # objects based on their object ID.
-        try:
-            return self.__state_dict[prop_value]
-        # if the prop value was not a key in the dict (or simply None), find all objects with that property and value if
-        # given. This uses Python's map function to bring our search to C.
-        except KeyError:
-            located = map(locate, self.__state_dict.items())
-            return [l for l in located if l is not None]  # only return the found objects
+    @staticmethod
+    def __is_location(arg):
+        # Checks if the arg is a single (x, y) location, e.g. a list or tuple of two integers (also NumPy integers)
+        return isinstance(arg, (list, tuple)) and len(arg) == 2 \
+            and all(isinstance(c, (int, np.integer)) and not isinstance(c, bool) for c in arg)
 
     @staticmethod
     def __is_iterable(arg):
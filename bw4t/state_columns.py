@@ -0,0 +1,206 @@
+import numpy as np
+
+
+class ColumnStore:
+
+    def __init__(self, capacity=64):
+        """ A columnar store of object properties, with one NumPy array per property indexed by object slot.
+
+        Every object in the `State` gets a slot, like the memorized objects in `DecayArray`. A column holds the value
+        of a single property for all slots, together with a mask of which slots actually have that property. This
+        allows a property of many objects to be read (or compared) with a single array operation instead of a loop
+        over their dicts, e.g. the locations of all blocks or the colours of everything in a room.
+
+        Columns are only built for the properties that are asked for, from the objects the store knows about at that
+        moment. From then on they are updated with every object that is added or removed, so an unused property costs
+        nothing. Nested properties are found by their flattened name, e.g. `visualization_colour` for the `colour` in
+        the `visualization` dict of an object.
+
+        The type of a column follows its values; integers, floats and booleans get an array of that type, locations
+        (pairs of integers) an integer array of shape (n, 2) and everything else an object array. When a value arrives
+        that does not fit the type of its column, the column is built again with a type that fits all values.
+
+        The store does not copy the objects, it keeps a reference to each object dict. This is safe as `State` never
+        changes an object dict but replaces it, which removes and adds it to this store.
+
+        Parameters
+        ----------
+        capacity : int (default is 64)
+            The initial number of slots, all columns double in size when more are needed.
+        """
+        self.__slots = {}  # object id -> slot
+        self.__ids = np.full(capacity, None, dtype=object)  # slot -> object id (None when free)
+        self.__objs = [None] * capacity  # slot -> object dict (None when free)
+        self.__free = list(range(capacity - 1, -1, -1))  # free slots, the lowest slot is popped first
+        self.__columns = {}  # property name -> (kind, values, present)
+
+    def add(self, obj_id, obj):
+        """ Adds an object, and its value of each property that has a column. """
+        if len(self.__free) == 0:
+            self.__grow()
+        slot = self.__free.pop()
+        self.__slots[obj_id] = slot
+        self.__ids[slot] = obj_id
+        self.__objs[slot] = obj
+
+        for prop_name, (kind, values, present) in list(self.__columns.items()):
+            found, value = ColumnStore.__resolve(obj, prop_name)
+            if not found:
+                continue
+            value_kind = ColumnStore.__kind_of(value)
+            if ColumnStore.__merge_kinds(kind, value_kind) != kind:
+                # The value does not fit this column, so build it again with a type that fits all values
+                self.__build_column(prop_name)
+            else:
+                values[slot] = value
+                present[slot] = True
+
+    def remove(self, obj_id, obj):
+        """ Removes an object and all its values. """
+        slot = self.__slots.pop(obj_id, None)
+        if slot is None:
+            return
+        self.__ids[slot] = None
+        self.__objs[slot] = None
+        for kind, values, present in self.__columns.values():
+            present[slot] = False
+            if kind == 'object':
+                values[slot] = None  # do not keep the value alive
+        self.__free.append(slot)
+
+    def project(self, prop_names, obj_ids=None):
+        """ Returns the values of one or more properties as arrays, for all objects that have all of them.
+
+        Parameters
+        ----------
+        prop_names : list of str
+            The property names, nested properties by their flattened name (e.g. `visualization_colour`).
+        obj_ids : list (default is None)
+            The ids of the objects to include, all objects when None. Unknown ids are ignored.
+
+        Returns
+        -------
+        dict
+            Maps `obj_id` to an object array of the ids of all included objects, and each property name to an array
+            of their values in the same order. Objects that miss any of the properties are not included.
+        """
+        columns = [self.__get_column(prop_name) for prop_name in prop_names]
+
+        # Select the slots of the requested objects, or all occupied slots, in slot order
+        if obj_ids is None:
+            selected = self.__ids != None  # noqa: E711, an elementwise comparison
+        else:
+            selected = np.zeros(len(self.__ids), dtype=bool)
+            slots = [self.__slots[obj_id] for obj_id in obj_ids if obj_id in self.__slots]
+            selected[slots] = True
+
+        for _, _, present in columns:
+            selected &= present
+        slots = np.flatnonzero(selected)
+
+        projection = {'obj_id': self.__ids[slots]}
+        for prop_name, (_, values, _) in zip(prop_names, columns):
+            projection[prop_name] = values[slots]
+        return projection
+
+    def column_names(self):
+        """ Returns the names of all properties that currently have a column. """
+        return self.__columns.keys()
+
+    def clear(self):
+        """ Removes all objects and columns. """
+        self.__init__(capacity=len(self.__ids))
+
+    def __contains__(self, obj_id):
+        return obj_id in self.__slots
+
+    def __len__(self):
+        return len(self.__slots)
+
+    def __get_column(self, prop_name):
+        # Returns the column of a property, builds it from all objects if we did not have it yet
+        if prop_name not in self.__columns:
+            self.__build_column(prop_name)
+        return self.__columns[prop_name]
+
+    def __build_column(self, prop_name):
+        # Builds the column of a property from all objects, with a type that fits all their values
+        found = {}  # slot -> value
+        kind = None
+        for slot in self.__slots.values():
+            has_value, value = ColumnStore.__resolve(self.__objs[slot], prop_name)
+            if has_value:
+                found[slot] = value
+                kind = ColumnStore.__merge_kinds(kind, ColumnStore.__kind_of(value))
+        kind = 'object' if kind is None else kind
+
+        capacity = len(self.__ids)
+        values = ColumnStore.__empty_values(kind, capacity)
+        present = np.zeros(capacity, dtype=bool)
+        for slot, value in found.items():
+            values[slot] = value
+            present[slot] = True
+        self.__columns[prop_name] = (kind, values, present)
+
+    def __grow(self):
+        # Doubles the number of slots of the store and all its columns, the new slots are added to the free list
+        capacity = len(self.__ids)
+        new_capacity = max(1, 2 * capacity)
+        extra = new_capacity - capacity
+        self.__ids = np.concatenate([self.__ids, np.full(extra, None, dtype=object)])
+        self.__objs.extend([None] * extra)
+        self.__free = list(range(new_capacity - 1, capacity - 1, -1)) + self.__free
+        for prop_name, (kind, values, present) in self.__columns.items():
+            values = np.concatenate([values, ColumnStore.__empty_values(kind, extra)])
+            present = np.concatenate([present, np.zeros(extra, dtype=bool)])
+            self.__columns[prop_name] = (kind, values, present)
+
+    @staticmethod
+    def __resolve(obj, prop_name):
+        # Returns whether the object has the property and its value, nested properties are found by their flattened
+        # name (e.g. 'visualization_colour' is obj['visualization']['colour'])
+        if prop_name in obj:
+            return True, obj[prop_name]
+        sep = prop_name.find('_')
+        while sep > 0:
+            sub_dict = obj.get(prop_name[:sep], None)
+            if isinstance(sub_dict, dict) and prop_name[sep + 1:] in sub_dict:
+                return True, sub_dict[prop_name[sep + 1:]]
+            sep = prop_name.find('_', sep + 1)
+        return False, None
+
+    @staticmethod
+    def __kind_of(value):
+        # The type of column a value fits in
+        if isinstance(value, (bool, np.bool_)):
+            return 'bool'
+        if isinstance(value, (int, np.integer)):
+            return 'int'
+        if isinstance(value, (float, np.floating)):
+            return 'float'
+        if isinstance(value, (list, tuple)) and len(value) == 2 \
+                and all(isinstance(c, (int, np.integer)) and not isinstance(c, bool) for c in value):
+            return 'location'
+        return 'object'
+
+    @staticmethod
+    def __merge_kinds(kind, other_kind):
+        # The type of column that fits values of both kinds
+        if kind is None or kind == other_kind:
+            return other_kind
+        if {kind, other_kind} == {'int', 'float'}:
+            return 'float'
+        return 'object'
+
+    @staticmethod
+    def __empty_values(kind, size):
+        # An empty array of values for a column of the given type
+        if kind == 'bool':
+            return np.zeros(size, dtype=bool)
+        if kind == 'int':
+            return np.zeros(size, dtype=np.int64)
+        if kind == 'float':
+            return np.zeros(size)
+        if kind == 'location':
+            return np.zeros((size, 2), dtype=np.int64)
+        return np.full(size, None, dtype=object)
@@ -0,0 +1,513 @@
+import heapq
+import itertools
+from collections.abc import Iterable
+
+from matrx.objects import Door, AreaTile, Wall
+
+
+class PropertyIndex:
+
+    # The maximum number of substrings for which the containing values are kept, per property
+    MAX_SUBSTRINGS = 128
+
+    def __init__(self):
+        """ An inverted index of object properties, used by `State` to answer property queries without a full scan.
+
+        The index maps each property name to the object ids that have that property, and each property value to the
+        object ids that have that exact value. For values that are containers (e.g. lists, tuples or dicts), it also
+        maps each of their items to the object ids whose value contains that item. This mirrors how `State` matches a
+        requested property value; an object matches when its value equals the requested value or when the requested
+        value is *part* of it (e.g. as list item or substring).
+
+        Properties whose value is a dict (e.g. 'visualization') are also indexed per key under a flattened name, the
+        property name and key joined by an underscore (e.g. 'visualization_colour'). These can be queried like any
+        other property, without flattening the objects for every query.
+
+        A string value can also be found by a substring of it, but only when asked for (see `find`). The distinct
+        values that contain a requested substring are found once, and kept up to date from then on as values are added
+        and removed, so repeating such a query does not scan all values of the property again.
+
+        All sets of object ids are stored as dicts with None values. These behave like sets but keep their insertion
+        order, which keeps query results deterministic between runs.
+
+        The index does not store the objects themselves. It is updated by `State` through `add` and `remove` every
+        time an object is added, changed or removed.
+        """
+        self.__ids = {}  # property name -> object ids that have that property
+        self.__values = {}  # property name -> hashable value -> object ids with exactly that value
+        self.__items = {}  # property name -> item -> object ids whose (container) value contains that item
+        self.__nested = {}  # flattened property name -> (property name, key in its dict value)
+        self.__substrings = {}  # property name -> requested substring -> distinct string values that contain it
+
+    def add(self, obj_id, obj):
+        """ Adds all properties of an object to the index.
+
+        Parameters
+        ----------
+        obj_id : str
+            The id of the object.
+        obj : dict
+            The object's properties.
+        """
+        for prop_name, prop_value in self.__flat_items(obj):
+            self.__ids.setdefault(prop_name, {})[obj_id] = None
+
+            # Store the value itself if we can, unhashable values (e.g. lists) are only found through their items
+            if PropertyIndex.__is_hashable(prop_value):
+                values = self.__values.setdefault(prop_name, {})
+                if prop_value not in values and isinstance(prop_value, str):
+                    self.__add_substring_value(prop_name, prop_value)
+                values.setdefault(prop_value, {})[obj_id] = None
+
+            # Store the items of container values, so we can quickly find objects whose value contains a certain item.
+            # Strings are not split up, substrings are found among the distinct string values instead.
+            if isinstance(prop_value, (list, tuple, set, frozenset, dict)):
+                items = self.__items.setdefault(prop_name, {})
+                for item in prop_value:
+                    if PropertyIndex.__is_hashable(item):
+                        items.setdefault(item, {})[obj_id] = None
+
+    def remove(self, obj_id, obj):
+        """ Removes all properties of an object from the index.
+
+        Parameters
+        ----------
+        obj_id : str
+            The id of the object.
+        obj : dict
+            The object's properties as they were when the object was added to the index.
+        """
+        for prop_name, prop_value in self.__flat_items(obj):
+            PropertyIndex.__discard(self.__ids, prop_name, obj_id)
+
+            if PropertyIndex.__is_hashable(prop_value):
+                PropertyIndex.__discard(self.__values.get(prop_name), prop_value, obj_id)
+                if isinstance(prop_value, str) and prop_value not in self.__values.get(prop_name, {}):
+                    self.__remove_substring_value(prop_name, prop_value)
+                if prop_name in self.__values and len(self.__values[prop_name]) == 0:
+                    self.__values.pop(prop_name)
+
+            if isinstance(prop_value, (list, tuple, set, frozenset, dict)):
+                items = self.__items.get(prop_name)
+                for item in prop_value:
+                    if PropertyIndex.__is_hashable(item):
+                        PropertyIndex.__discard(items, item, obj_id)
+                if items is not None and len(items) == 0:
+                    self.__items.pop(prop_name)
+
+    def find(self, prop_name, prop_value=None, objects=None, substrings=False):
+        """ Returns the ids of all objects that have a property, and optionally a certain value for that property.
+
+        Parameters
+        ----------
+        prop_name : str
+            The property name.
+        prop_value : any (default is None)
+            The requested property value. When None, all objects that have the property are returned. Otherwise all
+            objects whose value equals this value or contains this value as an item (e.g. of a list) are returned.
+        objects : dict (default is None)
+            The indexed objects by their id. Only needed when `prop_value` is not hashable (e.g. a list), as those
+            values cannot be looked up and are matched against the objects that have the property instead.
+        substrings : bool (default is False)
+            Whether a requested string value also finds the objects whose string value contains it as a substring, as
+            `State` matches values.
+
+        Returns
+        -------
+        dict
+            The found object ids as keys (with None as values), in the order they were added to the index. This may be
+            the index's own storage, so it should not be changed.
+        """
+        if prop_value is None:
+            return self.__ids.get(prop_name, {})
+
+        # An unhashable value (e.g. a list) cannot be found in the index. So we match it against all objects that have
+        # the property, which is still a lot less than all objects.
+        if not PropertyIndex.__is_hashable(prop_value):
+            found = {}
+            for obj_id in self.__ids.get(prop_name, {}):
+                value = self.__value_of(objects[obj_id], prop_name)
+                if prop_value == value or (isinstance(value, Iterable) and prop_value in value):
+                    found[obj_id] = None
+            return found
+
+        # Objects whose value equals the requested value, and those whose value contains it as an item
+        equals = self.__values.get(prop_name, {}).get(prop_value, {})
+        contains = self.__items.get(prop_name, {}).get(prop_value, {})
+
+        # If asked for and the requested value is a string, it might also be a substring of other string values
+        containing = ()
+        if substrings and isinstance(prop_value, str):
+            containing = self.__substring_values(prop_name, prop_value)
+
+        # Only copy when we need to combine several results, this keeps the common case of a single match cheap
+        if len(contains) == 0 and len(containing) == 0:
+            return equals
+        found = dict(equals)
+        found.update(contains)
+        for value in containing:
+            found.update(self.__values[prop_name][value])
+        return found
+
+    def property_names(self):
+        """ Returns all indexed property names. """
+        return self.__ids.keys()
+
+    def property_values(self, prop_name):
+        """ Returns all distinct hashable values of a property. """
+        return self.__values.get(prop_name, {}).keys()
+
+    def clear(self):
+        """ Removes all objects from the index. """
+        self.__ids = {}
+        self.__values = {}
+        self.__items = {}
+        self.__nested = {}
+        self.__substrings = {}
+
+    def __substring_values(self, prop_name, substring):
+        # Returns the distinct string values of a property that contain a substring (other than the substring itself).
+        # These are only searched for the first time a substring is requested, and kept up to date from then on.
+        by_substring = self.__substrings.setdefault(prop_name, {})
+        containing = by_substring.get(substring, None)
+        if containing is None:
+            if len(by_substring) >= PropertyIndex.MAX_SUBSTRINGS:  # forget the substring we started keeping first
+                del by_substring[next(iter(by_substring))]
+            containing = {value: None for value in self.__values.get(prop_name, {})
+                          if isinstance(value, str) and value != substring and substring in value}
+            by_substring[substring] = containing
+        return containing
+
+    def __add_substring_value(self, prop_name, value):
+        # Adds a new distinct string value of a property to the values kept for each requested substring it contains
+        for substring, containing in self.__substrings.get(prop_name, {}).items():
+            if value != substring and substring in value:
+                containing[value] = None
+
+    def __remove_substring_value(self, prop_name, value):
+        # Removes a string value no object of a property has anymore from the values kept for each requested substring
+        for containing in self.__substrings.get(prop_name, {}).values():
+            containing.pop(value, None)
+
+    def __flat_items(self, obj):
+        # Yields all (property name, value) pairs of an object, including those nested in dict values under their
+        # flattened name (e.g. 'visualization_colour'), the same names as `utils.flatten_dict` uses
+        for prop_name, prop_value in obj.items():
+            yield prop_name, prop_value
+            if isinstance(prop_value, dict):
+                for key, value in prop_value.items():
+                    flat_name = f"{prop_name}_{key}"
+                    if flat_name not in self.__nested:
+                        self.__nested[flat_name] = (prop_name, key)
+                    yield flat_name, value
+
+    def __value_of(self, obj, prop_name):
+        # Returns the value of a property of an object, which might be a nested property under its flattened name
+        if prop_name in obj or prop_name not in self.__nested:
+            return obj[prop_name]
+        parent_name, key = self.__nested[prop_name]
+        return obj[parent_name][key]
+
+    @staticmethod
+    def __discard(index, key, obj_id):
+        # Removes the object id from the ids stored under key, and the key itself if no ids are left
+        if index is None or key not in index:
+            return
+        ids = index[key]
+        ids.pop(obj_id, None)
+        if len(ids) == 0:
+            index.pop(key)
+
+    @staticmethod
+    def __is_hashable(arg):
+        try:
+            hash(arg)
+        except TypeError:
+            return False
+        return True
+
+
+class SpatialIndex:
+
+    def __init__(self):
+        """ A spatial hash of object locations, used by `State` to find objects at or around certain locations.
+
+        The index maps each occupied location to the ids of the objects at that location. Queries for a location, an
+        area or a range around a location only visit the locations within that area (or the occupied locations, if
+        there are fewer of those), regardless of the total number of objects.
+
+        As with `PropertyIndex`, sets of object ids are stored as dicts with None values to keep their order.
+        """
+        self.__cells = {}  # (x, y) -> object ids at that location
+        self.__locations = {}  # object id -> (x, y)
+        self.__bounds = None  # (x_min, y_min, x_max, y_max) of all locations ever added, bounds any nearest search
+
+    def add(self, obj_id, obj):
+        """ Adds an object to the index, if it has a location.
+
+        Parameters
+        ----------
+        obj_id : str
+            The id of the object.
+        obj : dict
+            The object's properties.
+        """
+        if 'location' not in obj or obj['location'] is None:
+            return
+        loc = tuple(obj['location'])
+        self.__locations[obj_id] = loc
+        self.__cells.setdefault(loc, {})[obj_id] = None
+
+        # Only grow the bounds, they do not need to be tight to limit our nearest search
+        if self.__bounds is None:
+            self.__bounds = (loc[0], loc[1], loc[0], loc[1])
+        elif not (self.__bounds[0] <= loc[0] <= self.__bounds[2] and self.__bounds[1] <= loc[1] <= self.__bounds[3]):
+            x_min, y_min, x_max, y_max = self.__bounds
+            self.__bounds = (min(x_min, loc[0]), min(y_min, loc[1]), max(x_max, loc[0]), max(y_max, loc[1]))
+
+    def remove(self, obj_id, obj=None):
+        """ Removes an object from the index.
+
+        Parameters
+        ----------
+        obj_id : str
+            The id of the object.
+        obj : dict (default is None)
+            Ignored, the index remembers where the object was. Accepted so both indices can be updated alike.
+        """
+        loc = self.__locations.pop(obj_id, None)
+        if loc is None:
+            return
+        ids = self.__cells[loc]
+        ids.pop(obj_id, None)
+        if len(ids) == 0:
+            self.__cells.pop(loc)
+
+    def location_of(self, obj_id):
+        """ Returns the location of an object as (x, y), or None if it has no location. """
+        return self.__locations.get(obj_id, None)
+
+    def at(self, location):
+        """ Returns the ids of all objects at a location (as dict keys, this should not be changed). """
+        return self.__cells.get(tuple(location), {})
+
+    def in_area(self, top_left, width, height):
+        """ Returns the ids of all objects within a rectangular area.
+
+        Parameters
+        ----------
+        top_left : (x, y)
+            The top left location of the area.
+        width : int
+            The width of the area.
+        height : int
+            The height of the area.
+
+        Returns
+        -------
+        dict
+            The found object ids as keys (with None as values).
+        """
+        x_min, y_min = top_left
+        x_max, y_max = x_min + width - 1, y_min + height - 1
+        return self.__in_bounds(x_min, y_min, x_max, y_max, lambda loc: True)
+
+    def in_range(self, location, sense_range):
+        """ Returns the ids of all objects within a (Euclidean) distance of a location, including the location itself.
+
+        Parameters
+        ----------
+        location : (x, y)
+            The location from where to search.
+        sense_range : float
+            The maximum distance. Can be `np.inf`.
+
+        Returns
+        -------
+        dict
+            The found object ids as keys (with None as values).
+        """
+        x, y = location
+        sq_range = sense_range ** 2
+
+        def in_range(loc):
+            return (loc[0] - x) ** 2 + (loc[1] - y) ** 2 <= sq_range
+
+        if sense_range == float("inf"):
+            return self.__in_bounds(None, None, None, None, in_range)
+        reach = int(sense_range)
+        return self.__in_bounds(x - reach, y - reach, x + reach, y + reach, in_range)
+
+    def nearest(self, location, obj_ids=None):
+        """ Yields the ids of objects in order of their (Euclidean) distance to a location, closest first.
+
+        The locations around the given location are visited in square rings of growing size. The objects found in a
+        ring are only yielded once no unvisited location can be closer, so asking for the closest object only visits the
+        locations up to it. When only some objects are asked for and visiting the rings takes more lookups than there
+        are objects, the distance to each remaining object is computed instead. Objects at the same distance are
+        yielded in the order they were found.
+
+        Parameters
+        ----------
+        location : (x, y)
+            The location from where to search.
+        obj_ids : iterable (default is None)
+            Only yield these objects, all objects when None. Objects without a location are skipped.
+
+        Yields
+        ------
+        (float, str)
+            The distance and id of each object.
+        """
+        x, y = location
+        if obj_ids is not None and not isinstance(obj_ids, (dict, set, frozenset)):
+            obj_ids = dict.fromkeys(obj_ids)
+
+        # Visit rings while that is cheaper than computing the distance to each of the given objects
+        budget = None if obj_ids is None else len(obj_ids)
+        yielded = {}  # the ids we yielded, in case we switch to computing the distance to each object
+        if self.__bounds is not None:
+            # The largest ring that can still contain any object
+            x_min, y_min, x_max, y_max = self.__bounds
+            max_ring = max(x - x_min, x_max - x, y - y_min, y_max - y, 0)
+
+            heap = []  # (distance, order found, object id) of all objects found but not yet yielded
+            order = itertools.count()
+            for ring in range(max_ring + 1):
+                if ring == 0:
+                    ring_locs = [(x, y)]
+                else:
+                    ring_locs = [(loc_x, loc_y) for loc_x in range(x - ring, x + ring + 1)
+                                 for loc_y in (y - ring, y + ring)]
+                    ring_locs += [(loc_x, loc_y) for loc_x in (x - ring, x + ring)
+                                  for loc_y in range(y - ring + 1, y + ring)]
+                if budget is not None:
+                    budget -= len(ring_locs)
+                    if budget < 0:
+                        break
+                for loc in ring_locs:
+                    ids = self.__cells.get(loc, None)
+                    if ids is not None:
+                        dist = ((loc[0] - x) ** 2 + (loc[1] - y) ** 2) ** 0.5
+                        for obj_id in ids:
+                            if obj_ids is None or obj_id in obj_ids:
+                                heapq.heappush(heap, (dist, next(order), obj_id))
+
+                # Every object outside this ring is more than a ring further away, so all closer ones can be yielded
+                while len(heap) > 0 and heap[0][0] <= ring + 1:
+                    dist, _, obj_id = heapq.heappop(heap)
+                    yielded[obj_id] = None
+                    yield dist, obj_id
+            else:
+                while len(heap) > 0:
+                    dist, _, obj_id = heapq.heappop(heap)
+                    yield dist, obj_id
+                return
+
+        # Compute the distance to each of the given objects that was not yielded yet, and yield them in order
+        if obj_ids is None:
+            return
+        found = []
+        for obj_id in obj_ids:
+            loc = self.__locations.get(obj_id, None)
+            if loc is not None and obj_id not in yielded:
+                found.append((((loc[0] - x) ** 2 + (loc[1] - y) ** 2) ** 0.5, len(found), obj_id))
+        for dist, _, obj_id in sorted(found):
+            yield dist, obj_id
+
+    def occupied_locations(self):
+        """ Returns all locations that contain at least one object. """
+        return self.__cells.keys()
+
+    def clear(self):
+        """ Removes all objects from the index. """
+        self.__cells = {}
+        self.__locations = {}
+        self.__bounds = None
+
+    def __in_bounds(self, x_min, y_min, x_max, y_max, accept):
+        # Collect the object ids at all accepted locations within the bounds (None means unbounded). We either visit
+        # every location within the bounds or every occupied location, whichever are fewer.
+        found = {}
+        if x_min is not None and (x_max - x_min + 1) * (y_max - y_min + 1) <= len(self.__cells):
+            for loc_x in range(x_min, x_max + 1):
+                for loc_y in range(y_min, y_max + 1):
+                    loc = (loc_x, loc_y)
+                    if loc in self.__cells and accept(loc):
+                        found.update(self.__cells[loc])
+        else:
+            for loc, ids in self.__cells.items():
+                if (x_min is None or (x_min <= loc[0] <= x_max and y_min <= loc[1] <= y_max)) and accept(loc):
+                    found.update(ids)
+        return found
+
+
+class RoomIndex:
+
+    def __init__(self):
+        """ A registry of all rooms in a `State`, with their walls, doors, area tiles and other objects.
+
+        Objects are registered to a room through their 'room_name' property, and sorted in walls, doors, area tiles
+        and other objects. This makes all room queries dictionary lookups.
+
+        As with `PropertyIndex`, sets of object ids are stored as dicts with None values to keep their order.
+        """
+        self.__rooms = {}  # room name -> room dict, see `RoomIndex.__new_room`
+
+    def add(self, obj_id, obj):
+        """ Adds an object to the room it belongs to, if any. """
+        if 'room_name' not in obj:
+            return
+        room = self.__rooms.get(obj['room_name'], None)
+        if room is None:
+            room = RoomIndex.__new_room(obj['room_name'])
+            self.__rooms[obj['room_name']] = room
+        kind = RoomIndex.__kind(obj)
+        room[kind][obj_id] = None
+
+    def remove(self, obj_id, obj):
+        """ Removes an object from the room it belonged to, if any. """
+        if 'room_name' not in obj or obj['room_name'] not in self.__rooms:
+            return
+        room = self.__rooms[obj['room_name']]
+        kind = RoomIndex.__kind(obj)
+        room[kind].pop(obj_id, None)
+        if all(len(room[k]) == 0 for k in ('walls', 'doors', 'area_tiles', 'objects')):
+            self.__rooms.pop(obj['room_name'])
+
+    def room_names(self):
+        """ Returns the names of all rooms with at least one object. """
+        return self.__rooms.keys()
+
+    def get(self, room_name):
+        """ Returns the registry entry of a room, or None if it is unknown.
+
+        The entry is a dict with the room's 'name' and the object ids of its 'walls', 'doors', 'area_tiles' and other
+        'objects' (as dict keys). The entry should not be changed.
+
+        Parameters
+        ----------
+        room_name : str
+            The name of the room.
+        """
+        return self.__rooms.get(room_name, None)
+
+    def clear(self):
+        """ Removes all rooms. """
+        self.__rooms = {}
+
+    @staticmethod
+    def __new_room(room_name):
+        return {'name': room_name, 'walls': {}, 'doors': {}, 'area_tiles': {}, 'objects': {}}
+
+    @staticmethod
+    def __kind(obj):
+        # Returns under which kind of room objects the object is stored
+        chain = obj.get('class_inheritance', [])
+        if Wall.__name__ in chain:
+            return 'walls'
+        elif Door.__name__ in chain:
+            return 'doors'
+        elif AreaTile.__name__ in chain:
+            return 'area_tiles'
+        return 'objects'
@@ -0,0 +1,273 @@
+import json
+import pickle
+import struct
+
+import numpy as np
+
+
+# The first bytes of every dumped state, the last two are the format version
+MAGIC = b"BW4TST01"
+
+# The header after the magic bytes; the size of the JSON description that follows it
+_HEADER = struct.Struct("<Q")
+
+# Sections are aligned to this number of bytes, so all arrays can be read in place
+_ALIGNMENT = 8
+
+# Marks that an object does not have a property
+_MISSING = object()
+
+
+def dump(objects, decays, settings, fileobj):
+    """ Writes objects, their knowledge decays and some settings to a binary file, as used by `State.dump`.
+
+    The objects are stored column-wise; each property gets a column with a bit mask of the objects that have it and
+    the values of those objects in a single contiguous buffer. Integers, floats and booleans are stored as NumPy arrays,
+    locations as an (n, 2) integer array and strings (including lists of strings) as indices into a single table of
+    interned strings. Dict values (e.g. 'visualization') are stored as nested columns. Only columns with values of
+    mixed or other types are pickled.
+
+    The file starts with `MAGIC`, followed by the length of a JSON description and the description itself. This
+    describes the settings and where each buffer starts (in bytes from the start of the file) and how long it is. All
+    buffers start at a multiple of 8 bytes, so they can be read with `np.frombuffer` from a memory mapped file.
+
+    Parameters
+    ----------
+    objects : dict
+        The objects by their id.
+    decays : dict
+        The knowledge decay of each memorized object by its id, objects that are not in it are perceived.
+    settings : dict
+        Any JSON serializable settings, returned as is by `load`.
+    fileobj : file-like
+        A file opened for writing bytes.
+    """
+    writer = _Writer()
+    obj_ids = list(objects.keys())
+
+    description = {
+        'settings': settings,
+        'nr_objects': len(obj_ids),
+        'ids': writer.add_strings(obj_ids),
+        'decays': writer.add_array(np.array([decays.get(obj_id, np.nan) for obj_id in obj_ids], dtype=np.float64)),
+        'columns': _dump_columns(writer, list(objects.values())),
+    }
+    writer.add_string_table(description)
+
+    description = json.dumps(description).encode("utf-8")
+    offset = len(MAGIC) + _HEADER.size + len(description)
+    padding = (-offset) % _ALIGNMENT
+    fileobj.write(MAGIC)
+    fileobj.write(_HEADER.pack(len(description) + padding))
+    fileobj.write(description + b" " * padding)
+    writer.write(fileobj)
+
+
+def load(fileobj):
+    """ Reads what `dump` wrote, as used by `State.load`.
+
+    Parameters
+    ----------
+    fileobj : file-like, bytes, mmap.mmap
+        A file opened for reading bytes, or a buffer with its content (e.g. a memory mapped file). Arrays are read
+        from a buffer without copying it.
+
+    Returns
+    -------
+    (dict, dict, dict)
+        The objects by their id, the decays of memorized objects by their id and the settings.
+
+    Raises
+    ------
+    ValueError
+        When the file was not written by `dump`.
+    """
+    buffer = memoryview(fileobj.read() if hasattr(fileobj, "read") else fileobj)
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Cannot load the State, the file does not start with the expected header.")
+    length, = _HEADER.unpack_from(buffer, len(MAGIC))
+    start = len(MAGIC) + _HEADER.size
+    description = json.loads(bytes(buffer[start:start + length]).decode("utf-8"))
+
+    reader = _Reader(buffer, start + length, description['strings'])
+    obj_ids = reader.strings(description['ids'])
+    objs = [{} for _ in obj_ids]
+    _load_columns(reader, description['columns'], objs, np.arange(len(objs)))
+
+    decays = reader.array(description['decays'])
+    memorized = np.flatnonzero(~np.isnan(decays))
+    decays = {obj_ids[row]: decay for row, decay in zip(memorized.tolist(), decays[memorized].tolist())}
+
+    return dict(zip(obj_ids, objs)), decays, description['settings']
+
+
+def _dump_columns(writer, values_per_row):
+    # Writes a column for every key in the (dict) values of all rows, returns their descriptions
+    keys = {}
+    for values in values_per_row:
+        if isinstance(values, dict):
+            keys.update(dict.fromkeys(values))
+
+    columns = []
+    for key in keys:
+        values = [values.get(key, _MISSING) if isinstance(values, dict) else _MISSING for values in values_per_row]
+        present = np.array([value is not _MISSING for value in values], dtype=bool)
+        values = [value for value in values if value is not _MISSING]
+        column = {'name': key, 'mask': writer.add_array(np.packbits(present))}
+        column.update(_dump_values(writer, values))
+        columns.append(column)
+    return columns
+
+
+def _dump_values(writer, values):
+    # Writes the values of a column in the most compact way their types allow, returns its description
+    kind = _kind_of(values)
+    if kind == 'none':
+        return {'kind': kind}
+    if kind == 'bool':
+        return {'kind': kind, 'data': writer.add_array(np.array(values, dtype=np.uint8))}
+    if kind == 'int':
+        return {'kind': kind, 'data': writer.add_array(np.array(values, dtype=np.int64))}
+    if kind == 'float':
+        return {'kind': kind, 'data': writer.add_array(np.array(values, dtype=np.float64))}
+    if kind == 'str':
+        return {'kind': kind, 'data': writer.add_strings(values)}
+    if kind in ('location_tuple', 'location_list'):
+        return {'kind': kind, 'data': writer.add_array(np.array(values, dtype=np.int64).reshape(-1, 2))}
+    if kind == 'str_list':
+        lengths = np.array([len(value) for value in values], dtype=np.int64)
+        return {'kind': kind, 'lengths': writer.add_array(lengths),
+                'data': writer.add_strings([item for value in values for item in value])}
+    if kind == 'dict':
+        return {'kind': kind, 'columns': _dump_columns(writer, values)}
+    return {'kind': 'pickle', 'data': writer.add_bytes(pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL))}
+
+
+def _kind_of(values):
+    # The kind of column that fits all values, 'pickle' if there is none
+    types = {type(value) for value in values}
+    if len(types) == 0 or types == {type(None)}:
+        return 'none'
+    if len(types) > 1:
+        return 'pickle'
+    value_type = types.pop()
+    if value_type is bool:
+        return 'bool'
+    if value_type is int:
+        return 'int' if all(-2 ** 63 <= value < 2 ** 63 for value in values) else 'pickle'
+    if value_type is float:
+        return 'float'
+    if value_type is str:
+        return 'str'
+    if value_type is dict:
+        return 'dict' if all(type(key) is str for value in values for key in value) else 'pickle'
+    if value_type in (tuple, list):
+        if all(len(value) == 2 and type(value[0]) is int and type(value[1]) is int for value in values) \
+                and all(-2 ** 63 <= c < 2 ** 63 for value in values for c in value):
+            return 'location_tuple' if value_type is tuple else 'location_list'
+        if value_type is list and all(type(item) is str for value in values for item in value):
+            return 'str_list'
+    return 'pickle'
+
+
+def _load_columns(reader, columns, objs, rows):
+    # Sets the values of all columns in the given objects, rows are the indices of the objects the masks refer to
+    for column in columns:
+        present = np.unpackbits(reader.array(column['mask']), count=len(rows)).astype(bool)
+        column_rows = rows[present]
+        kind = column['kind']
+        if kind == 'dict':
+            values = [{} for _ in range(len(column_rows))]
+            _load_columns(reader, column['columns'], values, np.arange(len(values)))
+        elif kind == 'none':
+            values = [None] * len(column_rows)
+        elif kind == 'bool':
+            values = reader.array(column['data']).astype(bool).tolist()
+        elif kind in ('int', 'float'):
+            values = reader.array(column['data']).tolist()
+        elif kind == 'str':
+            values = reader.strings(column['data'])
+        elif kind == 'location_tuple':
+            values = [tuple(loc) for loc in reader.array(column['data']).reshape(-1, 2).tolist()]
+        elif kind == 'location_list':
+            values = reader.array(column['data']).reshape(-1, 2).tolist()
+        elif kind == 'str_list':
+            items = reader.strings(column['data'])
+            ends = np.cumsum(reader.array(column['lengths'])).tolist()
+            values = [items[end - length:end] for end, length in zip(ends, reader.array(column['lengths']).tolist())]
+        else:
+            values = pickle.loads(reader.bytes(column['data']))
+
+        name = column['name']
+        for row, value in zip(column_rows.tolist(), values):
+            objs[row][name] = value
+
+
+class _Writer:
+
+    def __init__(self):
+        # Collects all buffers and interned strings, and writes them after the description
+        self.__buffers = []
+        self.__offset = 0  # the offset of the next buffer, relative to the first
+        self.__strings = {}  # string -> index in the string table
+
+    def add_array(self, array):
+        # Adds a NumPy array, returns its description
+        array = np.ascontiguousarray(array)
+        return {'offset': self.__add(array.tobytes()), 'dtype': array.dtype.str, 'count': int(array.size)}
+
+    def add_bytes(self, data):
+        # Adds raw bytes, returns its description
+        return {'offset': self.__add(data), 'nbytes': len(data)}
+
+    def add_strings(self, strings):
+        # Adds a list of strings as indices into the string table, returns its description
+        indices = [self.__strings.setdefault(string, len(self.__strings)) for string in strings]
+        return self.add_array(np.array(indices, dtype=np.uint32))
+
+    def add_string_table(self, description):
+        # Adds the table of all interned strings as a single UTF-8 buffer and the character offset of each string
+        strings = list(self.__strings)
+        offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in strings], out=offsets[1:])
+        description['strings'] = {'data': self.add_bytes("".join(strings).encode("utf-8")),
+                                  'offsets': self.add_array(offsets)}
+
+    def write(self, fileobj):
+        # Writes all buffers, each padded to the alignment
+        for data in self.__buffers:
+            fileobj.write(data)
+
+    def __add(self, data):
+        offset = self.__offset
+        padding = (-len(data)) % _ALIGNMENT
+        self.__buffers.append(data)
+        if padding > 0:
+            self.__buffers.append(b"\0" * padding)
+        self.__offset += len(data) + padding
+        return offset
+
+
+class _Reader:
+
+    def __init__(self, buffer, start, strings):
+        # Reads the buffers after the description, without copying them
+        self.__buffer = buffer
+        self.__start = start
+        text = self.bytes(strings['data']).decode("utf-8")
+        offsets = self.array(strings['offsets']).tolist()
+        self.__strings = [text[begin:end] for begin, end in zip(offsets[:-1], offsets[1:])]
+
+    def array(self, description):
+        # A read-only NumPy array on the buffer
+        return np.frombuffer(self.__buffer, dtype=np.dtype(description['dtype']), count=description['count'],
+                             offset=self.__start + description['offset'])
+
+    def bytes(self, description):
+        start = self.__start + description['offset']
+        return bytes(self.__buffer[start:start + description['nbytes']])
+
+    def strings(self, description):
+        # The strings of a list of string table indices
+        strings = self.__strings
+        return [strings[index] for index in self.array(description).tolist()]
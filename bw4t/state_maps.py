@@ -0,0 +1,372 @@
+import numpy as np
+
+
+class TraverseMap:
+
+    # The maximum number of distance maps we cache, e.g. one per location an agent searched from
+    MAX_DISTANCE_MAPS = 64
+
+    def __init__(self, base=None):
+        """ Keeps track of which locations are blocked, and derives traversability and distance maps from them.
+
+        Like the indices of `State`, this map is updated with every object that is added to or removed from the state.
+        It only counts the objects that block a location; those that are not traversable and doors that are closed.
+        Agents are ignored, as they move around every tick and would otherwise invalidate all maps all the time.
+
+        The traversability map and all distance maps are computed lazily with NumPy, and are cached until the set of
+        blocked locations changes (e.g. when a door opens or closes). Only the most recently computed distance maps are
+        kept, as searching from a moving agent asks for a new one every tick.
+
+        A map can be layered on a base map (e.g. that of a team, see `TeamStateView`). It then counts the objects that
+        are added to and removed from it on top of those of the base map, so removing an object of the base map (e.g.
+        a door that is closed there, to add it again as open) is counted as well. Its traversability map is that of
+        the base map with only the locations it counts computed again.
+
+        Parameters
+        ----------
+        base : TraverseMap (default is None)
+            The map this map is layered on, if any.
+        """
+        self.__base = base
+        self.__blocked = {}  # (x, y) -> number of blocking objects at that location, on top of those of the base map
+        self.__is_changed = True  # whether the blocked locations changed since we last computed the traverse map
+        self.__traverse_map = None
+        self.__base_traverse_map = None  # the traverse map of the base map, when we last computed ours
+        self.__base_blocked = None  # whether each location we count was blocked, when we last computed our map
+        self.__distance_maps = {}  # frozenset of target locations -> distance map
+
+    def add(self, obj_id, obj):
+        """ Adds an object, which only matters if it blocks its location. """
+        if TraverseMap.is_blocking(obj):
+            self.__count(tuple(obj['location']), 1)
+
+    def remove(self, obj_id, obj):
+        """ Removes an object, which only matters if it blocked its location. """
+        if TraverseMap.is_blocking(obj):
+            self.__count(tuple(obj['location']), -1)
+
+    def get_traverse_map(self, shape):
+        """ Returns a boolean array of the given world shape that is True for each traversable location.
+
+        The array is indexed as `traverse_map[x, y]` and is read-only, as it is shared between calls.
+
+        Parameters
+        ----------
+        shape : (width, height)
+            The shape of the world.
+
+        Returns
+        -------
+        np.ndarray
+            The traversability map.
+        """
+        shape = tuple(shape)
+        if self.__base is None:
+            is_changed = self.__is_changed
+        else:
+            # The base map can change the locations we count without us knowing, so we check whether those are blocked
+            # every time; they are only the few locations where we differ from the base map
+            base_traverse_map = self.__base.get_traverse_map(shape)
+            blocked = {loc: count + self.__base.__blocked.get(loc, 0) > 0 for loc, count in self.__blocked.items()}
+            is_changed = base_traverse_map is not self.__base_traverse_map or blocked != self.__base_blocked
+
+        if is_changed or self.__traverse_map is None or self.__traverse_map.shape != shape:
+            if self.__base is None:
+                traverse_map = np.ones(shape, dtype=bool)
+                _set_locations(traverse_map, list(self.__blocked.keys()), False)
+            else:
+                # Only the locations we count can differ from the base map
+                traverse_map = base_traverse_map.copy()
+                _set_locations(traverse_map, [loc for loc, is_blocked in blocked.items() if is_blocked], False)
+                _set_locations(traverse_map, [loc for loc, is_blocked in blocked.items() if not is_blocked], True)
+                self.__base_traverse_map = base_traverse_map
+                self.__base_blocked = blocked
+            traverse_map.flags.writeable = False
+
+            # Only forget our distance maps if traversability actually changed. A location can be blocked and freed
+            # within a single update (e.g. a wall that changed colour), which does not affect any distance.
+            if self.__traverse_map is None or not np.array_equal(self.__traverse_map, traverse_map):
+                self.__distance_maps = {}
+                self.__traverse_map = traverse_map
+            self.__is_changed = False
+
+        return self.__traverse_map
+
+    def get_distance_map(self, shape, targets):
+        """ Returns the number of steps needed to reach the closest target location from each location.
+
+        The distances are computed with a breadth first search that starts at all targets at once, over the four
+        neighbouring locations of each traversable location. Targets themselves may be blocked (e.g. a closed door),
+        their distance is still zero. Unreachable locations have an infinite distance. Maps are cached per set of
+        targets, until traversability changes.
+
+        Parameters
+        ----------
+        shape : (width, height)
+            The shape of the world.
+        targets : list of (x, y)
+            The target locations.
+
+        Returns
+        -------
+        np.ndarray
+            A read-only float array indexed as `distance_map[x, y]`.
+        """
+        traverse_map = self.get_traverse_map(shape)
+        key = frozenset(tuple(loc) for loc in targets)
+        if key not in self.__distance_maps:
+            distance_map = _distance_field(traverse_map, key)
+            distance_map.flags.writeable = False
+            if len(self.__distance_maps) >= TraverseMap.MAX_DISTANCE_MAPS:
+                self.__distance_maps.pop(next(iter(self.__distance_maps)))  # the oldest one
+            self.__distance_maps[key] = distance_map
+        return self.__distance_maps[key]
+
+    def clear(self):
+        """ Removes all objects. """
+        self.__blocked = {}
+        self.__is_changed = True
+        self.__traverse_map = None
+        self.__base_traverse_map = None
+        self.__base_blocked = None
+        self.__distance_maps = {}
+
+    def __count(self, loc, change):
+        # Changes the number of blocking objects at a location, our maps change when the location is blocked or freed
+        prev_count = self.__blocked.get(loc, 0)
+        count = prev_count + change
+        if count != 0:
+            self.__blocked[loc] = count
+        else:
+            self.__blocked.pop(loc, None)
+        if (prev_count > 0) != (count > 0):
+            self.__is_changed = True
+
+    @staticmethod
+    def is_blocking(obj):
+        """ Whether an object blocks its location; it is not an agent and is not traversable or a closed door. """
+        if 'location' not in obj or obj.get('isAgent', False):
+            return False
+        return obj.get('is_traversable', True) is False or obj.get('is_open', True) is False
+
+
+def _set_locations(traverse_map, locs, value):
+    # Sets the given locations of a map to a value, skipping those outside of it
+    if len(locs) == 0:
+        return
+    locs = np.array(locs)
+    inside = (locs[:, 0] >= 0) & (locs[:, 0] < traverse_map.shape[0]) \
+        & (locs[:, 1] >= 0) & (locs[:, 1] < traverse_map.shape[1])
+    locs = locs[inside]
+    traverse_map[locs[:, 0], locs[:, 1]] = value
+
+
+def _distance_field(traverse_map, targets):
+    # A multi-source breadth first search, where each step expands the whole frontier at once through array shifts
+    width, height = traverse_map.shape
+    distance_map = np.full(traverse_map.shape, np.inf)
+    frontier = np.zeros(traverse_map.shape, dtype=bool)
+    for x, y in targets:
+        if 0 <= x < width and 0 <= y < height:
+            frontier[x, y] = True
+    visited = frontier.copy()
+    distance_map[frontier] = 0
+
+    distance = 0
+    while frontier.any():
+        distance += 1
+        neighbours = np.zeros_like(frontier)
+        neighbours[1:, :] |= frontier[:-1, :]
+        neighbours[:-1, :] |= frontier[1:, :]
+        neighbours[:, 1:] |= frontier[:, :-1]
+        neighbours[:, :-1] |= frontier[:, 1:]
+        frontier = neighbours & traverse_map & ~visited
+        visited |= frontier
+        distance_map[frontier] = distance
+
+    return distance_map
+
+
+class OcclusionMap:
+
+    def __init__(self):
+        """ Keeps track of the perceived objects that block the line of sight, and of those hidden behind them.
+
+        Like `TraverseMap`, it is updated with the objects that changed since the last update, instead of finding all
+        opaque objects among everything that is perceived every update. It counts the perceived opaque objects (see
+        `is_opaque`) at each location, and keeps the perceived objects that could not be seen. The latter allows an
+        update to tell whether a hidden object changed, so objects that stay hidden are not checked again.
+        """
+        self.__opaque = {}  # object id -> location, of each perceived opaque object
+        self.__counts = {}  # (x, y) -> number of perceived opaque objects at that location
+        self.__hidden = {}  # object id -> object, of each perceived object that could not be seen
+        self.__visible = None  # the visible locations we last computed
+        self.__visible_from = None  # the origin and shape of the world from which we computed them
+
+    @property
+    def hidden(self):
+        """ The objects perceived in the last update that could not be seen, with their ids as keys. Do not change! """
+        return self.__hidden
+
+    def update(self, state_dict, changed, origin, shape):
+        """ Updates the map with a newly perceived state, and returns its objects that can be seen from the origin.
+
+        Parameters
+        ----------
+        state_dict : dict
+            All perceived objects, with their object ids as keys.
+        changed : dict
+            The perceived objects that are new or differ from how they were perceived in the last update, whether they
+            could be seen then or not.
+        origin : (x, y)
+            The location from where we look.
+        shape : (width, height)
+            The shape of the world.
+
+        Returns
+        -------
+        dict
+            The changed objects that can be seen, and the objects that could not be seen in the last update but can be
+            seen now.
+        """
+        # Only the changed objects can become or stop being opaque, or be opaque elsewhere. Opaque objects that are not
+        # perceived any more are no longer counted; these are few, so we do not need all gone object ids for this.
+        for obj_id, obj in changed.items():
+            self.__set_opaque(obj_id, tuple(obj['location']) if is_opaque(obj) else None)
+        for obj_id in [obj_id for obj_id in self.__opaque if obj_id not in state_dict]:
+            self.__set_opaque(obj_id, None)
+
+        origin, shape = (int(origin[0]), int(origin[1])), tuple(shape)
+        if self.__visible is None or self.__visible_from != (origin, shape):
+            self.__visible = visible_locations(origin, self.__counts, shape)
+            self.__visible_from = (origin, shape)
+
+        # Split the perceived objects in those we can see and those that are hidden
+        was_hidden = self.__hidden
+        self.__hidden = {}
+        visible = {}
+        for obj_id, obj in state_dict.items():
+            if 'location' in obj and tuple(obj['location']) not in self.__visible:
+                self.__hidden[obj_id] = obj
+            elif obj_id in changed or obj_id in was_hidden:
+                visible[obj_id] = obj
+        return visible
+
+    def clear(self):
+        """ Forgets all perceived objects. """
+        self.__opaque = {}
+        self.__counts = {}
+        self.__hidden = {}
+        self.__visible = None
+        self.__visible_from = None
+
+    def __set_opaque(self, obj_id, loc):
+        # Sets the location of an opaque object (None if it is not opaque), and counts it there. The visible locations
+        # are only computed again when a location becomes or stops being opaque.
+        prev_loc = self.__opaque.pop(obj_id, None)
+        if prev_loc == loc:
+            if loc is not None:
+                self.__opaque[obj_id] = loc
+            return
+        if prev_loc is not None:
+            count = self.__counts[prev_loc] - 1
+            if count > 0:
+                self.__counts[prev_loc] = count
+            else:
+                del self.__counts[prev_loc]
+                self.__visible = None
+        if loc is not None:
+            self.__opaque[obj_id] = loc
+            count = self.__counts.get(loc, 0)
+            self.__counts[loc] = count + 1
+            if count == 0:
+                self.__visible = None
+
+
+def is_opaque(obj):
+    """ Whether an object blocks the line of sight; walls and closed doors do. """
+    if 'location' not in obj or 'class_inheritance' not in obj:
+        return False
+    chain = obj['class_inheritance']
+    return 'Wall' in chain or ('Door' in chain and obj.get('is_open', True) is False)
+
+
+# The transformations of the first octant to each of the eight octants around a location, as (xx, xy, yx, yy)
+_OCTANTS = [(1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+            (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1)]
+
+
+def visible_locations(origin, opaque_locs, shape, sense_range=np.inf):
+    """ Returns all locations that can be seen from the origin, using recursive shadowcasting.
+
+    Each of the eight octants around the origin is scanned row by row moving away from the origin, while keeping track
+    of the slopes between which the light still passes. An opaque location narrows (or splits) that range of slopes for
+    all rows behind it. As only the lit part of each row is visited, the cost grows with the visible area instead of
+    with the number of objects or opaque locations. Opaque locations are visible themselves, but block what is behind.
+
+    Parameters
+    ----------
+    origin : (x, y)
+        The location from where we look.
+    opaque_locs : set or dict of (x, y)
+        All locations that block the line of sight.
+    shape : (width, height)
+        The shape of the world, locations outside it are never visible.
+    sense_range : float (default is np.inf)
+        The maximum (Euclidean) distance that can be seen.
+
+    Returns
+    -------
+    set
+        All visible locations as (x, y), including the origin.
+    """
+    width, height = shape
+    origin = (int(origin[0]), int(origin[1]))
+    max_rows = max(width, height) if sense_range == np.inf else int(min(sense_range, max(width, height)))
+    visible = {origin}
+    for xx, xy, yx, yy in _OCTANTS:
+        _cast_light(origin, opaque_locs, width, height, sense_range ** 2, max_rows, 1, 1.0, 0.0, xx, xy, yx, yy,
+                    visible)
+    return visible
+
+
+def _cast_light(origin, opaque_locs, width, height, sq_range, max_rows, row, start, end, xx, xy, yx, yy, visible):
+    # Lights all locations in one octant from the given row onwards, between the start and end slopes
+    if start < end:
+        return
+    origin_x, origin_y = origin
+    new_start = 0.0
+    for j in range(row, max_rows + 1):
+        dx, dy = -j - 1, -j
+        blocked = False
+        while dx <= 0:
+            dx += 1
+            x = origin_x + dx * xx + dy * xy
+            y = origin_y + dx * yx + dy * yy
+            left_slope = (dx - 0.5) / (dy + 0.5)
+            right_slope = (dx + 0.5) / (dy - 0.5)
+            if start < right_slope:
+                continue
+            elif end > left_slope:
+                break
+
+            # This location is lit, everything outside the world is treated as opaque
+            is_inside = 0 <= x < width and 0 <= y < height
+            if is_inside and dx * dx + dy * dy <= sq_range:
+                visible.add((x, y))
+            is_opaque_loc = not is_inside or (x, y) in opaque_locs
+
+            if blocked:  # we are scanning a row of opaque locations
+                if is_opaque_loc:
+                    new_start = right_slope
+                    continue
+                else:
+                    blocked = False
+                    start = new_start
+            elif is_opaque_loc and j < max_rows:  # an opaque location starts, light the part of the rows before it
+                blocked = True
+                _cast_light(origin, opaque_locs, width, height, sq_range, max_rows, j + 1, start, left_slope,
+                            xx, xy, yx, yy, visible)
+                new_start = right_slope
+        if blocked:
+            break
@@ -0,0 +1,103 @@
+import numpy as np
+
+
+class DecayArray:
+
+    def __init__(self, capacity=64):
+        """ The knowledge decays of all memorized objects, stored in a single NumPy array.
+
+        Every memorized object gets a slot in the array, which holds its decay. Slots of forgotten objects are put on a
+        free list and reused, so the array only grows when more objects are memorized at once than ever before. This
+        allows all decays to be decremented, and all fully decayed objects to be found, with a single array operation
+        per tick. Only the objects that start or stop being memorized are handled in Python.
+
+        Parameters
+        ----------
+        capacity : int (default is 64)
+            The initial number of slots, the array doubles in size when more are needed.
+        """
+        self.__slots = {}  # object id -> slot
+        self.__ids = [None] * capacity  # slot -> object id (None when free)
+        self.__free = list(range(capacity - 1, -1, -1))  # free slots, the lowest slot is popped first
+        self.__decays = np.zeros(capacity)  # slot -> decay
+        self.__in_use = np.zeros(capacity, dtype=bool)  # slot -> whether it holds a memorized object
+
+    def memorize(self, obj_id, decay=1.0):
+        """ Starts memorizing an object with the given decay, or resets it if the object was already memorized. """
+        slot = self.__slots.get(obj_id, None)
+        if slot is None:
+            if len(self.__free) == 0:
+                self.__grow()
+            slot = self.__free.pop()
+            self.__slots[obj_id] = slot
+            self.__ids[slot] = obj_id
+            self.__in_use[slot] = True
+        self.__decays[slot] = decay
+
+    def forget(self, obj_id):
+        """ Stops memorizing an object, if it was memorized at all. """
+        slot = self.__slots.pop(obj_id, None)
+        if slot is not None:
+            self.__release(slot)
+
+    def decay(self, decay_val):
+        """ Decays all memorized objects with the given value and forgets those that fully decayed.
+
+        Parameters
+        ----------
+        decay_val : float
+            The value subtracted from each decay, decays never drop below zero.
+
+        Returns
+        -------
+        list
+            The ids of all objects that fully decayed, and are thus forgotten.
+        """
+        np.subtract(self.__decays, decay_val, out=self.__decays, where=self.__in_use)
+        np.maximum(self.__decays, 0, out=self.__decays)
+        expired_slots = np.flatnonzero(self.__in_use & (self.__decays <= 0))
+
+        expired_ids = []
+        for slot in expired_slots.tolist():
+            obj_id = self.__ids[slot]
+            self.__slots.pop(obj_id)
+            self.__release(slot)
+            expired_ids.append(obj_id)
+        return expired_ids
+
+    def get(self, obj_id, default=None):
+        """ Returns the decay of a memorized object, or the default if it is not memorized. """
+        slot = self.__slots.get(obj_id, None)
+        if slot is None:
+            return default
+        return float(self.__decays[slot])
+
+    def items(self):
+        """ Returns a list of (object id, decay) tuples of all memorized objects. """
+        return [(obj_id, float(self.__decays[slot])) for obj_id, slot in self.__slots.items()]
+
+    def clear(self):
+        """ Forgets all memorized objects. """
+        self.__init__(capacity=len(self.__ids))
+
+    def __contains__(self, obj_id):
+        return obj_id in self.__slots
+
+    def __len__(self):
+        return len(self.__slots)
+
+    def __release(self, slot):
+        # Frees a slot so it can be reused
+        self.__ids[slot] = None
+        self.__in_use[slot] = False
+        self.__decays[slot] = 0
+        self.__free.append(slot)
+
+    def __grow(self):
+        # Doubles the number of slots, the new slots are added to the free list (lowest slot on top)
+        capacity = len(self.__ids)
+        new_capacity = max(1, 2 * capacity)
+        self.__ids.extend([None] * (new_capacity - capacity))
+        self.__decays = np.concatenate([self.__decays, np.zeros(new_capacity - capacity)])
+        self.__in_use = np.concatenate([self.__in_use, np.zeros(new_capacity - capacity, dtype=bool)])
+        self.__free = list(range(new_capacity - 1, capacity - 1, -1)) + self.__free
@@ -0,0 +1,151 @@
+import csv
+import time
+from collections import namedtuple
+
+
+# A single profiled call; the agent (id) whose state was called, the tick of that state, the called method, the shape
+# of the query, how long the call took in seconds and the number of found objects (or changes for an update).
+QueryRecord = namedtuple("QueryRecord", ["agent_id", "tick", "method", "shape", "duration", "result_size"])
+
+
+class StateProfiler:
+
+    # The number of buckets of each latency histogram, bucket i counts the calls that took less than 2**i microseconds
+    # (and at least 2**(i-1)), the last bucket counts all slower calls
+    NR_BUCKETS = 24
+
+    def __init__(self, trace=False):
+        """ Records how often the queries and updates of one or more `State` objects are called and how long they take.
+
+        A profiler is opt-in, a `State` only times its calls when it was given a profiler. Without one, the overhead is
+        a single check per call. One profiler can be shared by the states of several agents, which are kept apart by
+        their agent id.
+
+        For every agent, method and query shape, it keeps the number of calls, their total duration, a latency
+        histogram and the total number of found objects. The query shapes are:
+
+        - `id`: a lookup of one or more object ids.
+        - `property`: all objects with a single property.
+        - `property_value`: all objects with a single property and (one of) some values.
+        - `multi_property`: all objects with several properties, with or without values.
+        - `update`: a state update, its result size is the number of added, changed and removed objects.
+        - `batch`: a batch of queries (`State.query_many`), its result size is the number of objects found by all.
+
+        Parameters
+        ----------
+        trace : bool (default is False)
+            Whether to also keep every single call as `QueryRecord`, to see how the costs are spread over the ticks.
+
+        Examples
+        --------
+        Profile the states of all agents, and print what each spent its time on after running a world.
+        >>> profiler = StateProfiler(trace=True)
+        >>> state = State(memorize_for_ticks=10, agent_id=agent_id, profiler=profiler)
+        >>> ...
+        >>> for agent_id, stats in profiler.summary().items():
+        >>>     print(agent_id, stats)
+        >>> profiler.write_trace(open("trace.csv", "w", newline=""))
+        """
+        self.__stats = {}  # (agent id, method, shape) -> [count, total duration, total result size, histogram]
+        self.__trace = [] if trace else None
+
+    @staticmethod
+    def timer():
+        """ Returns the current time in nanoseconds, to time a call with. """
+        return time.perf_counter_ns()
+
+    def record(self, agent_id, tick, method, shape, duration_ns, result_size):
+        """ Records a single call.
+
+        Parameters
+        ----------
+        agent_id : str
+            The agent id of the state, can be None.
+        tick : int
+            The tick of the state, can be None.
+        method : str
+            The name of the called method.
+        shape : str
+            The shape of the query, see `StateProfiler`.
+        duration_ns : int
+            How long the call took in nanoseconds, measured with `StateProfiler.timer`.
+        result_size : int
+            The number of found objects, or changes for an update.
+        """
+        key = (agent_id, method, shape)
+        stats = self.__stats.get(key, None)
+        if stats is None:
+            stats = [0, 0, 0, [0] * StateProfiler.NR_BUCKETS]
+            self.__stats[key] = stats
+        stats[0] += 1
+        stats[1] += duration_ns
+        stats[2] += result_size
+        stats[3][min((duration_ns // 1000).bit_length(), StateProfiler.NR_BUCKETS - 1)] += 1
+
+        if self.__trace is not None:
+            self.__trace.append(QueryRecord(agent_id, tick, method, shape, duration_ns / 1e9, result_size))
+
+    def summary(self, agent_id=None):
+        """ Returns the statistics per agent, method and query shape.
+
+        Parameters
+        ----------
+        agent_id : str (default is None)
+            Only return the statistics of this agent, all agents when None.
+
+        Returns
+        -------
+        dict
+            Maps each agent id to a dict, that maps each (method, shape) to a dict with the `count` of calls, the
+            `total_time` and `mean_time` in seconds, the `mean_result_size` and the latency `histogram`. The histogram
+            is a list of counts, where bucket i counts the calls that took less than 2**i microseconds.
+        """
+        summary = {}
+        for (agent, method, shape), (count, total_ns, total_size, histogram) in self.__stats.items():
+            if agent_id is not None and agent != agent_id:
+                continue
+            summary.setdefault(agent, {})[(method, shape)] = {
+                'count': count,
+                'total_time': total_ns / 1e9,
+                'mean_time': total_ns / 1e9 / count,
+                'mean_result_size': total_size / count,
+                'histogram': list(histogram),
+            }
+        return summary
+
+    def trace(self):
+        """ Returns all recorded calls as a list of `QueryRecord`, empty when the profiler does not trace. """
+        return [] if self.__trace is None else list(self.__trace)
+
+    def write_summary(self, fileobj):
+        """ Writes the statistics of all agents as CSV to an open text file, one row per agent, method and shape. """
+        writer = csv.writer(fileobj)
+        writer.writerow(["agent_id", "method", "shape", "count", "total_time", "mean_time", "mean_result_size"]
+                        + [f"lt_{2 ** i}us" for i in range(StateProfiler.NR_BUCKETS)])
+        for agent_id, stats in self.summary().items():
+            for (method, shape), s in stats.items():
+                writer.writerow([agent_id, method, shape, s['count'], s['total_time'], s['mean_time'],
+                                 s['mean_result_size']] + s['histogram'])
+
+    def write_trace(self, fileobj):
+        """ Writes all recorded calls as CSV to an open text file, one row per call. """
+        writer = csv.writer(fileobj)
+        writer.writerow(QueryRecord._fields)
+        writer.writerows(self.trace())
+
+    def reset(self):
+        """ Forgets everything recorded so far. """
+        self.__stats = {}
+        if self.__trace is not None:
+            self.__trace = []
+
+
+def query_shape(query, is_id_lookup):
+    """ Returns the shape of a compiled query, as used by `StateProfiler`. """
+    if is_id_lookup:
+        return 'id'
+    if len(query.props) > 1:
+        return 'multi_property'
+    if all(value is None for value in query.props[0][1]):
+        return 'property'
+    return 'property_value'
@@ -0,0 +1,542 @@
+import heapq
+import weakref
+from collections.abc import Mapping
+
+import numpy as np
+
+from bw4t.state import BaseState, State, StateDelta, StateQuery, StateSnapshot
+from bw4t.state_maps import OcclusionMap
+from bw4t.state_memory import DecayArray
+
+
+class TeamState:
+
+    def __init__(self):
+        """ The knowledge of a team of agents, shared by the `TeamStateView` of each teammate.
+
+        Teammates perceive largely the same walls, doors and tiles. Instead of each agent storing and indexing all of
+        these in its own `State`, a team shares a single `State` with all objects any teammate knows about. Each agent
+        gets a view on it through `TeamState.view`, which only keeps what differs per agent; which objects it perceives,
+        the decays of those it memorizes, and its own version of each object it knows differently than the team.
+
+        The shared state holds each object in the latest version a teammate perceived. When a teammate perceives a new
+        version of an object (e.g. an agent that moved, or a door that opened), the views that still know the previous
+        version keep that in an overlay of their own. A view drops its own version again once it perceives the version
+        of the team, or forgets the object. So a view only keeps the objects that changed since it last perceived them,
+        and memory and indexing work grow with the number of unique objects and the outdated objects of each agent, not
+        with the number of agents times the number of objects.
+
+        An object stays in the shared state as long as at least one view knows it. Views that are garbage collected
+        (e.g. when an agent is initialized again for a new world) release all their objects automatically.
+
+        Examples
+        --------
+        Create one team state and give every teammate a view on it.
+        >>> team_state = TeamState()
+        >>> state = team_state.view(agent_id, memorize_for_ticks=10)
+        >>> state.state_update(state_dict)
+        """
+        self.__state = State()  # all objects known by any view, nothing is memorized as the views decay themselves
+        self.__known_by = {}  # object id -> number of views that know the object
+        self.__views = weakref.WeakValueDictionary()  # id -> view, all views are told when we replace an object
+
+    @property
+    def state(self):
+        """ The shared `State` with all objects known by the team, in the latest version a teammate perceived. """
+        return self.__state
+
+    def view(self, agent_id, memorize_for_ticks=None, fov_occlusion=False, profiler=None):
+        """ Returns a new view on the team's knowledge for a single agent.
+
+        Parameters
+        ----------
+        agent_id : str
+            The id of the agent.
+        memorize_for_ticks : int (default is None)
+            For how many ticks the agent memorizes objects it no longer perceives, as with `State`.
+        fov_occlusion : bool (default is False)
+            Whether objects the agent cannot see are removed from its perceived state, as with `State`.
+        profiler : StateProfiler (default is None)
+            The profiler that records the agent's queries and updates, as with `State`.
+
+        Returns
+        -------
+        TeamStateView
+            The view, use it like a `State`.
+        """
+        return TeamStateView(self, agent_id, memorize_for_ticks, fov_occlusion, profiler)
+
+    def __len__(self):
+        return len(self.__state)
+
+    def __getstate__(self):
+        # The views belong to the agents and are created when these are initialized, so a team is pickled (e.g. with
+        # a prefetched world) without them. Weak references cannot be pickled either.
+        state = self.__dict__.copy()
+        del state['_TeamState__views']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__views = weakref.WeakValueDictionary()
+
+    def _join(self, view):
+        # Registers a new view, so it is told when we replace an object it may know
+        self.__views[id(view)] = view
+
+    def _acquire(self, obj_ids):
+        # Counts the view that now knows these objects, which the team already has
+        for obj_id in obj_ids:
+            self.__known_by[obj_id] = self.__known_by.get(obj_id, 0) + 1
+
+    def _perceive(self, view, perceived, added_ids):
+        # A view perceived objects anew, of which those with the given ids are new to it. We count the view as knowing
+        # these, and make each perceived version the team's version. The other views are told which versions we
+        # replaced, so those that know them can keep them as their own.
+        self._acquire(added_ids)
+        shared = self.__state.as_dict()
+        new_objs, replaced = {}, {}
+        for obj_id, obj in perceived.items():
+            shared_obj = shared.get(obj_id, None)
+            if shared_obj is None:
+                new_objs[obj_id] = obj
+            elif shared_obj is not obj and shared_obj != obj:
+                new_objs[obj_id] = obj
+                replaced[obj_id] = shared_obj
+        if len(new_objs) > 0:
+            self.__state.state_update_delta(new_objs, [])
+        if len(replaced) > 0:
+            for other in list(self.__views.values()):
+                if other is not view:
+                    other._outdate(replaced)
+
+    def _release(self, obj_ids):
+        # A view no longer knows these objects, remove those that no view knows
+        gone_ids = []
+        for obj_id in obj_ids:
+            count = self.__known_by.get(obj_id, 0) - 1
+            if count > 0:
+                self.__known_by[obj_id] = count
+            else:
+                self.__known_by.pop(obj_id, None)
+                gone_ids.append(obj_id)
+        if len(gone_ids) > 0:
+            self.__state.state_update_delta({}, gone_ids)
+
+
+class TeamStateView(BaseState):
+
+    def __init__(self, team_state, agent_id, memorize_for_ticks=None, fov_occlusion=False, profiler=None):
+        """ The knowledge of a single agent as a view on the knowledge of its team, created by `TeamState.view`.
+
+        The view offers the same updates and queries as `State`. It keeps its own perceived objects and knowledge
+        decays, and passes what it perceives to the team's shared state. Objects it knows in another version than the
+        team's, as a teammate perceived a newer one, are kept in an overlay of its own; a small `State` that holds only
+        those. Queries are answered by the shared state and its indices among the objects this agent knows in the
+        team's version, and by the overlay for the others.
+
+        The traversability and distance maps are those of the team, with the objects this agent knows differently in
+        their own version. They include what teammates know, which is exactly what a teammate would tell. The room
+        names are those of the team as well.
+
+        Parameters
+        ----------
+        team_state : TeamState
+            The team this view belongs to.
+        agent_id : str
+            The id of the agent.
+        memorize_for_ticks : int (default is None)
+            For how many ticks objects are memorized once they are no longer perceived.
+        fov_occlusion : bool (default is False)
+            Whether objects the agent cannot see are removed from every perceived state.
+        profiler : StateProfiler (default is None)
+            The profiler that records our queries and updates, see `State`.
+        """
+        super().__init__(agent_id, profiler)
+        self.__team_state = team_state
+        self.__state = team_state.state
+        self.__fov_occlusion = fov_occlusion
+        self.__profiler = profiler
+        self.__memorize_for_ticks = memorize_for_ticks
+        if memorize_for_ticks is None:
+            self.__decay_val = 0
+        else:
+            self.__decay_val = 1.0 / memorize_for_ticks
+
+        self.__known = {}  # the ids of all objects this agent knows (as dict keys, to keep their order)
+        self.__perceived = {}  # the ids of all objects perceived in the last update
+        self.__decays = DecayArray()  # the decays of all objects that are memorized but no longer perceived
+
+        # Our own version of each object we know differently than the team, and the traverse map of the team with those
+        # versions in place of the team's
+        self.__overlay = State()
+        self.__traverse_map = self.__state._layered_traverse_map()
+
+        # The perceived objects that block our sight or are hidden behind them, when we apply occlusion
+        self.__occlusion = OcclusionMap()
+
+        # The changes made by the last update, as with `State.last_delta`
+        self.last_delta = StateDelta({}, {}, {}, {})
+
+        # Hear from the team when it replaces an object we may know, and release all our objects when we are no longer
+        # used (without the finalizer keeping us alive)
+        team_state._join(self)
+        weakref.finalize(self, team_state._release, self.__known)
+
+    def state_update(self, state_dict):
+        """ Updates this view and the team's state with a newly perceived state, see `State.state_update`.
+
+        Parameters
+        ----------
+        state_dict : dict
+            All perceived objects, with their object ids as keys.
+
+        Returns
+        -------
+        TeamStateView
+            This view, now updated.
+        """
+        start = self._timer()
+
+        # Get all objects that are newly perceived or that differ from how we perceived them in the last update, as
+        # with `State.state_update`. When requested, those we cannot see are not perceived.
+        hidden = self.__occlusion.hidden
+        perceived = {}
+        for obj_id, obj in state_dict.items():
+            prev_obj = self.__get(obj_id) if obj_id in self.__perceived else hidden.get(obj_id, None)
+            if prev_obj is None or (prev_obj is not obj and prev_obj != obj):
+                perceived[obj_id] = obj
+        if self.__fov_occlusion:
+            perceived = self.__occlusion.update(state_dict, perceived, *self.__sight(state_dict))
+            hidden = self.__occlusion.hidden
+            gone_ids = [obj_id for obj_id in self.__perceived if obj_id not in state_dict or obj_id in hidden]
+        else:
+            gone_ids = [obj_id for obj_id in self.__perceived if obj_id not in state_dict]
+
+        # Of these, get those that are new to us or differ from the version we know, which is our own version if we
+        # have one and that of the team otherwise
+        added, changed, removed, previous = {}, {}, {}, {}
+        for obj_id, obj in perceived.items():
+            if obj_id not in self.__known:
+                added[obj_id] = obj
+            else:
+                prev_obj = self.__get(obj_id)
+                if prev_obj is not obj and prev_obj != obj:
+                    changed[obj_id] = obj
+                    previous[obj_id] = prev_obj
+
+        # Perceived objects are no longer memorized, the others start to decay or are forgotten right away
+        for obj_id in perceived:
+            self.__decays.forget(obj_id)
+            self.__known[obj_id] = None
+            self.__perceived[obj_id] = None
+        forgotten = []
+        for obj_id in gone_ids:
+            self.__perceived.pop(obj_id)
+            if self.__decay_val > 0:
+                self.__decays.memorize(obj_id)
+            else:
+                forgotten.append(obj_id)
+        if self.__decay_val > 0:
+            forgotten.extend(self.__decays.decay(self.__decay_val))
+
+        # What we perceive becomes the team's version, so we drop our own version of it, as we do for what we forget.
+        # The team tells our teammates which of their versions are now outdated.
+        own = self.__overlay.as_dict()
+        for obj_id in forgotten:
+            removed[obj_id] = self.__get(obj_id)
+            self.__known.pop(obj_id)
+        self.__own({}, [obj_id for obj_id in (*perceived, *forgotten) if obj_id in own])
+        self.__team_state._perceive(self, perceived, added)
+        self.__team_state._release(forgotten)
+
+        self.last_delta = StateDelta(added, changed, removed, previous)
+        if start is not None:
+            self._record("state_update", "update", self._timer() - start, len(added) + len(changed) + len(removed))
+        return self
+
+    ###############################################
+    #  Methods that allow the view to act as dict #
+    ###############################################
+    def __iter__(self):
+        return iter(self.__known)
+
+    def __len__(self):
+        return len(self.__known)
+
+    def __contains__(self, obj_id):
+        return obj_id in self.__known
+
+    def copy(self):
+        """ Returns a copy of this view, a new view of the same agent on the same team, see `State.copy`.
+
+        The copy knows the same objects in the same versions, with the same decays. Only what this view keeps of its
+        own is copied, the team's state is shared.
+
+        Returns
+        -------
+        TeamStateView
+            The copy.
+        """
+        view = TeamStateView(self.__team_state, self.agent_id, memorize_for_ticks=self.__memorize_for_ticks,
+                             fov_occlusion=self.__fov_occlusion, profiler=self.__profiler)
+        self.__team_state._acquire(self.__known)
+        view.__known.update(self.__known)
+        view.__perceived = dict(self.__perceived)
+        for obj_id, decay in self.__decays.items():
+            view.__decays.memorize(obj_id, decay)
+        view.__own(self.__overlay.as_dict(), [])
+        view.last_delta = self.last_delta
+        return view
+
+    def snapshot(self):
+        """ Returns a read-only snapshot of the objects this agent knows as they are now, see `State.snapshot`.
+
+        Unlike that of a `State`, taking it takes time by the number of objects this agent knows, as it records which
+        version of each object that is. The objects themselves are shared.
+
+        Returns
+        -------
+        StateSnapshot
+            The snapshot.
+        """
+        return StateSnapshot(self.as_dict(), self.__memorize_for_ticks, self.agent_id)
+
+    def pop(self, obj_id):
+        """ Forgets an object right away and returns it, see `State.pop`. The team keeps it while teammates know it. """
+        if obj_id not in self.__known:
+            raise KeyError(obj_id)
+        obj = self.__get(obj_id)
+        self.__known.pop(obj_id)
+        self.__perceived.pop(obj_id, None)
+        self.__decays.forget(obj_id)
+        if obj_id in self.__overlay.as_dict():
+            self.__own({}, [obj_id])
+        self.__team_state._release([obj_id])
+        return obj
+
+    def remove(self, obj_id):
+        """ Forgets an object right away, see `pop`. """
+        self.pop(obj_id)
+
+    def as_dict(self):
+        """ Returns the objects this agent knows as a new dict. """
+        return {obj_id: self.__get(obj_id) for obj_id in self.__known}
+
+    def to_state(self):
+        """ Returns an independent `State` with the objects this agent knows and their decays. """
+        state = State(memorize_for_ticks=self.__memorize_for_ticks, agent_id=self.agent_id,
+                      fov_occlusion=self.__fov_occlusion)
+        state.state_update_delta(self.as_dict(), [])
+        for obj_id, decay in self.__decays.items():
+            state._memorize(obj_id, decay)
+        return state
+
+    def dump(self, fileobj):
+        """ Writes the objects this agent knows and their decays to a binary file, read it with `State.load`. """
+        self.to_state().dump(fileobj)
+
+    ###############################################
+    #     Some helpful getters for the state      #
+    ###############################################
+    def compile(self, props, combined=True):
+        """ Compiles a query that only finds the objects this agent knows, see `State.compile`. """
+        query = self.__state.compile(props, combined)
+        return StateQuery(query.query, query.combined, query.obj_ids, query.props, self._run_compiled)
+
+    def get_decay(self, obj_id):
+        """ Returns how well this agent remembers an object, see `State.get_decay`. """
+        if obj_id not in self.__known:
+            raise KeyError(obj_id)
+        return self.__decays.get(obj_id, 1.0)
+
+    def get_world_info(self):
+        return self.__get('World')
+
+    def get_all_room_names(self):
+        return list(dict.fromkeys(self.__state.get_all_room_names() + self.__overlay.get_all_room_names()))
+
+    def get_room_content(self, room_name):
+        return self.__known_only(self.__state.get_room_content(room_name), self.__overlay.get_room_content(room_name))
+
+    def get_room_doors(self, room_name):
+        return self.__known_only(self.__state.get_room_doors(room_name), self.__overlay.get_room_doors(room_name))
+
+    def get_objects_at(self, location):
+        return self.__known_only(self.__state.get_objects_at(location), self.__overlay.get_objects_at(location))
+
+    def get_objects_in_area(self, top_left, width, height):
+        return self.__known_only(self.__state.get_objects_in_area(top_left, width, height),
+                                 self.__overlay.get_objects_in_area(top_left, width, height))
+
+    def get_objects_in_range(self, location, sense_range):
+        return self.__known_only(self.__state.get_objects_in_range(location, sense_range),
+                                 self.__overlay.get_objects_in_range(location, sense_range))
+
+    def get_columns(self, prop_names, where=None, combined=True):
+        """ Returns properties of the objects this agent knows as NumPy arrays, see `State.get_columns`. """
+        if isinstance(prop_names, str):
+            prop_names = [prop_names]
+        if where is None:
+            obj_ids = list(self.__known)
+        elif isinstance(where, list) and all(isinstance(obj, Mapping) for obj in where):
+            obj_ids = [obj['obj_id'] for obj in where if obj['obj_id'] in self.__known]
+        else:
+            query = where if isinstance(where, StateQuery) else self.__state.compile(where, combined)
+            obj_ids = self._query_ids(query)
+
+        # The columns of the objects we know in the team's version come from the team, the others from our overlay
+        shared_ids, own_ids = self.__split(obj_ids)
+        shared = self.__state.as_dict()
+        columns = self.__state.get_columns(prop_names, where=[shared[obj_id] for obj_id in shared_ids])
+        if len(own_ids) > 0:
+            own = self.__overlay.as_dict()
+            own_columns = self.__overlay.get_columns(prop_names, where=[own[obj_id] for obj_id in own_ids])
+            if len(columns['obj_id']) == 0:
+                columns = own_columns
+            elif len(own_columns['obj_id']) > 0:
+                columns = {name: np.concatenate([column, own_columns[name]]) for name, column in columns.items()}
+        return columns
+
+    def get_closest_object(self, k=None, location=None, path_distance=False):
+        """ Returns the known object(s) closest to this agent or a location, see `State.get_closest_object`. """
+        return State._closest(self.__nearest(list(self.__known), location, path_distance), k, self.__get)
+
+    def get_closest_with_property(self, prop_name, prop_value=None, k=None, location=None, path_distance=False):
+        """ Returns the known object(s) with a property (value) closest to this agent or a location, see
+        `State.get_closest_with_property`. """
+        props = prop_name if prop_value is None else {prop_name: prop_value}
+        obj_ids = self._query_ids(self.__state.compile(props))
+        return State._closest(self.__nearest(obj_ids, location, path_distance), k, self.__get)
+
+    def get_closest_room(self, k=None, location=None, path_distance=False):
+        """ Returns the name(s) of the known room(s) closest to this agent or a location, see
+        `State.get_closest_room`. """
+        obj_ids = self._query_ids(self.__state.compile('room_name'))
+        return State._closest_rooms(self.__nearest(obj_ids, location, path_distance), k, self.__get)
+
+    def get_closest_agent(self, k=None, location=None, path_distance=False):
+        """ Returns the known agent(s) closest to this agent or a location, see `State.get_closest_agent`. """
+        obj_ids = self._query_ids(self.__state.compile({'isAgent': True}))
+        return State._closest(self.__nearest(obj_ids, location, path_distance), k, self.__get)
+
+    def get_traverse_map(self):
+        return self.__traverse_map.get_traverse_map(self.get_world_info()['grid_shape'])
+
+    def get_distance_map(self, targets):
+        locs = State._target_locations(targets)
+        if locs is None:
+            found = self._find_object(targets, combined=True)
+            locs = [obj['location'] for obj in found if 'location' in obj] if found is not None else []
+        return self.__traverse_map.get_distance_map(self.get_world_info()['grid_shape'], locs)
+
+    def apply_occlusion(self, state_dict, origin=None):
+        """ Returns the perceived state without all objects that cannot be seen from the origin, see
+        `State.apply_occlusion`. """
+        return self.__state.apply_occlusion(state_dict, origin=self.__sight(state_dict, origin)[0])
+
+    ##################################################
+    #  The basic functions that make up most of view #
+    ##################################################
+    def _query_ids(self, query, found_cache=None):
+        # Returns the ids of the objects we know that a query finds. If it is a list of ids that we all know, these are
+        # returned as with `State`. Otherwise the team's state finds them among the objects we know, of which we leave
+        # out those we know in our own version; our overlay finds those. The overlay is small, so it is not cached.
+        if query.obj_ids is not None and all(obj_id in self.__known for obj_id in query.obj_ids):
+            return query.obj_ids
+        ids = self.__state._query_ids(query, found_cache, among=self.__known)
+        own = self.__overlay.as_dict()
+        if len(own) == 0:
+            return ids
+        ids = [obj_id for obj_id in ids if obj_id not in own]
+        ids.extend(self.__overlay._query_ids(query))
+        return ids
+
+    def _get(self, obj_id):
+        # Returns the version of an object that we know, or None when we do not know it
+        return self.__get(obj_id) if obj_id in self.__known else None
+
+    def _outdate(self, replaced):
+        # The team replaced these objects (given in the version it had) with the version a teammate perceived. We keep
+        # the version we know as our own, if we know them in the team's version. For those we already have our own
+        # version of, our traverse map should count that instead of the team's new version; and we drop our version if
+        # it happens to be the team's new version.
+        shared = self.__state.as_dict()
+        own = self.__overlay.as_dict()
+        own_objs, shared_ids = {}, []
+        for obj_id, prev_shared_obj in replaced.items():
+            if obj_id not in self.__known:
+                continue
+            own_obj = own.get(obj_id, None)
+            if own_obj is None:
+                own_objs[obj_id] = prev_shared_obj
+                continue
+            self.__traverse_map.add(obj_id, prev_shared_obj)
+            self.__traverse_map.remove(obj_id, shared[obj_id])
+            if own_obj is shared[obj_id] or own_obj == shared[obj_id]:
+                shared_ids.append(obj_id)
+        if len(own_objs) > 0 or len(shared_ids) > 0:
+            self.__own(own_objs, shared_ids)
+
+    def __get(self, obj_id):
+        # Returns the version of a known object that we know; our own version if we have one, the team's otherwise
+        obj = self.__overlay.as_dict().get(obj_id, None)
+        return self.__state.as_dict()[obj_id] if obj is None else obj
+
+    def __own(self, objs, shared_ids):
+        # Keeps our own version of the given objects, and drops it for the objects with the given ids so we know those
+        # in the team's version again (or not at all). Our traverse map counts the version we know, not the team's.
+        shared = self.__state.as_dict()
+        own = self.__overlay.as_dict()
+        for obj_id, obj in objs.items():
+            prev_obj = own.get(obj_id, None)
+            self.__traverse_map.remove(obj_id, shared[obj_id] if prev_obj is None else prev_obj)
+            self.__traverse_map.add(obj_id, obj)
+        for obj_id in shared_ids:
+            self.__traverse_map.remove(obj_id, own[obj_id])
+            self.__traverse_map.add(obj_id, shared[obj_id])
+        self.__overlay.state_update_delta(objs, shared_ids)
+
+    def __split(self, obj_ids):
+        # Splits the ids of known objects in those we know in the team's version and those we know in our own version
+        own = self.__overlay.as_dict()
+        if len(own) == 0:
+            return list(obj_ids), []
+        shared_ids, own_ids = [], []
+        for obj_id in obj_ids:
+            (own_ids if obj_id in own else shared_ids).append(obj_id)
+        return shared_ids, own_ids
+
+    def __nearest(self, obj_ids, location, path_distance):
+        # Yields (distance, object id) of the given known objects in order of their distance to the location (or our
+        # agent), merged from those we know in the team's version and those we know in our own version
+        location = self.__origin(location)
+        distance_map = None
+        if path_distance:
+            distance_map = self.__traverse_map.get_distance_map(self.get_world_info()['grid_shape'], [location])
+        shared_ids, own_ids = self.__split(obj_ids)
+        return heapq.merge(self.__state._nearest(shared_ids, location, path_distance, self.agent_id, distance_map),
+                           self.__overlay._nearest(own_ids, location, path_distance, self.agent_id, distance_map))
+
+    def __sight(self, state_dict, origin=None):
+        # The location to look from in a perceived state, as with `State`, and the shape of the world
+        if origin is None:
+            origin = self.agent_id
+        if isinstance(origin, str):
+            origin = state_dict[origin]['location'] if origin in state_dict else self.__get(origin)['location']
+        world = state_dict['World'] if 'World' in state_dict else self.get_world_info()
+        return origin, world['grid_shape']
+
+    def __origin(self, location):
+        # The location to search from; the given location or otherwise that of our agent
+        if location is not None:
+            return tuple(location)
+        if self.agent_id not in self.__known:
+            raise ValueError("Cannot find the closest objects without a location, as this agent is not in its state.")
+        return tuple(self.__get(self.agent_id)['location'])
+
+    def __known_only(self, shared_objs, own_objs):
+        # Keeps the objects found by the team's state that we know in the team's version, and adds those found by our
+        # overlay
+        own = self.__overlay.as_dict()
+        return [obj for obj in shared_objs if obj['obj_id'] in self.__known and obj['obj_id'] not in own] + own_objs
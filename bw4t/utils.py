@@ -0,0 +1,25 @@
+def flatten_dict(dict_):
+    """ Returns a dict of which the dict values are flattened into the dict itself.
+
+    Each item of a dict value is added under the name of that value and its key joined by an underscore (e.g. the
+    'colour' of 'visualization' becomes 'visualization_colour'). Only a single level is flattened.
+
+    Parameters
+    ----------
+    dict_ : dict
+        The dict to flatten.
+
+    Returns
+    -------
+    dict
+        The flattened dict.
+    """
+    new_dict = {}
+    for k, v in dict_.items():
+        if isinstance(v, dict):
+            sub_dict_ = {f"{k}_{k2}": v2 for k2, v2 in v.items()}
+            new_dict = {**new_dict, **sub_dict_}
+        else:
+            new_dict[k] = v
+
+    return new_dict
@@ -0,0 +1,123 @@
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+class PrefetchedWorlds:
+
+    def __init__(self, builder_factory, nr_of_worlds, random_seed=1, prefetch=2, mp_context=None, **builder_kwargs):
+        """ Creates worlds in a pool of background processes, ahead of the world that is currently run.
+
+        A `WorldBuilder` creates a world only when it is asked for the next one, so creating it sits between running one
+        world and the next. Iterating over the prefetched worlds instead yields the worlds in order, while the next
+        `prefetch` worlds are already created in the background; the next world is there as soon as the current one
+        is done.
+
+        Each world is created by its own builder, which is made by `builder_factory` in a background process with a
+        random seed that only depends on `random_seed` and the number of the world (see `world_seed`). The same world
+        is thus created for the same seed and number, regardless of the other worlds or the order in which they are
+        created. The worlds are sent to this process by pickling them, as is the factory with its arguments, so all
+        should be picklable (e.g. a module-level function such as `create_builder`). Worlds with agents can only be
+        pickled when they are created by a `BW4TWorldBuilder`. Any object in the arguments is copied to each world, such
+        as a `GoalTelemetry`; get it from the goals of a world instead (e.g. with `CollectionGoal.telemetry`).
+
+        The builders in the background processes should be headless (e.g. `create_builder(headless=True)`), as only the
+        builder in this process should start the api and visualizer the worlds are run with.
+
+        The background processes are started when the prefetched worlds are created; create them before starting any
+        threads (e.g. with `builder.startup`), as these are not copied to the processes.
+
+        Parameters
+        ----------
+        builder_factory : callable
+            Returns a `BW4TWorldBuilder` when called with its random `seed` and the `builder_kwargs`.
+        nr_of_worlds : int
+            The number of worlds.
+        random_seed : int (default is 1)
+            The seed from which the seed of each world is derived.
+        prefetch : int (default is 2)
+            The number of worlds created ahead of the current one, which is also the number of background processes.
+        mp_context : multiprocessing context (default is None)
+            The context with which the background processes are started, the default of `multiprocessing` if None.
+        **builder_kwargs
+            Any other arguments of the `builder_factory`.
+
+        Raises
+        ------
+        ValueError
+            When the number of worlds is negative or the number of prefetched worlds is not positive.
+
+        Examples
+        --------
+        Run 10 worlds, each created while the previous one runs.
+        >>> builder = create_builder()
+        >>> worlds = PrefetchedWorlds(create_builder, nr_of_worlds=10, random_seed=1, headless=True)
+        >>> builder.startup()
+        >>> for world in worlds:
+        >>>     world.run(builder.api_info)
+        >>> builder.stop()
+        """
+        if not isinstance(nr_of_worlds, int) or nr_of_worlds < 0:
+            raise ValueError(f"The nr_of_worlds {nr_of_worlds} should be an int larger or equal to 0.")
+        if not isinstance(prefetch, int) or prefetch <= 0:
+            raise ValueError(f"The number of prefetched worlds {prefetch} should be an int larger than 0.")
+
+        self.__builder_factory = builder_factory
+        self.__builder_kwargs = builder_kwargs
+        self.__nr_of_worlds = nr_of_worlds
+        self.__random_seed = random_seed
+        self.__prefetch = prefetch
+
+        self.__pool = ProcessPoolExecutor(max_workers=prefetch, mp_context=mp_context)
+        self.__futures = collections.deque()  # the worlds being created, in order
+        self.__nr_submitted = 0  # the number of worlds of which the creation is started
+        self.__submit()
+
+    @staticmethod
+    def world_seed(random_seed, world_nr):
+        """ Returns the random seed of the builder of a world, derived from the given seed and the number of the world.
+        """
+        return int(np.random.SeedSequence([random_seed, world_nr]).generate_state(1)[0])
+
+    def __submit(self):
+        # Start creating worlds until the given number of worlds are created ahead of the current one
+        while self.__nr_submitted < self.__nr_of_worlds and len(self.__futures) < self.__prefetch:
+            seed = PrefetchedWorlds.world_seed(self.__random_seed, self.__nr_submitted)
+            self.__futures.append(self.__pool.submit(_create_world, self.__builder_factory, self.__builder_kwargs,
+                                                     seed, self.__nr_submitted))
+            self.__nr_submitted += 1
+
+    def __iter__(self):
+        try:
+            while len(self.__futures) > 0:
+                world = self.__futures.popleft().result()
+                # Start creating the next world before handing this one over, so it is created while this one runs
+                self.__submit()
+                yield world
+        finally:
+            self.close()
+
+    def __len__(self):
+        return self.__nr_of_worlds
+
+    def close(self):
+        """ Stops creating worlds and shuts the background processes down. """
+        for future in self.__futures:
+            future.cancel()
+        self.__futures.clear()
+        self.__nr_submitted = self.__nr_of_worlds
+        self.__pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _create_world(builder_factory, builder_kwargs, seed, world_nr):
+    # Creates a single world in a background process, numbered as the builder would have if it created all worlds. The
+    # world is pickled to send it back, which its agents allow as it is a `RegistryGridWorld` (see `BW4TWorldBuilder`).
+    builder = builder_factory(seed=seed, **builder_kwargs)
+    return builder.get_world(world_nr=world_nr)
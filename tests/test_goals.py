@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+from matrx import WorldBuilder
+
+from bw4t.builder import BW4TWorldBuilder, add_collection_goal
+from bw4t.goals import CollectionGoal, CollectionZoneObserver, RandomOrderProperty
+from bw4t.object_registry import ObjectRegistry
+
+
+RED, BLUE, GREEN = "#ff0000", "#0000ff", "#00ff00"
+DROP_ZONE = [(1, 1), (2, 1)]
+
+
+class CollectionWorld:
+
+    def __init__(self, in_order=False):
+        """ A world with a drop zone for a red and a blue block, in which we move the blocks as agents would. """
+        builder = BW4TWorldBuilder(shape=(10, 10), random_seed=1, run_matrx_api=False, run_matrx_visualizer=False,
+                                   verbose=False)
+        add_collection_goal(builder, DROP_ZONE, [{"visualization_colour": RED}, {"visualization_colour": BLUE}],
+                            name="Drop", in_order=in_order)
+        builder.add_object((1, 1), "blue", visualize_colour=BLUE, is_movable=True)
+        builder.add_object((5, 5), "red", visualize_colour=RED, is_movable=True)
+        self.world = builder.get_world()
+        self.world.initialize(builder.api_info)
+        self.world._GridWorld__update_grid()
+        goals = self.world.simulation_goal
+        goals = goals.goals if hasattr(goals, "goals") else goals
+        self.goal = next(goal for goal in (goals if isinstance(goals, list) else [goals])
+                         if isinstance(goal, CollectionGoal))
+        self.objects = {obj.obj_name: obj for obj in self.world.environment_objects.values()}
+
+    def check(self):
+        """ Moves on to the next tick and returns whether the goal is reached and its progress. """
+        self.world._GridWorld__current_nr_ticks += 1
+        return self.goal.goal_reached(self.world), self.goal.get_progress(self.world)
+
+    def grab(self, name):
+        assert self.world.remove_from_grid(self.objects[name].obj_id, remove_from_carrier=False)
+
+    def drop(self, name, location):
+        obj = self.objects[name]
+        obj.location = location
+        self.world._register_env_object(obj, ensure_unique_id=False)
+
+
+def test_goal_follows_drops_pickups_and_changes():
+    world = CollectionWorld()
+    assert world.check() == (False, 0.5)  # the blue block starts in the drop zone
+    assert world.check() == (False, 0.5)
+
+    world.objects["blue"].change_property("visualize_colour", GREEN)
+    assert world.check() == (False, 0.0)
+    world.objects["blue"].change_property("visualize_colour", BLUE)
+    assert world.check() == (False, 0.5)
+
+    world.grab("blue")
+    assert world.check() == (False, 0.0)
+    world.drop("blue", (1, 1))
+    assert world.check() == (False, 0.5)
+
+    world.grab("red")
+    world.drop("red", (2, 1))
+    assert world.check() == (True, 1.0)
+
+
+def test_goal_in_order_requires_the_first_block_first():
+    world = CollectionWorld(in_order=True)
+    assert world.check() == (False, 0.0)  # blue is in the zone, but red is asked for first
+    world.grab("blue")
+    world.grab("red")
+    world.drop("red", (2, 1))
+    assert world.check() == (False, 0.5)
+    world.drop("blue", (1, 1))
+    assert world.check() == (True, 1.0)
+
+
+def test_observer_gives_all_changes_to_who_missed_a_version():
+    world = CollectionWorld()
+    world.check()
+    observer = CollectionZoneObserver.of(world.world)
+    assert observer is CollectionZoneObserver.of(world.world)
+    zone = observer.watch(DROP_ZONE, world.world)
+
+    version, changed_locs, left_ids = observer.observe(world.world, zone)
+    assert left_ids is None and changed_locs == {(1, 1): ("blue",), (2, 1): ()}
+    world.grab("red")
+    world.drop("red", (2, 1))
+    world.world._GridWorld__current_nr_ticks += 1
+    assert observer.observe(world.world, zone, since=version) == (version + 1, {(2, 1): ("red",)}, [])
+    assert observer.observe(world.world, zone, since=version + 1) == (version + 1, {}, [])
+
+
+def test_random_order_property_draws_copies():
+    possibilities = [{"visualization_colour": colour} for colour in (RED, BLUE, GREEN)]
+    order = CollectionGoal.get_random_order_property(possibilities, length=2, with_duplicates=True)
+    assert isinstance(order, RandomOrderProperty) and len(order.values) == 9
+    rng = np.random.RandomState(1)
+    drawn = order._get_property(rng)
+    drawn[0]["visualization_colour"] = "#000000"
+    assert [possibility["visualization_colour"] for possibility in possibilities] == [RED, BLUE, GREEN]
+
+    without_duplicates = RandomOrderProperty([RED, BLUE, GREEN], 2, allow_duplicates=False)
+    assert len({tuple(without_duplicates._get_property(rng)) for _ in range(6)}) == 6
+    with pytest.raises(ValueError):
+        without_duplicates._get_property(rng)
+
+
+def test_builder_draws_an_order_for_each_world():
+    def create_builder():
+        builder = BW4TWorldBuilder(shape=(10, 10), random_seed=4, run_matrx_api=False, run_matrx_visualizer=False,
+                                   verbose=False)
+        possibilities = [{"visualization_colour": colour} for colour in (RED, BLUE, GREEN)]
+        add_collection_goal(builder, DROP_ZONE, CollectionGoal.get_random_order_property(possibilities, length=2),
+                            name="Drop")
+        return builder
+
+    def target(world):
+        return ObjectRegistry.of(world).find("collection_zone_name", "Drop")[0].properties["collection_objects"]
+
+    builder = create_builder()
+    targets = [target(builder.get_world()) for _ in range(5)]
+    assert all(len(objs) == 2 and objs[0] != objs[1] for objs in targets)
+    assert len({tuple(obj["visualization_colour"] for obj in objs) for objs in targets}) > 1
+    assert target(create_builder().get_world()) == targets[0]
+
+    with pytest.raises(ValueError):
+        add_collection_goal(WorldBuilder(shape=(10, 10)), DROP_ZONE, RandomOrderProperty([RED, BLUE], 2), name="x")
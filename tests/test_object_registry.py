@@ -0,0 +1,97 @@
+import pickle
+
+import pytest
+from matrx import WorldBuilder
+from matrx.objects import EnvObject
+
+from bw4t.builder import BW4TWorldBuilder
+from bw4t.object_registry import ObjectRegistry, RegistryGridWorld
+
+
+def create_world(seed=1, initialize=True):
+    builder = BW4TWorldBuilder(shape=(12, 12), random_seed=seed, run_matrx_api=False, run_matrx_visualizer=False,
+                               verbose=False)
+    builder.add_room(top_left_location=(0, 0), width=6, height=6, name="room_0", door_locations=[(3, 5)])
+    builder.add_object_prospects([(x, y) for x in range(1, 5) for y in range(1, 5)], "Block in room_0", 0.5,
+                                 colours=["#ff0000", "#0000ff"], room_name="room_0")
+    builder.add_object((8, 8), "Sign", room_name="room_1")
+    world = builder.get_world()
+    if initialize:
+        world.initialize(builder.api_info)
+    return world
+
+
+def scan(world, prop_name, value):
+    """ Finds the objects of a world with a property value by checking each of them. """
+    return sorted(obj_id for obj_id, obj in world.environment_objects.items()
+                  if prop_name in obj.properties and obj.properties[prop_name] == value)
+
+
+def find(world, prop_name, value):
+    return sorted(obj.obj_id for obj in ObjectRegistry.of(world).find(prop_name, value))
+
+
+def assert_same(world):
+    names = {obj.obj_name for obj in world.environment_objects.values()}
+    rooms = {obj.properties.get("room_name", None) for obj in world.environment_objects.values()}
+    for name in names:
+        assert find(world, "name", name) == scan(world, "name", name), name
+    for room_name in rooms - {None}:
+        assert find(world, "room_name", room_name) == scan(world, "room_name", room_name), room_name
+
+
+class Listener:
+
+    def __init__(self):
+        self.events = []
+
+    def object_added(self, obj):
+        self.events.append(("added", obj.obj_id))
+
+    def object_removed(self, obj):
+        self.events.append(("removed", obj.obj_id))
+
+
+def test_registry_finds_the_objects_a_scan_finds():
+    world = create_world()
+    assert isinstance(world, RegistryGridWorld)
+    assert len(find(world, "name", "Block in room_0")) > 0
+    assert_same(world)
+
+    # Grabbing removes an object from the grid, dropping registers it again
+    listener = Listener()
+    ObjectRegistry.of(world).listen(listener)
+    block_ids = find(world, "name", "Block in room_0")
+    for y, obj_id in enumerate(block_ids[:3]):
+        block = world.environment_objects[obj_id]
+        assert world.remove_from_grid(obj_id, remove_from_carrier=False)
+        assert obj_id not in find(world, "name", "Block in room_0")
+        block.location = (9, y)
+        world._register_env_object(block, ensure_unique_id=False)
+        assert_same(world)
+    assert listener.events == [(event, obj_id) for obj_id in block_ids[:3] for event in ("removed", "added")]
+
+    world._register_env_object(EnvObject((10, 10), "Other", class_callable=EnvObject, room_name="room_1"))
+    assert_same(world)
+    assert len(find(world, "room_name", "room_1")) == 2
+
+
+def test_registry_only_finds_indexed_properties():
+    world = create_world()
+    assert find(world, "name", "Nothing") == []
+    assert find(world, "name", ["unhashable"]) == []
+    with pytest.raises(ValueError):
+        ObjectRegistry.of(world).find("visualize_colour", "#ff0000")
+
+
+def test_registry_of_other_worlds_raises():
+    world = WorldBuilder(shape=(5, 5), run_matrx_api=False, run_matrx_visualizer=False, verbose=False).get_world()
+    with pytest.raises(ValueError):
+        ObjectRegistry.of(world)
+
+
+def test_pickled_world_keeps_its_registry():
+    world = create_world(initialize=False)
+    copied = pickle.loads(pickle.dumps(world))
+    assert_same(copied)
+    assert find(copied, "name", "Block in room_0") == find(world, "name", "Block in room_0")
@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+
+from bw4t.state import State
+from bw4t.utils import flatten_dict
+from tests.worlds import RandomWorld, ids
+
+
+# Queries of all shapes `state[...]` accepts, answered by the indices of `State`
+QUERIES = [
+    'room_name',
+    'block_1',
+    ['agent_0', 'World'],
+    ['agent_0', 'block_100'],
+    ['is_open', 'room_name'],
+    {'class_inheritance': 'Wall'},
+    {'class_inheritance': ['Door', 'Sign']},
+    {'is_open': [True, False]},
+    {'is_open': False},
+    {'visualization_colour': '#ff0000'},
+    {'isAgent': True},
+    {'name': 'block'},
+    {'room_name': 'room_0', 'class_inheritance': 'Wall'},
+    {'class_inheritance': 'CollectBlock', 'visualization_colour': ['#0000ff', '#00ff00']},
+    {'class_inheritance': 'Unknown'},
+]
+
+
+def scan(state_dict, props, combined=True):
+    """ Answers a query by checking every object, as `State` did before it kept indices. """
+    if isinstance(props, str):
+        if props in state_dict:
+            return [props]
+        props = {props: None}
+    elif isinstance(props, list):
+        if all(obj_id in state_dict for obj_id in props):
+            return sorted(props)
+        props = {prop_name: None for prop_name in props}
+
+    found = []
+    for prop_name, values in props.items():
+        values = tuple(values) if isinstance(values, (list, tuple)) else (values,)
+        found.append({obj_id for obj_id, obj in state_dict.items()
+                      if any(_has(flatten_dict(obj), prop_name, value) for value in values)})
+    found = set.intersection(*found) if combined else set.union(*found)
+    return sorted(found) if len(found) > 0 else None
+
+
+def _has(obj, prop_name, value):
+    # Whether an object has a property with a value, or a value that contains it (e.g. as substring or list item)
+    if prop_name not in obj:
+        return False
+    if value is None or value == obj[prop_name]:
+        return True
+    try:
+        return value in obj[prop_name]
+    except TypeError:
+        return False
+
+
+def run_world(nr_ticks=150, seed=1, agent_id='agent_0', **state_kwargs):
+    """ Yields a state of an agent after each tick of a random world, with the world. """
+    world = RandomWorld(seed)
+    state = State(agent_id=agent_id, **state_kwargs)
+    for _ in range(nr_ticks):
+        world.step()
+        state.state_update(world.perceive(agent_id))
+        yield world, state
+
+
+@pytest.mark.parametrize("memorize_for_ticks", [None, 3])
+def test_queries_match_a_scan(memorize_for_ticks):
+    for world, state in run_world(memorize_for_ticks=memorize_for_ticks):
+        objects = state.as_dict()
+        for query in QUERIES:
+            expected = scan(objects, query)
+            assert ids(state.get_with_property(query)) == expected, query
+            assert ids(state.compile(query).run()) == expected, query
+            if isinstance(query, dict) and len(query) > 1:
+                assert ids(state.get_with_property(query, combined=False)) == scan(objects, query, combined=False)
+        assert [ids(found) for found in state.query_many(QUERIES)] == [scan(objects, query) for query in QUERIES]
+
+
+def test_spatial_queries_match_a_scan():
+    for world, state in run_world():
+        located = {obj_id: obj['location'] for obj_id, obj in state.as_dict().items() if 'location' in obj}
+        for loc in [(5, 8), (3, 3), state['agent_0']['location']]:
+            assert ids(state.get_objects_at(loc)) == sorted(obj_id for obj_id, obj_loc in located.items()
+                                                            if obj_loc == loc)
+        assert ids(state.get_objects_in_area((1, 2), 8, 6)) == sorted(
+            obj_id for obj_id, (x, y) in located.items() if 1 <= x < 9 and 2 <= y < 8)
+        assert ids(state.get_objects_in_range((10, 10), 4)) == sorted(
+            obj_id for obj_id, (x, y) in located.items() if np.hypot(x - 10, y - 10) <= 4)
+
+
+def test_room_queries_match_a_scan():
+    for world, state in run_world():
+        objects = state.as_dict().values()
+        in_room = [obj for obj in objects if obj.get('room_name', None) == 'room_0']
+        assert state.get_all_room_names() == (['room_0'] if len(in_room) > 0 else [])
+        assert ids(state.get_room_content('room_0')) == sorted(
+            obj['obj_id'] for obj in in_room if not {'Wall', 'Door'} & set(obj['class_inheritance']))
+        assert ids(state.get_room_doors('room_0')) == sorted(
+            obj['obj_id'] for obj in in_room if 'Door' in obj['class_inheritance'])
+        assert state.get_room_content('room_9') == []
+
+
+def test_closest_queries_match_a_scan():
+    for world, state in run_world(memorize_for_ticks=3):
+        origin = np.array(state['agent_0']['location'])
+
+        def distances(objs):
+            return [round(float(np.hypot(*(np.array(obj['location']) - origin))), 6) for obj in objs]
+
+        others = [obj for obj_id, obj in state.as_dict().items() if 'location' in obj and obj_id != 'agent_0']
+        blocks = [obj for obj in others if 'CollectBlock' in obj['class_inheritance']]
+        agents = [obj for obj in others if obj.get('isAgent', False)]
+        assert distances(state.get_closest_object(k=5)) == sorted(distances(others))[:5]
+        assert distances(state.get_closest_with_property('class_inheritance', 'CollectBlock', k=3)) == \
+            sorted(distances(blocks))[:3]
+        assert distances(state.get_closest_agent(k=2)) == sorted(distances(agents))[:2]
+
+
+def test_columns_match_the_objects():
+    for world, state in run_world(nr_ticks=50):
+        columns = state.get_columns(['location', 'visualization_colour'], where={'class_inheritance': 'CollectBlock'})
+        blocks = {obj_id: obj for obj_id, obj in state.as_dict().items()
+                  if 'CollectBlock' in obj.get('class_inheritance', [])}
+        assert sorted(columns['obj_id']) == sorted(blocks)
+        for obj_id, loc, colour in zip(columns['obj_id'], columns['location'], columns['visualization_colour']):
+            assert tuple(loc) == blocks[obj_id]['location']
+            assert colour == blocks[obj_id]['visualization']['colour']
+
+
+def test_snapshot_and_copy_keep_their_objects():
+    states = run_world(memorize_for_ticks=3)
+    for _ in range(50):
+        world, state = next(states)
+    snapshot = state.snapshot()
+    copy = state.copy()
+    objects = dict(state.as_dict())
+    decays = {obj_id: state.get_decay(obj_id) for obj_id in state}
+    for _ in range(50):
+        world, state = next(states)
+    assert snapshot.as_dict() == objects
+    assert copy.as_dict() == objects
+    assert {obj_id: copy.get_decay(obj_id) for obj_id in copy} == decays
+    for query in QUERIES:
+        assert ids(copy.get_with_property(query)) == scan(objects, query), query
@@ -0,0 +1,88 @@
+import io
+import mmap
+
+import pytest
+
+from bw4t.state import State
+from bw4t.state_team import TeamState
+from tests.test_state import QUERIES
+from tests.worlds import RandomWorld, ids
+
+
+def memorized_state(nr_ticks=60, **state_kwargs):
+    """ Returns the state of an agent after some ticks of a random world, with memorized objects. """
+    world = RandomWorld(10, nr_blocks=20)
+    state = State(agent_id='agent_0', memorize_for_ticks=5, **state_kwargs)
+    for _ in range(nr_ticks):
+        world.step()
+        state.state_update(world.perceive('agent_0'))
+    return state
+
+
+def dumped(state):
+    fileobj = io.BytesIO()
+    state.dump(fileobj)
+    return fileobj.getvalue()
+
+
+def assert_same(loaded, state):
+    assert loaded.as_dict() == state.as_dict()
+    assert {obj_id: loaded.get_decay(obj_id) for obj_id in loaded} == \
+        {obj_id: state.get_decay(obj_id) for obj_id in state}
+    assert loaded.agent_id == state.agent_id
+    for query in QUERIES:
+        assert ids(loaded.get_with_property(query)) == ids(state.get_with_property(query)), query
+
+
+@pytest.mark.parametrize("fov_occlusion", [False, True])
+def test_load_returns_the_dumped_state(fov_occlusion):
+    state = memorized_state(fov_occlusion=fov_occlusion)
+    assert any(state.get_decay(obj_id) < 1.0 for obj_id in state)
+    assert_same(State.load(io.BytesIO(dumped(state))), state)
+
+
+def test_load_reads_a_buffer_or_memory_mapped_file(tmp_path):
+    state = memorized_state()
+    assert_same(State.load(dumped(state)), state)
+
+    path = tmp_path / "state.bin"
+    with open(path, "wb") as fileobj:
+        state.dump(fileobj)
+    with open(path, "rb") as fileobj:
+        with mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            loaded = State.load(buffer)
+            assert_same(loaded, state)
+
+
+def test_loaded_state_continues_as_the_dumped_state():
+    world = RandomWorld(11)
+    state = State(agent_id='agent_0', memorize_for_ticks=5)
+    for _ in range(30):
+        world.step()
+        state.state_update(world.perceive('agent_0'))
+    loaded = State.load(dumped(state))
+    for _ in range(30):
+        world.step()
+        perceived = world.perceive('agent_0')
+        state.state_update(perceived)
+        loaded.state_update(perceived)
+        assert_same(loaded, state)
+
+
+def test_team_state_view_dumps_as_a_state():
+    world = RandomWorld(12)
+    view = TeamState().view('agent_0', memorize_for_ticks=5)
+    state = State(agent_id='agent_0', memorize_for_ticks=5)
+    for _ in range(30):
+        world.step()
+        perceived = world.perceive('agent_0')
+        view.state_update(perceived)
+        state.state_update(perceived)
+    fileobj = io.BytesIO()
+    view.dump(fileobj)
+    assert_same(State.load(fileobj.getvalue()), state)
+
+
+def test_load_refuses_other_files():
+    with pytest.raises(ValueError):
+        State.load(b"not a dumped state")
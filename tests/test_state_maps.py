@@ -0,0 +1,138 @@
+import collections
+import random
+
+import numpy as np
+import pytest
+
+from bw4t.state import State
+from bw4t.state_maps import TraverseMap, is_opaque, visible_locations
+from tests.worlds import RandomWorld
+
+
+def scan_traverse_map(objects, shape):
+    """ Returns the traverse map of some objects by checking each of them. """
+    traverse_map = np.ones(shape, dtype=bool)
+    for obj in objects.values():
+        if 'location' in obj and not obj.get('isAgent', False) \
+                and (obj.get('is_traversable', True) is False or obj.get('is_open', True) is False):
+            traverse_map[obj['location']] = False
+    return traverse_map
+
+
+def scan_distance_map(traverse_map, targets):
+    """ Returns the distance map of a traverse map with a breadth first search from the targets. """
+    distance_map = np.full(traverse_map.shape, np.inf)
+    queue = collections.deque()
+    for target in targets:
+        distance_map[target] = 0
+        queue.append(target)
+    while len(queue) > 0:
+        x, y = queue.popleft()
+        for loc in [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]:
+            if 0 <= loc[0] < traverse_map.shape[0] and 0 <= loc[1] < traverse_map.shape[1] \
+                    and traverse_map[loc] and distance_map[loc] == np.inf:
+                distance_map[loc] = distance_map[x, y] + 1
+                queue.append(loc)
+    return distance_map
+
+
+def test_traverse_and_distance_maps_match_a_scan():
+    world = RandomWorld(2)
+    state = State(agent_id='agent_0', memorize_for_ticks=3)
+    for _ in range(150):
+        world.step()
+        state.state_update(world.perceive('agent_0'))
+        traverse_map = scan_traverse_map(state.as_dict(), world.shape)
+        assert np.array_equal(state.get_traverse_map(), traverse_map)
+        loc = state['agent_0']['location']
+        assert np.array_equal(state.get_distance_map(loc), scan_distance_map(traverse_map, [loc]))
+        doors = [obj['location'] for obj in state.as_dict().values() if 'Door' in obj.get('class_inheritance', [])]
+        assert np.array_equal(state.get_distance_map({'class_inheritance': 'Door'}),
+                              scan_distance_map(traverse_map, doors))
+
+
+def test_layered_traverse_map_counts_on_top_of_its_base():
+    rng = random.Random(3)
+    shape = (8, 8)
+    base = TraverseMap()
+    layer = TraverseMap(base=base)
+    counts = {base: collections.Counter(), layer: collections.Counter()}
+    for step in range(1500):
+        traverse_map = rng.choice([base, layer])
+        loc = (rng.randrange(-1, 9), rng.randrange(8))
+        obj = {'location': loc, 'is_traversable': False}
+        # The base map never removes more than it added, a layer can remove what its base map added
+        if rng.random() < 0.55 or (traverse_map is base and counts[base][loc] == 0):
+            traverse_map.add('obj', obj)
+            counts[traverse_map][loc] += 1
+        else:
+            traverse_map.remove('obj', obj)
+            counts[traverse_map][loc] -= 1
+        if step % 7 == 0:
+            expected_base = np.ones(shape, dtype=bool)
+            expected_layer = np.ones(shape, dtype=bool)
+            for (x, y) in set(counts[base]) | set(counts[layer]):
+                if 0 <= x < shape[0]:
+                    expected_base[x, y] = counts[base][x, y] <= 0
+                    expected_layer[x, y] = counts[base][x, y] + counts[layer][x, y] <= 0
+            assert np.array_equal(base.get_traverse_map(shape), expected_base), step
+            assert np.array_equal(layer.get_traverse_map(shape), expected_layer), step
+
+
+def test_all_locations_are_visible_without_opaque_locations():
+    shape = (9, 7)
+    all_locs = {(x, y) for x in range(shape[0]) for y in range(shape[1])}
+    assert visible_locations((4, 3), set(), shape) == all_locs
+    assert visible_locations((0, 0), set(), shape) == all_locs
+    assert visible_locations((4, 3), set(), shape, sense_range=2) == \
+        {(x, y) for x, y in all_locs if (x - 4) ** 2 + (y - 3) ** 2 <= 4}
+
+
+def test_walls_hide_what_is_behind_them():
+    shape = (10, 10)
+    # A wall in the same row hides the rest of that row, but is visible itself
+    visible = visible_locations((0, 5), {(3, 5)}, shape)
+    assert (3, 5) in visible and (2, 5) in visible
+    assert not any((x, 5) in visible for x in range(4, 10))
+
+    # The inside of a closed room is hidden from the outside, its walls facing us are not
+    walls = {(x, y) for x in range(3, 8) for y in (3, 7)} | {(x, y) for y in range(3, 8) for x in (3, 7)}
+    visible = visible_locations((5, 0), walls, shape)
+    assert not any((x, y) in visible for x in range(4, 7) for y in range(4, 7))
+    assert {(4, 3), (5, 3), (6, 3)} <= visible
+
+    # An open doorway lets us look straight into the room
+    visible = visible_locations((5, 0), walls - {(5, 3)}, shape)
+    assert {(5, 4), (5, 5), (5, 6)} <= visible
+
+    # From inside the room, we see all of it but nothing outside of it
+    visible = visible_locations((5, 5), walls, shape)
+    room = {(x, y) for x in range(3, 8) for y in range(3, 8)}
+    assert visible == room
+
+
+@pytest.mark.parametrize("memorize_for_ticks", [None, 4])
+def test_occlusion_matches_a_state_of_the_visible_objects(memorize_for_ticks):
+    world = RandomWorld(4, nr_blocks=30)
+    occluded = State(agent_id='agent_0', memorize_for_ticks=memorize_for_ticks, fov_occlusion=True)
+    state = State(agent_id='agent_0', memorize_for_ticks=memorize_for_ticks)
+    for _ in range(200):
+        world.step()
+        perceived = world.perceive('agent_0', probability=0.9)
+        occluded.state_update(perceived)
+        state.state_update(state.apply_occlusion(perceived))
+        assert occluded.as_dict() == state.as_dict()
+        assert {obj_id: occluded.get_decay(obj_id) for obj_id in occluded} == \
+            {obj_id: state.get_decay(obj_id) for obj_id in state}
+        delta, expected = occluded.last_delta, state.last_delta
+        assert (delta.added, delta.changed, delta.removed) == (expected.added, expected.changed, expected.removed)
+
+
+def test_apply_occlusion_keeps_the_objects_that_can_be_seen():
+    world = RandomWorld(5, nr_blocks=30)
+    state = State(agent_id='agent_0')
+    perceived = world.everything()
+    opaque_locs = {obj['location'] for obj in perceived.values() if is_opaque(obj)}
+    visible = visible_locations(perceived['agent_0']['location'], opaque_locs, world.shape)
+    assert state.apply_occlusion(perceived) == {obj_id: obj for obj_id, obj in perceived.items()
+                                                if 'location' not in obj or obj['location'] in visible}
@@ -0,0 +1,158 @@
+import gc
+import pickle
+
+import numpy as np
+import pytest
+
+from bw4t.state import State
+from bw4t.state_team import TeamState
+from tests.test_state import QUERIES
+from tests.worlds import RandomWorld, ids
+
+
+AGENT_IDS = ['agent_0', 'agent_1', 'agent_2']
+
+
+def assert_same(view, state):
+    """ Asserts that a view of a team state answers all queries as the State of its agent does, apart from the maps as
+    views find their path over what the team knows. """
+    assert view.as_dict() == state.as_dict()
+    assert {obj_id: view.get_decay(obj_id) for obj_id in view} == {obj_id: state.get_decay(obj_id) for obj_id in state}
+    for query in QUERIES:
+        assert ids(view.get_with_property(query)) == ids(state.get_with_property(query)), query
+        assert ids(view.compile(query).run()) == ids(state.compile(query).run()), query
+    assert [ids(found) for found in view.query_many(QUERIES)] == [ids(found) for found in state.query_many(QUERIES)]
+    for loc in [(5, 8), (3, 3), (10, 12)]:
+        assert ids(view.get_objects_at(loc)) == ids(state.get_objects_at(loc))
+    assert ids(view.get_objects_in_area((0, 0), 10, 10)) == ids(state.get_objects_in_area((0, 0), 10, 10))
+    assert ids(view.get_objects_in_range((10, 10), 4)) == ids(state.get_objects_in_range((10, 10), 4))
+    assert ids(view.get_room_content('room_0')) == ids(state.get_room_content('room_0'))
+    assert ids(view.get_room_doors('room_0')) == ids(state.get_room_doors('room_0'))
+
+    view_columns = view.get_columns(['location', 'visualization_colour'])
+    columns = state.get_columns(['location', 'visualization_colour'])
+    view_order, order = np.argsort(view_columns['obj_id']), np.argsort(columns['obj_id'])
+    for name in ['obj_id', 'location', 'visualization_colour']:
+        assert np.array_equal(view_columns[name][view_order], columns[name][order])
+
+    agent_id = view.agent_id
+    if agent_id in view:
+        origin = np.array(view[agent_id]['location'])
+
+        def distances(objs):
+            return [round(float(np.hypot(*(np.array(obj['location']) - origin))), 6) for obj in objs]
+
+        assert distances(view.get_closest_object(k=5)) == distances(state.get_closest_object(k=5))
+        assert distances(view.get_closest_agent(k=2)) == distances(state.get_closest_agent(k=2))
+        assert view.get_closest_room() == state.get_closest_room()
+
+
+def assert_same_delta(view, state):
+    delta, expected = view.last_delta, state.last_delta
+    assert (delta.added, delta.changed, delta.removed, delta.previous) == \
+        (expected.added, expected.changed, expected.removed, expected.previous)
+
+
+@pytest.mark.parametrize("memorize_for_ticks", [None, 3])
+def test_views_match_the_state_of_each_agent(memorize_for_ticks):
+    world = RandomWorld(5)
+    team = TeamState()
+    views = {agent_id: team.view(agent_id, memorize_for_ticks=memorize_for_ticks) for agent_id in AGENT_IDS}
+    states = {agent_id: State(memorize_for_ticks=memorize_for_ticks, agent_id=agent_id) for agent_id in AGENT_IDS}
+    for _ in range(150):
+        world.step()
+        for agent_id in AGENT_IDS:
+            perceived = world.perceive(agent_id)
+            views[agent_id].state_update(perceived)
+            states[agent_id].state_update(perceived)
+            assert_same_delta(views[agent_id], states[agent_id])
+            assert_same(views[agent_id], states[agent_id])
+
+    # The team only keeps the objects that its views know
+    known = set().union(*[set(view) for view in views.values()])
+    assert set(team.state.as_dict()) == known
+
+
+def test_views_with_occlusion_match_the_state_of_each_agent():
+    world = RandomWorld(6, nr_blocks=20)
+    team = TeamState()
+    views = {agent_id: team.view(agent_id, memorize_for_ticks=4, fov_occlusion=True) for agent_id in AGENT_IDS}
+    states = {agent_id: State(memorize_for_ticks=4, agent_id=agent_id, fov_occlusion=True) for agent_id in AGENT_IDS}
+    for _ in range(150):
+        world.step()
+        for agent_id in AGENT_IDS:
+            perceived = world.perceive(agent_id, probability=0.9)
+            views[agent_id].state_update(perceived)
+            states[agent_id].state_update(perceived)
+            assert_same_delta(views[agent_id], states[agent_id])
+            assert views[agent_id].as_dict() == states[agent_id].as_dict()
+
+
+def test_changes_to_a_view_match_changes_to_a_state():
+    world = RandomWorld(7)
+    team = TeamState()
+    views = {agent_id: team.view(agent_id, memorize_for_ticks=3) for agent_id in AGENT_IDS}
+    states = {agent_id: State(memorize_for_ticks=3, agent_id=agent_id) for agent_id in AGENT_IDS}
+
+    def step():
+        world.step()
+        for agent_id in AGENT_IDS:
+            perceived = world.perceive(agent_id)
+            views[agent_id].state_update(perceived)
+            states[agent_id].state_update(perceived)
+
+    for _ in range(50):
+        step()
+    view, state = views['agent_0'], states['agent_0']
+    snapshot, expected_snapshot = view.snapshot(), state.as_dict().copy()
+    copy = views['agent_1'].copy()
+    assert_same(copy, states['agent_1'])
+    views['agent_1'] = copy
+    gc.collect()
+
+    obj_id = next(obj_id for obj_id in view if obj_id.startswith('block'))
+    assert view.pop(obj_id) == state.pop(obj_id)
+    view.remove_with_property({'class_inheritance': 'Door'})
+    state.remove_with_property({'class_inheritance': 'Door'})
+    assert_same(view, state)
+
+    for _ in range(50):
+        step()
+        for agent_id in AGENT_IDS:
+            assert_same(views[agent_id], states[agent_id])
+    assert snapshot.as_dict() == expected_snapshot
+    assert views['agent_2'].to_state().as_dict() == states['agent_2'].as_dict()
+
+
+def test_views_find_their_path_over_what_the_team_knows():
+    world = RandomWorld(8)
+    team = TeamState()
+    views = {agent_id: team.view(agent_id, memorize_for_ticks=3) for agent_id in AGENT_IDS}
+    for _ in range(100):
+        world.step()
+        for agent_id in AGENT_IDS:
+            views[agent_id].state_update(world.perceive(agent_id))
+        for view in views.values():
+            # The team knows the objects of all views, a view knows its own versions of some of them better
+            merged = State()
+            merged.state_update_delta({**team.state.as_dict(), **view.as_dict()}, [])
+            assert np.array_equal(view.get_traverse_map(), merged.get_traverse_map())
+            if view.agent_id in view:
+                loc = view[view.agent_id]['location']
+                assert np.array_equal(view.get_distance_map(loc), merged.get_distance_map(loc))
+
+
+def test_team_state_can_be_pickled():
+    world = RandomWorld(9)
+    team = TeamState()
+    views = [team.view(agent_id) for agent_id in AGENT_IDS]
+    for _ in range(20):
+        world.step()
+        for view in views:
+            view.state_update(world.perceive(view.agent_id))
+    copied = pickle.loads(pickle.dumps(team))
+    assert copied.state.as_dict() == team.state.as_dict()
+    view = copied.view('agent_3')
+    perceived = world.perceive('agent_0')
+    view.state_update(perceived)
+    assert view.as_dict() == State(agent_id='agent_3').state_update(perceived).as_dict()
@@ -0,0 +1,64 @@
+import pickle
+
+import pytest
+from matrx.agents import AgentBrain
+
+from bw4t.builder import BW4TWorldBuilder
+from bw4t.object_registry import ObjectRegistry
+from bw4t.world_prefetch import PrefetchedWorlds
+
+
+class IdleAgent(AgentBrain):
+
+    def decide_on_action(self, state):
+        return None, {}
+
+
+def create_builder(seed=1, headless=True):
+    builder = BW4TWorldBuilder(shape=(12, 12), random_seed=seed, run_matrx_api=not headless,
+                               run_matrx_visualizer=not headless, verbose=False, simulation_goal=5)
+    builder.add_object_prospects([(x, y) for x in range(2, 10) for y in range(2, 10)], "Block", 0.2,
+                                 colours=["#ff0000", "#0000ff"])
+    builder.add_agent((0, 0), IdleAgent(), name="agent")
+    return builder
+
+
+def blocks(world):
+    """ Returns the location and colour of each block of a world. """
+    return sorted((tuple(obj.location), obj.visualize_colour) for obj in ObjectRegistry.of(world).find("name", "Block"))
+
+
+def test_prefetched_worlds_are_the_worlds_of_their_seed_and_number():
+    builder = create_builder()
+    worlds = PrefetchedWorlds(create_builder, nr_of_worlds=3, random_seed=7, headless=True)
+    assert len(worlds) == 3
+    found = []
+    for world_nr, world in enumerate(worlds):
+        expected = create_builder(seed=PrefetchedWorlds.world_seed(7, world_nr)).get_world(world_nr=world_nr)
+        assert world.world_id == expected.world_id == f"world_{world_nr + 1}"
+        assert blocks(world) == blocks(expected)
+        found.append(blocks(world))
+
+        # The agents of the world can act, as their world was pickled with them
+        world.run(builder.api_info)
+        assert world.current_nr_ticks == 5
+    assert len(found) == 3 and found[0] != found[1]
+
+
+def test_worlds_with_agents_can_be_pickled():
+    world = create_builder().get_world()
+    copied = pickle.loads(pickle.dumps(world))
+    assert blocks(copied) == blocks(world)
+    assert list(copied.registered_agents) == list(world.registered_agents)
+
+
+def test_world_seed_only_depends_on_the_seed_and_number():
+    assert PrefetchedWorlds.world_seed(1, 2) == PrefetchedWorlds.world_seed(1, 2)
+    assert len({PrefetchedWorlds.world_seed(seed, world_nr) for seed in range(3) for world_nr in range(3)}) == 9
+
+
+def test_invalid_numbers_raise():
+    with pytest.raises(ValueError):
+        PrefetchedWorlds(create_builder, nr_of_worlds=-1)
+    with pytest.raises(ValueError):
+        PrefetchedWorlds(create_builder, nr_of_worlds=1, prefetch=0)
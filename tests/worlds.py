@@ -0,0 +1,94 @@
+import random
+
+
+class RandomWorld:
+
+    def __init__(self, seed, width=20, height=16, nr_blocks=8, nr_agents=3, colours=("#ff0000", "#0000ff")):
+        """ A small BW4T-like world of perceived objects that changes randomly every tick, to feed states with.
+
+        The world has a single room (walls, a door that opens and closes, an area tile and a sign), blocks that move
+        around and agents that walk. Objects are plain dicts as an agent perceives them; a changed object is a new dict,
+        unchanged objects are the same dict from tick to tick.
+
+        Parameters
+        ----------
+        seed : int
+            The seed of the random generator, the same seed gives the same world and changes.
+        width, height : int (default is 20 and 16)
+            The shape of the world.
+        nr_blocks : int (default is 8)
+            The number of blocks.
+        nr_agents : int (default is 3)
+            The number of agents.
+        colours : tuple of str (default is red and blue)
+            The colours of the blocks.
+        """
+        self.rng = random.Random(seed)
+        self.shape = (width, height)
+        self.tick = 0
+        self.world = {'obj_id': 'World', 'nr_ticks': 0, 'grid_shape': self.shape, 'team_members': []}
+
+        self.objects = {}
+        for x in range(2, 9):
+            for y in (2, 8):
+                self.add(f'wall_{x}_{y}', (x, y), 'Wall', room_name='room_0')
+        for y in range(3, 8):
+            for x in (2, 8):
+                self.add(f'wall_{x}_{y}', (x, y), 'Wall', room_name='room_0')
+        del self.objects['wall_5_8']
+        self.add('door_0', (5, 8), 'Door', room_name='room_0', is_open=False)
+        self.add('tile_0', (4, 4), 'AreaTile', room_name='room_0')
+        self.add('sign_0', (5, 5), 'Sign', room_name='room_0')
+        for i in range(nr_blocks):
+            self.add(f'block_{i}', self.random_location(), 'CollectBlock', colour=self.rng.choice(colours))
+        self.agents = {}
+        for i in range(nr_agents):
+            self.agents[f'agent_{i}'] = self.new_object(f'agent_{i}', (10 + i, 12), 'AgentBody', isAgent=True)
+
+    @staticmethod
+    def new_object(obj_id, location, class_name, colour="#000000", **props):
+        obj = {'obj_id': obj_id, 'name': obj_id, 'location': tuple(location),
+               'class_inheritance': [class_name, 'EnvObject', 'object'],
+               'is_traversable': class_name not in ('Wall', 'Door'),
+               'visualization': {'colour': colour, 'opacity': 1.0}}
+        obj.update(props)
+        return obj
+
+    def add(self, obj_id, location, class_name, **props):
+        self.objects[obj_id] = self.new_object(obj_id, location, class_name, **props)
+
+    def random_location(self):
+        return self.rng.randrange(self.shape[0]), self.rng.randrange(self.shape[1])
+
+    def step(self):
+        """ Moves on to the next tick; agents walk, the door may open or close and a block may move. """
+        self.tick += 1
+        self.world = dict(self.world, nr_ticks=self.tick)
+        width, height = self.shape
+        for agent_id, agent in self.agents.items():
+            x, y = agent['location']
+            x = min(width - 1, max(0, x + self.rng.choice([-1, 0, 1])))
+            y = min(height - 1, max(0, y + self.rng.choice([-1, 0, 1])))
+            self.agents[agent_id] = dict(agent, location=(x, y))
+        if self.rng.random() < 0.3:
+            door = self.objects['door_0']
+            self.objects['door_0'] = dict(door, is_open=not door['is_open'])
+        if self.rng.random() < 0.5:
+            block_id = self.rng.choice([obj_id for obj_id in self.objects if obj_id.startswith('block')])
+            self.objects[block_id] = dict(self.objects[block_id], location=self.random_location())
+        if self.rng.random() < 0.2:  # the same content, as a new dict
+            self.objects['sign_0'] = dict(self.objects['sign_0'])
+
+    def everything(self):
+        """ Returns all objects of the world, including the world info and the agents. """
+        return {'World': self.world, **self.objects, **self.agents}
+
+    def perceive(self, agent_id, probability=0.6):
+        """ Returns what an agent perceives; the world info, itself and each other object with some probability. """
+        return {obj_id: obj for obj_id, obj in self.everything().items()
+                if obj_id in ('World', agent_id) or self.rng.random() < probability}
+
+
+def ids(found):
+    """ Returns the sorted ids of the objects a query found, None if it found nothing. """
+    return None if found is None else sorted(obj['obj_id'] for obj in found)